@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+"""
+جدول درون‌حافظه‌ای دسترسی کاربران (is_active / is_admin) برای فایروال و بررسی ادمین.
+
+جدول هنگام شروع برنامه و سپس به صورت دوره‌ای به طور کامل از Appwrite بارگذاری می‌شود و هر جا که
+ربات خودش وضعیت کاربری را تغییر می‌دهد (ثبت نام، مسدود/فعال کردن، حذف) مستقیماً به‌روزرسانی می‌شود.
+اگر کاربری در جدول نباشد یک بار از دیتابیس خوانده می‌شود؛ نبودن کاربر هم برای مدت کوتاهی کش می‌شود.
+"""
+import asyncio
+import logging
+import threading
+import time
+from typing import NamedTuple
+
+import config
+import database
+import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class UserAccess(NamedTuple):
+    is_active: bool
+    is_admin: bool
+
+
+_access = {}   # telegram_id -> UserAccess
+_missing = {}  # telegram_id -> زمانی که نبودن کاربر در دیتابیس بررسی شد
+_lock = threading.Lock()
+# شماره تغییرات محلی؛ reload_all تغییراتی را که پس از شروع بارگذاری انجام شده‌اند بازنویسی نمی‌کند
+_version = 0
+_changed_at = {}  # telegram_id -> شماره آخرین تغییر محلی
+
+
+def _from_document(user_doc: dict) -> UserAccess:
+    return UserAccess(is_active=bool(user_doc.get('is_active', False)), is_admin=bool(user_doc.get('is_admin', False)))
+
+
+def _mark_changed(telegram_id: str):
+    """باید با نگه داشتن _lock فراخوانی شود."""
+    global _version
+    _version += 1
+    _changed_at[telegram_id] = _version
+
+
+def update_from_document(user_doc: dict | None):
+    """وضعیت دسترسی را از روی سند کاربر (BOT_USERS) به‌روزرسانی می‌کند."""
+    if not user_doc or not user_doc.get('telegram_id'):
+        return
+    telegram_id = str(user_doc['telegram_id'])
+    with _lock:
+        _access[telegram_id] = _from_document(user_doc)
+        _missing.pop(telegram_id, None)
+        _mark_changed(telegram_id)
+
+
+def set_user_active(telegram_id: str, is_active: bool):
+    telegram_id = str(telegram_id)
+    with _lock:
+        current = _access.get(telegram_id, UserAccess(is_active=False, is_admin=False))
+        _access[telegram_id] = current._replace(is_active=is_active)
+        _missing.pop(telegram_id, None)
+        _mark_changed(telegram_id)
+
+
+def remove_user(telegram_id: str):
+    telegram_id = str(telegram_id)
+    with _lock:
+        _access.pop(telegram_id, None)
+        _missing[telegram_id] = time.monotonic()
+        _mark_changed(telegram_id)
+
+
+def reload_all() -> int:
+    """
+    کل جدول را از دیتابیس بارگذاری و به صورت یکجا جایگزین می‌کند (تابع همگام؛ با asyncio.to_thread اجرا شود).
+    کاربرانی که در حین بارگذاری وضعیتشان در ربات تغییر کرده (مسدود، فعال یا حذف شده‌اند) همان وضعیت محلی را نگه می‌دارند.
+    """
+    with _lock:
+        started_at = _version
+    table = {}
+    for user_doc in database.iter_documents(config.APPWRITE_DATABASE_ID, config.BOT_USERS_COLLECTION_ID):
+        if user_doc.get('telegram_id'):
+            table[str(user_doc['telegram_id'])] = _from_document(user_doc)
+    global _access, _missing
+    with _lock:
+        changed = {telegram_id for telegram_id, version in _changed_at.items() if version > started_at}
+        for telegram_id in changed:
+            if telegram_id in _access:
+                table[telegram_id] = _access[telegram_id]
+            else:
+                table.pop(telegram_id, None)
+        _access = table
+        _missing = {telegram_id: since for telegram_id, since in _missing.items() if telegram_id in changed}
+        # تغییرات پیش از شروع بارگذاری در دیتابیس ثبت شده بودند و در جدول جدید هستند
+        for telegram_id in [telegram_id for telegram_id, version in _changed_at.items() if version <= started_at]:
+            del _changed_at[telegram_id]
+    logger.info(f"جدول دسترسی کاربران بارگذاری شد ({len(table)} کاربر).")
+    return len(table)
+
+
+async def get_user_access(telegram_id: str) -> UserAccess | None:
+    """وضعیت دسترسی کاربر را برمی‌گرداند؛ None یعنی کاربر ثبت نشده است."""
+    telegram_id = str(telegram_id)
+    with _lock:
+        access = _access.get(telegram_id)
+        missing_since = _missing.get(telegram_id)
+    if access is not None:
+        metrics.record_cache_lookup("user_access", True)
+        return access
+    if missing_since is not None and time.monotonic() - missing_since < config.ACCESS_CACHE_NEGATIVE_TTL_SECONDS:
+        metrics.record_cache_lookup("user_access", True)
+        return None
+
+    metrics.record_cache_lookup("user_access", False)
+    user_doc = await asyncio.to_thread(
+        database.get_single_document, config.APPWRITE_DATABASE_ID, config.BOT_USERS_COLLECTION_ID, 'telegram_id', telegram_id
+    )
+    if user_doc:
+        update_from_document(user_doc)
+        return _from_document(user_doc)
+    with _lock:
+        _missing[telegram_id] = time.monotonic()
+    return None
+
+
+async def run_periodic_reload(interval_seconds: float):
+    """جدول را به صورت دوره‌ای بازسازی می‌کند تا تغییرات خارج از ربات (مثلاً از کنسول Appwrite) هم اعمال شوند."""
+    while True:
+        await asyncio.sleep(interval_seconds)
+        try:
+            await asyncio.to_thread(reload_all)
+        except Exception as e:
+            logger.error(f"خطا در بارگذاری مجدد جدول دسترسی کاربران: {e}", exc_info=True)
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+"""
+کلاینت‌های مشترک Ollama: برای هر نقش (router، chat، summarizer، combined) یک ChatOllama با تنظیمات ثابت ساخته می‌شود.
+
+همه کلاینت‌ها روی یک transport مشترک httpx (یکی برای فراخوانی‌های async و یکی برای sync) ساخته می‌شوند، پس
+اتصال‌های keep-alive به سرور Ollama بین نقش‌ها و درخواست‌ها مشترک است و هر پیام هزینه ساخت شیء و اتصال TCP ندارد.
+"""
+import logging
+
+import httpx
+from langchain_ollama import ChatOllama
+
+import config
+import metrics
+
+logger = logging.getLogger(__name__)
+
+ROUTER = "router"
+CHAT = "chat"
+SUMMARIZER = "summarizer"
+# حالت ترکیبی: روتر و پاسخ مکالمه عمومی در یک فراخوانی با خروجی JSON
+COMBINED = "combined"
+
+# پارامترهای مدل برای هر نقش
+_ROLE_SETTINGS = {
+    ROUTER: {"format": "json", "temperature": 0},
+    CHAT: {"temperature": 0.7},
+    SUMMARIZER: {},
+    COMBINED: {"format": "json", "temperature": 0.3},
+}
+
+_clients = {}
+_transports = {}
+
+OLLAMA_CONNECTIONS = metrics.gauge("ollama_http_connections", "Connections in the shared Ollama HTTP pool by state", ("transport", "state"))
+
+
+def _pool_limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=config.OLLAMA_MAX_CONNECTIONS,
+        max_keepalive_connections=config.OLLAMA_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=config.OLLAMA_KEEPALIVE_EXPIRY_SECONDS,
+    )
+
+
+def _collect_pool_connections() -> dict:
+    counts = {}
+    for name, transport in _transports.items():
+        idle = active = 0
+        for connection in transport._pool.connections:
+            if connection.is_idle():
+                idle += 1
+            else:
+                active += 1
+        counts[(name, "idle")] = idle
+        counts[(name, "active")] = active
+    return counts
+
+
+OLLAMA_CONNECTIONS.set_callback(_collect_pool_connections)
+
+
+def init_clients():
+    """transportها و کلاینت همه نقش‌ها را (فقط یک بار) می‌سازد."""
+    if _clients:
+        return
+    _transports["async"] = httpx.AsyncHTTPTransport(limits=_pool_limits())
+    _transports["sync"] = httpx.HTTPTransport(limits=_pool_limits())
+    timeout = httpx.Timeout(config.OLLAMA_READ_TIMEOUT_SECONDS, connect=config.OLLAMA_CONNECT_TIMEOUT_SECONDS)
+    for role, settings in _ROLE_SETTINGS.items():
+        _clients[role] = ChatOllama(
+            model=config.OLLAMA_MODEL,
+            base_url=config.OLLAMA_BASE_URL,
+            keep_alive=config.OLLAMA_MODEL_KEEP_ALIVE,
+            client_kwargs={"timeout": timeout},
+            async_client_kwargs={"transport": _transports["async"]},
+            sync_client_kwargs={"transport": _transports["sync"]},
+            **settings,
+        )
+    logger.info(f"کلاینت‌های Ollama برای نقش‌های {', '.join(_clients)} ساخته شدند.")
+
+
+def get_client(role: str) -> ChatOllama:
+    if not _clients:
+        init_clients()
+    return _clients[role]
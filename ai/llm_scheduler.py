@@ -0,0 +1,204 @@
+# -*- coding: utf-8 -*-
+"""
+زمان‌بند درخواست‌های LLM بین هندلرهای هوش مصنوعی و Ollama.
+
+روی سرور CPU، اجرای هم‌زمان همه درخواست‌ها همه را با هم کند می‌کند تا جایی که به timeout می‌رسند. این زمان‌بند:
+- حداکثر max_concurrent درخواست را هم‌زمان به Ollama می‌فرستد و بقیه را در صف نگه می‌دارد؛
+- بین کاربران منتظر به نوبت (round-robin) نوبت می‌دهد تا کاربری با چند درخواست، صف را قبضه نکند؛
+- درخواست‌های پکیج‌های پولی اولویت دارند، ولی در هر paid_weight + 1 نوبت حداقل یک نوبت به صف عادی می‌رسد؛
+- در اضافه‌بار (صف پر، درخواست‌های زیاد یک کاربر یا انتظار طولانی‌تر از max_wait_seconds) SchedulerBusy می‌دهد
+  تا به جای timeout پس از چند دقیقه، فوراً پاسخ «سرور شلوغ است» نمایش داده شود؛
+- جایگاه هر درخواست در صف را هر بار که تغییر کند با on_position اطلاع می‌دهد.
+"""
+import asyncio
+import contextlib
+import logging
+import time
+from collections import OrderedDict, deque
+
+import metrics
+import tracing
+
+logger = logging.getLogger(__name__)
+
+PAID = "paid"
+STANDARD = "standard"
+
+WAIT_SECONDS = metrics.histogram("llm_scheduler_wait_seconds", "Time AI requests waited for an LLM slot", ("priority",), buckets=(0.01, 0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0))
+REJECTIONS = metrics.counter("llm_scheduler_rejections_total", "AI requests shed by the LLM scheduler", ("reason",))
+
+
+class SchedulerBusy(Exception):
+    """درخواست پذیرفته نشد؛ reason یکی از queue_full، user_limit یا timeout است."""
+
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+
+class _Waiter:
+    __slots__ = ("user_id", "priority", "granted", "moved")
+
+    def __init__(self, user_id: str, priority: str):
+        self.user_id = user_id
+        self.priority = priority
+        self.granted = asyncio.get_running_loop().create_future()
+        self.moved = asyncio.Event()
+
+
+class LLMScheduler:
+    def __init__(self, max_concurrent: int, max_queue: int, max_per_user: int, max_wait_seconds: float, paid_weight: int):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.max_per_user = max_per_user
+        self.max_wait_seconds = max_wait_seconds
+        self.paid_weight = paid_weight
+        self.running = 0
+        self.waiting = 0
+        # برای هر اولویت: user_id -> صف درخواست‌های آن کاربر؛ ترتیب کلیدها ترتیب نوبت کاربران است
+        self._tiers = {PAID: OrderedDict(), STANDARD: OrderedDict()}
+        self._paid_streak = 0
+        metrics.register_queue("llm_running", lambda: self.running)
+        metrics.register_queue("llm_waiting", lambda: self.waiting)
+
+    def has_capacity(self, slots: int) -> bool:
+        """آیا slots درخواست دیگر بدون انتظار در صف اجرا می‌شوند."""
+        return not self.waiting and self.running + slots <= self.max_concurrent
+
+    def _pending_for(self, user_id: str) -> int:
+        return sum(len(tier.get(user_id, ())) for tier in self._tiers.values())
+
+    def position(self, waiter: _Waiter) -> int:
+        """
+        جایگاه تقریبی درخواست در صف (از 1): درخواست‌های اولویت بالاتر، به علاوه درخواست‌های هم‌اولویتی که
+        با ترتیب نوبت‌دهی فعلی زودتر اجرا می‌شوند.
+        """
+        tier = self._tiers[waiter.priority]
+        round_index = tier[waiter.user_id].index(waiter)
+        ahead = round_index
+        before = True
+        for user_id, user_queue in tier.items():
+            if user_id == waiter.user_id:
+                before = False
+                continue
+            ahead += min(len(user_queue), round_index + 1 if before else round_index)
+        if waiter.priority == STANDARD:
+            ahead += sum(len(user_queue) for user_queue in self._tiers[PAID].values())
+        return ahead + 1
+
+    def _notify_moved(self):
+        for tier in self._tiers.values():
+            for user_queue in tier.values():
+                for waiter in user_queue:
+                    waiter.moved.set()
+
+    def _pop_next(self) -> _Waiter | None:
+        paid, standard = self._tiers[PAID], self._tiers[STANDARD]
+        if paid and (not standard or self._paid_streak < self.paid_weight):
+            tier = paid
+            self._paid_streak += 1
+        elif standard:
+            tier = standard
+            self._paid_streak = 0
+        else:
+            return None
+        user_id, user_queue = next(iter(tier.items()))
+        waiter = user_queue.popleft()
+        # کاربر به انتهای نوبت منتقل می‌شود
+        del tier[user_id]
+        if user_queue:
+            tier[user_id] = user_queue
+        self.waiting -= 1
+        return waiter
+
+    def _dispatch(self):
+        dispatched = False
+        while self.running < self.max_concurrent:
+            waiter = self._pop_next()
+            if waiter is None:
+                break
+            self.running += 1
+            waiter.granted.set_result(None)
+            dispatched = True
+        if dispatched:
+            self._notify_moved()
+
+    def _remove(self, waiter: _Waiter):
+        tier = self._tiers[waiter.priority]
+        user_queue = tier.get(waiter.user_id)
+        if user_queue is None or waiter not in user_queue:
+            return
+        user_queue.remove(waiter)
+        if not user_queue:
+            del tier[waiter.user_id]
+        self.waiting -= 1
+        self._notify_moved()
+
+    def _reject(self, reason: str):
+        REJECTIONS.inc(reason=reason)
+        raise SchedulerBusy(reason)
+
+    async def _wait_for_slot(self, waiter: _Waiter, on_position) -> None:
+        deadline = time.monotonic() + self.max_wait_seconds
+        reported = None
+        while not waiter.granted.done():
+            waiter.moved.clear()
+            position = self.position(waiter)
+            if on_position is not None and position != reported:
+                reported = position
+                try:
+                    await on_position(position)
+                except Exception as e:
+                    logger.debug(f"اطلاع‌رسانی جایگاه صف ناموفق بود: {e}")
+                continue
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                self._reject("timeout")
+            moved = asyncio.ensure_future(waiter.moved.wait())
+            try:
+                await asyncio.wait((waiter.granted, moved), timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                moved.cancel()
+
+    async def acquire(self, user_id: str, priority: str = STANDARD, on_position=None):
+        """
+        منتظر یک slot آزاد می‌ماند؛ on_position (یک coroutine function) با جایگاه صف فراخوانی می‌شود.
+        در اضافه‌بار SchedulerBusy می‌دهد.
+        """
+        if self.running < self.max_concurrent and not self.waiting:
+            self.running += 1
+            WAIT_SECONDS.observe(0.0, priority=priority)
+            return
+        if self.waiting >= self.max_queue:
+            self._reject("queue_full")
+        if self._pending_for(user_id) >= self.max_per_user:
+            self._reject("user_limit")
+
+        waiter = _Waiter(user_id, priority)
+        self._tiers[priority].setdefault(user_id, deque()).append(waiter)
+        self.waiting += 1
+        self._notify_moved()
+        started = time.monotonic()
+        with tracing.span("llm_scheduler.wait", priority=priority):
+            try:
+                await self._wait_for_slot(waiter, on_position)
+            except BaseException:
+                if waiter.granted.done():
+                    # slot هم‌زمان با لغو درخواست داده شده است؛ پس داده می‌شود
+                    self.release()
+                else:
+                    self._remove(waiter)
+                raise
+        WAIT_SECONDS.observe(time.monotonic() - started, priority=priority)
+
+    def release(self):
+        self.running -= 1
+        self._dispatch()
+
+    @contextlib.asynccontextmanager
+    async def slot(self, user_id: str, priority: str = STANDARD, on_position=None):
+        await self.acquire(user_id, priority, on_position)
+        try:
+            yield
+        finally:
+            self.release()
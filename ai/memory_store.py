@@ -0,0 +1,226 @@
+# -*- coding: utf-8 -*-
+"""
+نگهداری حافظه مکالمه کاربران (ConversationSummaryMemory) با سقف تعداد و حجم.
+
+- حافظه هر کاربر یک خلاصه (memory.buffer) و پیام‌هایی است که هنوز در خلاصه نیامده‌اند (memory.chat_memory.messages).
+- خلاصه‌سازی در مسیر پاسخ به کاربر انجام نمی‌شود: add_turn فقط پیام‌ها را اضافه می‌کند و وقتی حجم تخمینی
+  پیام‌های خلاصه نشده از summary_token_threshold بیشتر شود، کاربر در صف worker پس‌زمینه قرار می‌گیرد تا همه آن
+  پیام‌ها یک‌جا در خلاصه ادغام شوند. هر درخواست از خلاصه‌ای که در همان لحظه موجود است استفاده می‌کند.
+- حافظه‌ها در یک LRU نگه داشته می‌شوند؛ اگر تعداد یا حجم متنی آن‌ها از سقف بیشتر شود، قدیمی‌ترین‌ها از حافظه حذف می‌شوند.
+- پس از هر تغییر، خلاصه و پیام‌های خلاصه نشده در یک فایل JSON روی دیسک نوشته می‌شود؛ کاربری که از LRU حذف شده
+  (یا بعد از راه‌اندازی مجدد برمی‌گردد) از همین فایل بازیابی می‌شود.
+- همه حافظه‌ها از یک کلاینت LLM مشترک برای خلاصه‌سازی استفاده می‌کنند.
+"""
+import asyncio
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+
+from langchain.memory import ConversationSummaryMemory
+from langchain_core.messages import messages_from_dict, messages_to_dict
+
+import metrics
+from ai.llm_scheduler import SchedulerBusy
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_RUNS = metrics.counter("ai_memory_summaries_total", "Background conversation summarizations by result", ("result",))
+SUMMARY_BATCH_MESSAGES = metrics.histogram("ai_memory_summary_batch_messages", "Messages folded into the summary per background run", buckets=(2, 4, 6, 8, 12, 16, 20, 30))
+# فاصله تلاش مجدد وقتی زمان‌بند LLM شلوغ است
+_BUSY_RETRY_SECONDS = 5.0
+
+
+def _text_size(memory: ConversationSummaryMemory) -> int:
+    """حجم تقریبی متن نگهداری شده (خلاصه + پیام‌ها) به بایت."""
+    size = len((memory.buffer or "").encode('utf-8'))
+    for message in memory.chat_memory.messages:
+        content = message.content if isinstance(message.content, str) else json.dumps(message.content, ensure_ascii=False)
+        size += len(content.encode('utf-8'))
+    return size
+
+
+def _estimate_tokens(messages: list) -> int:
+    # تخمین بدون tokenizer: حدود ۳ کاراکتر به ازای هر توکن (متن فارسی توکن‌های کوتاه‌تری از انگلیسی دارد)
+    return sum(len(message.content) for message in messages if isinstance(message.content, str)) // 3
+
+
+def prompt_history(memory: ConversationSummaryMemory) -> list:
+    """تاریخچه‌ای که به مدل داده می‌شود: خلاصه فعلی (در صورت وجود) و پیام‌هایی که هنوز در آن نیامده‌اند."""
+    messages = list(memory.chat_memory.messages)
+    if memory.buffer:
+        messages.insert(0, memory.summary_message_cls(content=f"خلاصه مکالمه‌های قبلی با کاربر:\n{memory.buffer}"))
+    return messages
+
+
+class MemoryStore:
+    def __init__(self, llm, max_entries: int, max_bytes: int, max_messages: int, memory_dir: str,
+                 summary_token_threshold: int, summary_slot=None):
+        """summary_slot: تابعی که یک async context manager (نوبت زمان‌بند LLM) برای هر خلاصه‌سازی برمی‌گرداند."""
+        self.llm = llm
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_messages = max_messages
+        self.memory_dir = memory_dir
+        self.summary_token_threshold = summary_token_threshold
+        self.summary_slot = summary_slot
+        self._memories = OrderedDict()  # user_id -> ConversationSummaryMemory
+        self._sizes = {}                # user_id -> حجم تقریبی به بایت
+        self._total_bytes = 0
+        self._summary_queue = None      # در اولین استفاده داخل event loop ساخته می‌شود
+        self._queued_users = set()
+        self._summary_worker = None
+        os.makedirs(memory_dir, exist_ok=True)
+        metrics.gauge("ai_memory_entries", "Conversation memories held in the LRU", callback=lambda: len(self._memories))
+        metrics.gauge("ai_memory_bytes", "Approximate text size of conversation memories held in the LRU", callback=lambda: self._total_bytes)
+        metrics.register_queue("ai_memory_summaries", lambda: len(self._queued_users))
+
+    def _path(self, user_id: str) -> str:
+        return os.path.join(self.memory_dir, f"{user_id}.json")
+
+    def _new_memory(self) -> ConversationSummaryMemory:
+        return ConversationSummaryMemory(llm=self.llm)
+
+    # --- دیسک (توابع همگام؛ با asyncio.to_thread اجرا می‌شوند) ---
+
+    def _load(self, user_id: str) -> ConversationSummaryMemory:
+        memory = self._new_memory()
+        try:
+            with open(self._path(user_id), encoding='utf-8') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return memory
+        except (OSError, ValueError) as e:
+            logger.error(f"خطا در خواندن حافظه ذخیره شده کاربر {user_id}: {e}")
+            return memory
+        memory.buffer = data.get('summary', "")
+        memory.chat_memory.add_messages(messages_from_dict(data.get('messages', [])))
+        return memory
+
+    def _write(self, user_id: str, summary: str, messages: list):
+        path = self._path(user_id)
+        temp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump({'summary': summary, 'messages': messages}, f, ensure_ascii=False)
+        os.replace(temp_path, path)
+
+    # --- LRU ---
+
+    def _set_size(self, user_id: str, size: int):
+        self._total_bytes += size - self._sizes.get(user_id, 0)
+        self._sizes[user_id] = size
+
+    def _evict(self):
+        while self._memories and (len(self._memories) > self.max_entries or self._total_bytes > self.max_bytes):
+            user_id, _ = self._memories.popitem(last=False)
+            self._total_bytes -= self._sizes.pop(user_id, 0)
+            logger.debug(f"حافظه مکالمه کاربر {user_id} از LRU خارج شد.")
+
+    async def get(self, user_id: str) -> ConversationSummaryMemory:
+        """حافظه کاربر را برمی‌گرداند؛ اگر در LRU نباشد از دیسک بازیابی (یا خالی ساخته) می‌شود."""
+        memory = self._memories.get(user_id)
+        if memory is not None:
+            self._memories.move_to_end(user_id)
+            metrics.record_cache_lookup("ai_memory", True)
+            return memory
+
+        metrics.record_cache_lookup("ai_memory", False)
+        memory = await asyncio.to_thread(self._load, user_id)
+        # ممکن است هم‌زمان درخواست دیگری همین کاربر را بارگذاری کرده باشد
+        if user_id in self._memories:
+            return self._memories[user_id]
+        self._memories[user_id] = memory
+        self._set_size(user_id, _text_size(memory))
+        self._evict()
+        return memory
+
+    async def save(self, user_id: str, memory: ConversationSummaryMemory):
+        """
+        حافظه را روی دیسک می‌نویسد و حجم LRU را به‌روزرسانی می‌کند. اگر خلاصه‌سازی عقب بماند، پیام‌های خلاصه نشده
+        بیشتر از max_messages (قدیمی‌ترین‌ها) حذف می‌شوند تا حافظه یک کاربر بی‌سقف رشد نکند.
+        """
+        messages = memory.chat_memory.messages
+        if len(messages) > self.max_messages:
+            logger.warning(f"خلاصه‌سازی حافظه کاربر {user_id} عقب مانده است؛ {len(messages) - self.max_messages} پیام قدیمی حذف شد.")
+            memory.chat_memory.messages = messages[-self.max_messages:]
+        if self._memories.get(user_id) is memory:
+            self._set_size(user_id, _text_size(memory))
+            self._evict()
+        try:
+            await asyncio.to_thread(self._write, user_id, memory.buffer or "", messages_to_dict(memory.chat_memory.messages))
+        except OSError as e:
+            logger.error(f"خطا در ذخیره حافظه مکالمه کاربر {user_id} روی دیسک: {e}")
+
+    async def add_turn(self, user_id: str, memory: ConversationSummaryMemory, user_input: str, reply_text: str):
+        """
+        یک نوبت مکالمه را بدون فراخوانی LLM اضافه و ذخیره می‌کند؛ اگر پیام‌های خلاصه نشده از آستانه بگذرند،
+        خلاصه‌سازی آن‌ها به worker پس‌زمینه سپرده می‌شود.
+        """
+        memory.chat_memory.add_user_message(user_input)
+        memory.chat_memory.add_ai_message(reply_text)
+        await self.save(user_id, memory)
+        if self._needs_summary(memory):
+            self._schedule_summary(user_id)
+
+    def _needs_summary(self, memory: ConversationSummaryMemory) -> bool:
+        messages = memory.chat_memory.messages
+        # شرط تعداد پیام مانع می‌شود که پیام‌های کوتاه پیش از رسیدن به آستانه توکن به سقف max_messages برسند و حذف شوند
+        return _estimate_tokens(messages) >= self.summary_token_threshold or len(messages) > self.max_messages // 2
+
+    def _schedule_summary(self, user_id: str):
+        if self._summary_queue is None:
+            self._summary_queue = asyncio.Queue()
+        if self._summary_worker is None or self._summary_worker.done():
+            self._summary_worker = asyncio.create_task(self._run_summary_worker())
+        if user_id not in self._queued_users:
+            self._queued_users.add(user_id)
+            self._summary_queue.put_nowait(user_id)
+
+    async def _run_summary_worker(self):
+        while True:
+            user_id = await self._summary_queue.get()
+            try:
+                await self._summarize(user_id)
+            except SchedulerBusy:
+                # کاربر در صف می‌ماند و پس از کمی مکث دوباره تلاش می‌شود
+                SUMMARY_RUNS.inc(result="deferred")
+                await asyncio.sleep(_BUSY_RETRY_SECONDS)
+                self._summary_queue.put_nowait(user_id)
+                continue
+            except Exception as e:
+                # پیام‌ها خلاصه نشده باقی می‌مانند و با نوبت بعدی مکالمه دوباره زمان‌بندی می‌شوند
+                SUMMARY_RUNS.inc(result="error")
+                logger.error(f"خطا در خلاصه‌سازی حافظه مکالمه کاربر {user_id}: {e}")
+                self._queued_users.discard(user_id)
+                continue
+            self._queued_users.discard(user_id)
+            # پیام‌هایی که حین خلاصه‌سازی اضافه شده‌اند ممکن است خودشان از آستانه گذشته باشند
+            current = self._memories.get(user_id)
+            if current is not None and self._needs_summary(current):
+                self._schedule_summary(user_id)
+
+    async def _summarize(self, user_id: str):
+        memory = await self.get(user_id)
+        batch = list(memory.chat_memory.messages)
+        if not batch:
+            return
+        with metrics.track(metrics.OLLAMA_SECONDS, metrics.OLLAMA_ERRORS, purpose="summary"):
+            if self.summary_slot is None:
+                summary = await memory.apredict_new_summary(batch, memory.buffer or "")
+            else:
+                async with self.summary_slot():
+                    summary = await memory.apredict_new_summary(batch, memory.buffer or "")
+
+        # در این فاصله ممکن است پیام‌های جدید اضافه یا حافظه از LRU خارج و دوباره بارگذاری شده باشد؛
+        # پیام‌های خلاصه شده از ابتدای پیام‌های نسخه فعلی حافظه حذف می‌شوند
+        current = self._memories.get(user_id) or memory
+        remaining = list(current.chat_memory.messages)
+        for message in batch:
+            if remaining and remaining[0] == message:
+                remaining.pop(0)
+        current.buffer = summary
+        current.chat_memory.messages = remaining
+        await self.save(user_id, current)
+        SUMMARY_RUNS.inc(result="ok")
+        SUMMARY_BATCH_MESSAGES.observe(len(batch))
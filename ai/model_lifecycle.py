@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""
+مدیریت چرخه عمر مدل Ollama: بارگذاری مدل هنگام راه‌اندازی، گرم کردن پرامپت‌های سیستمی و بارگذاری مجدد پس از خروج مدل از حافظه.
+
+به صورت دوره‌ای با /api/ps بررسی می‌شود که مدل هنوز در حافظه سرور Ollama هست یا نه؛ اگر نباشد (مثلاً به دلیل
+پایان keep_alive یا راه‌اندازی مجدد سرور) مدل دوباره بارگذاری و پرامپت‌ها گرم می‌شوند تا اولین پیام کاربر هزینه آن را ندهد.
+این ماژول مستقیماً با API HTTP کار می‌کند و langchain را import نمی‌کند، پس راه‌اندازی ربات کند نمی‌شود.
+"""
+import asyncio
+import logging
+
+import httpx
+
+import config
+import metrics
+from ai import prompts, router_examples
+
+logger = logging.getLogger(__name__)
+
+MODEL_LOADS = metrics.counter("ollama_model_loads_total", "Times the Ollama model was (re)loaded by the lifecycle manager", ("reason",))
+MODEL_LOAD_SECONDS = metrics.histogram("ollama_model_load_seconds", "Model load time reported by Ollama", buckets=(0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0))
+MODEL_LOADED = metrics.gauge("ollama_model_loaded", "Whether the configured model was resident in Ollama at the last check")
+
+# ترتیب مهم است: با یک slot پردازشی، Ollama فقط پیشوند آخرین پرامپت را کش می‌کند؛
+# پرامپت طولانی روتر آخر گرم می‌شود تا کش آن باقی بماند. با انتخاب پویای مثال‌ها فقط دستورالعمل ثابت روتر
+# پیشوند مشترک همه درخواست‌هاست
+_WARMUP_REQUESTS = (
+    ("chat", {"messages": [{"role": "system", "content": prompts.CHAT_PROMPT}]}),
+    ("router", {
+        "messages": [{"role": "system", "content": prompts.TOOL_ROUTER_INSTRUCTIONS if config.ROUTER_DYNAMIC_FEW_SHOT else router_examples.STATIC_ROUTER_PROMPT}],
+        "format": "json",
+    }),
+)
+
+
+def _model_names_match(name: str) -> bool:
+    # Ollama تگ پیش‌فرض latest را به نام مدل اضافه می‌کند
+    model = config.OLLAMA_MODEL if ":" in config.OLLAMA_MODEL else f"{config.OLLAMA_MODEL}:latest"
+    return name == model
+
+
+async def is_model_loaded(client: httpx.AsyncClient) -> bool:
+    response = await client.get("/api/ps")
+    response.raise_for_status()
+    return any(_model_names_match(model.get("name", "")) for model in response.json().get("models", []))
+
+
+async def warm_up(client: httpx.AsyncClient, load_reason: str | None):
+    """
+    مدل را با keep_alive تنظیم شده بارگذاری و پرامپت‌های سیستمی روتر و چت را یک بار ارزیابی می‌کند.
+    load_reason در صورتی داده می‌شود که مدل در حافظه نبوده است (برای متریک بارگذاری مدل).
+    """
+    logger.info(f"در حال گرم کردن مدل {config.OLLAMA_MODEL} (بارگذاری: {load_reason or 'مدل از قبل در حافظه است'})...")
+    if load_reason:
+        MODEL_LOADS.inc(reason=load_reason)
+    for purpose, body in _WARMUP_REQUESTS:
+        payload = {
+            "model": config.OLLAMA_MODEL,
+            "keep_alive": config.OLLAMA_MODEL_KEEP_ALIVE,
+            "stream": False,
+            "options": {"num_predict": 1},
+            **body,
+        }
+        with metrics.track(metrics.OLLAMA_SECONDS, metrics.OLLAMA_ERRORS, purpose=f"warmup_{purpose}"):
+            response = await client.post("/api/chat", json=payload)
+            response.raise_for_status()
+        load_duration = response.json().get("load_duration", 0) / 1e9
+        if load_duration > 0.1:
+            MODEL_LOAD_SECONDS.observe(load_duration)
+    logger.info(f"مدل {config.OLLAMA_MODEL} آماده است.")
+
+
+async def run_model_lifecycle(check_interval: float):
+    """در شروع مدل را گرم می‌کند و سپس هر check_interval ثانیه، در صورت خروج مدل از حافظه، دوباره آن را بارگذاری می‌کند."""
+    timeout = httpx.Timeout(config.OLLAMA_READ_TIMEOUT_SECONDS, connect=config.OLLAMA_CONNECT_TIMEOUT_SECONDS)
+    reason = "startup"
+    async with httpx.AsyncClient(base_url=config.OLLAMA_BASE_URL, timeout=timeout) as client:
+        while True:
+            try:
+                loaded = await is_model_loaded(client)
+                if not loaded:
+                    await warm_up(client, reason)
+                elif reason == "startup":
+                    # مدل از قبل در حافظه است؛ فقط پرامپت‌ها گرم می‌شوند
+                    await warm_up(client, None)
+                MODEL_LOADED.set(1)
+                reason = "evicted"
+            except (httpx.HTTPError, ValueError) as e:
+                MODEL_LOADED.set(0)
+                logger.warning(f"بررسی وضعیت مدل Ollama ناموفق بود: {e}")
+            await asyncio.sleep(check_interval)
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+"""
+کش LRU برای خروجی روتر LLM.
+
+کلید کش متن نرمال‌شده پیام کاربر به همراه اثر انگشت (hash) نام لیست‌های کاربر است؛ اگر لیست‌ها تغییر کنند
+کلید هم عوض می‌شود. پیام‌هایی که به مکالمه قبلی ارجاع می‌دهند (مثل «همون تسک»، «اونو حذف کن») و برنامه‌های
+ask_user که به تاریخچه مکالمه وابسته‌اند کش نمی‌شوند.
+"""
+import asyncio
+import copy
+import hashlib
+import time
+from collections import OrderedDict
+
+import config
+import database
+import metrics
+from ai.pre_router import normalize
+
+# کلماتی که نشان می‌دهند پیام بدون تاریخچه مکالمه قابل تفسیر نیست
+_CONTEXT_REFERENCE_WORDS = {
+    "این", "اینو", "اون", "اونو", "همون", "همونو", "همین", "همینو", "قبلی", "بالایی", "دوباره", "اونها", "اونا",
+    "it", "this", "that", "these", "those", "same", "previous", "again", "above",
+}
+_UNCACHEABLE_TOOLS = {"ask_user"}
+
+
+def history_matters(text: str) -> bool:
+    return any(token in _CONTEXT_REFERENCE_WORDS for token in normalize(text).split())
+
+
+class PlanCache:
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._plans = OrderedDict()  # key -> (expires_at, plan)
+
+    def get(self, key: tuple) -> dict | None:
+        entry = self._plans.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            self._plans.pop(key, None)
+            metrics.record_cache_lookup("router_plan", False)
+            return None
+        self._plans.move_to_end(key)
+        metrics.record_cache_lookup("router_plan", True)
+        # ابزارها آرگومان‌ها را تغییر می‌دهند، پس نسخه کش شده نباید مستقیماً برگردانده شود
+        return copy.deepcopy(entry[1])
+
+    def put(self, key: tuple, plan: dict):
+        steps = plan.get('steps') or [{}]
+        if steps[0].get('tool_name') in _UNCACHEABLE_TOOLS:
+            return
+        self._plans[key] = (time.monotonic() + self.ttl_seconds, copy.deepcopy(plan))
+        self._plans.move_to_end(key)
+        while len(self._plans) > self.max_entries:
+            self._plans.popitem(last=False)
+
+
+_fingerprints = {}  # user_id -> (expires_at, fingerprint)
+
+
+def _compute_list_fingerprint(user_id: str) -> str:
+    lists = database.get_documents(config.APPWRITE_DATABASE_ID, config.LISTS_COLLECTION_ID, database.get_user_scope_queries(user_id, config.LISTS_COLLECTION_ID))
+    names = sorted(lst.get('name', '') for lst in lists)
+    return hashlib.sha1("\n".join(names).encode('utf-8')).hexdigest()
+
+
+async def list_fingerprint(user_id: str) -> str:
+    """اثر انگشت نام لیست‌های کاربر؛ برای کاهش درخواست‌های دیتابیس به مدت کوتاهی کش می‌شود."""
+    cached = _fingerprints.get(user_id)
+    if cached is not None and cached[0] >= time.monotonic():
+        return cached[1]
+    fingerprint = await asyncio.to_thread(_compute_list_fingerprint, user_id)
+    if len(_fingerprints) > 10_000:
+        now = time.monotonic()
+        for expired_user in [uid for uid, (expires_at, _) in _fingerprints.items() if expires_at < now]:
+            del _fingerprints[expired_user]
+    _fingerprints[user_id] = (time.monotonic() + config.ROUTER_LIST_FINGERPRINT_TTL_SECONDS, fingerprint)
+    return fingerprint
+
+
+async def cache_key(user_id: str, text: str) -> tuple:
+    return normalize(text), await list_fingerprint(user_id)
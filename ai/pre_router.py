@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+"""
+مسیریاب قاعده‌محور که پیش از روتر LLM اجرا می‌شود.
+
+فقط وقتی قواعد مطمئن هستند پیام را مستقیماً no_op (مکالمه عمومی) در نظر می‌گیرد: پیام‌های خالی، احوال‌پرسی و تشکر،
+و پرسش‌های کوتاه بدون کلمه کلیدی دستوری (ایجاد/ویرایش/حذف تسک، لیست، اضافه، کار جدید، assign و ...)، فعل امری،
+نام داخل گیومه یا لحن درخواست مؤدبانه («میشه ... ؟»، «میتونی ... ؟»، can you ...).
+بقیه پیام‌ها، حتی بدون کلمه کلیدی شناخته شده، به روتر LLM فرستاده می‌شوند تا دستوری بدون پاسخ نماند.
+"""
+import re
+
+NO_OP = "no_op"
+
+# ریشه‌های فارسی با پیشوند مقایسه می‌شوند تا شکل‌های صرفی (بسازش، حذفش، تسک‌ها، پاکش کن) هم پوشش داده شوند
+_PERSIAN_COMMAND_STEMS = (
+    "تسک", "ایجاد", "بساز", "درست کن", "ویرایش", "تغییر", "حذف", "پاک", "تعیین", "لیست", "اساین", "اولویت", "ددلاین",
+    "اضافه", "جدید", "کار", "بردار",
+)
+_ENGLISH_COMMAND_WORDS = {
+    "task", "tasks", "create", "build", "make", "edit", "update", "delete", "remove", "assign", "set", "list", "priority", "due",
+    "add", "new", "todo", "todos",
+}
+# فعل‌های امری رایج؛ پیامی که یکی از این‌ها را دارد ممکن است دستور باشد و به روتر LLM فرستاده می‌شود
+_IMPERATIVE_WORDS = {
+    "کن", "کنید", "بکن", "بکنید",
+    "put", "mark", "move", "close", "finish", "complete", "schedule", "remind", "rename", "change", "please",
+}
+# ریشه فعل‌ها با پیشوند هر کلمه مقایسه می‌شوند تا شکل‌های صرفی (بذاری، ببندی، بسپارش، میذاری) هم پوشش داده شوند
+_PERSIAN_VERB_STEMS = (
+    "بذار", "بگذار", "میذار", "ببند", "میبند", "بسپار", "میسپار", "بنویس", "بفرست", "بنداز", "ببر", "بیار", "بده", "بزن",
+    "ثبت", "وضعیت", "عوض", "منتقل", "انتقال",
+)
+# لحن درخواست؛ «میشه گزارش رو ببندی؟» ظاهر پرسش دارد ولی دستور است
+_REQUEST_PHRASES = (
+    "میشه", "می شه", "میشود", "می شود", "میتونی", "می تونی", "میتونید", "می تونید", "میتوانی", "می توانی", "لطفا",
+    "can you", "could you", "would you",
+)
+# نام تسک یا لیست معمولاً داخل گیومه می‌آید
+_QUOTE_CHARS = "'\"«»“”‘’"
+# احوال‌پرسی، تشکر و خداحافظی؛ پیامی که فقط از این کلمات تشکیل شده قطعاً مکالمه است
+_SMALL_TALK_WORDS = {
+    "سلام", "درود", "صبح", "ظهر", "عصر", "شب", "بخیر", "خوبی", "خوبین", "خوبید", "چطوری", "چطورین", "خسته", "نباشی", "نباشید",
+    "ممنون", "ممنونم", "مرسی", "متشکرم", "تشکر", "سپاس", "عالی", "اوکی", "باشه", "خداحافظ", "خدانگهدار", "جان", "خیلی", "هم", "و",
+    "hi", "hello", "hey", "there", "thanks", "thank", "you", "a", "lot", "so", "ok", "okay", "bye", "good", "morning", "evening", "night",
+    "great", "cool", "very", "much",
+}
+_QUESTION_WORDS = {
+    "چی", "چیه", "چه", "چطور", "چطوره", "چگونه", "کی", "کجا", "چرا", "چند", "چقدر", "آیا", "کدام", "کدوم",
+    "what", "how", "why", "who", "when", "where", "which",
+}
+# پرسش‌های طولانی‌تر ممکن است درخواست ضمنی داشته باشند و به روتر LLM سپرده می‌شوند
+_SHORT_QUESTION_MAX_WORDS = 8
+
+_ARABIC_TO_PERSIAN = str.maketrans({
+    "ي": "ی", "ى": "ی", "ك": "ک", "ة": "ه", "أ": "ا", "إ": "ا", "ؤ": "و",
+    "۰": "0", "۱": "1", "۲": "2", "۳": "3", "۴": "4", "۵": "5", "۶": "6", "۷": "7", "۸": "8", "۹": "9",
+    "٠": "0", "١": "1", "٢": "2", "٣": "3", "٤": "4", "٥": "5", "٦": "6", "٧": "7", "٨": "8", "٩": "9",
+    "\u200c": " ", "\u200f": "", "\u200e": "", "\u0640": "",
+})
+_DIACRITICS_RE = re.compile("[\u064b-\u0652\u0670]")
+_NON_WORD_RE = re.compile(r"[^\w\s]")
+_SPACES_RE = re.compile(r"\s+")
+
+
+def normalize(text: str) -> str:
+    """حروف عربی/فارسی، اعداد و نیم‌فاصله را یکسان و علائم نگارشی را حذف می‌کند."""
+    text = _DIACRITICS_RE.sub("", text.translate(_ARABIC_TO_PERSIAN).lower())
+    text = _NON_WORD_RE.sub(" ", text)
+    return _SPACES_RE.sub(" ", text).strip()
+
+
+def has_command_keyword(text: str) -> bool:
+    normalized = normalize(text)
+    tokens = normalized.split()
+    if any(token in _ENGLISH_COMMAND_WORDS for token in tokens):
+        return True
+    padded = f" {normalized}"
+    return any(f" {stem}" in padded for stem in _PERSIAN_COMMAND_STEMS)
+
+
+def _looks_like_request(text: str, normalized: str, tokens: list) -> bool:
+    if any(char in text for char in _QUOTE_CHARS):
+        return True
+    if any(token.startswith(stem) for token in tokens for stem in _PERSIAN_VERB_STEMS):
+        return True
+    padded = f" {normalized} "
+    return any(f" {phrase} " in padded for phrase in _REQUEST_PHRASES)
+
+
+def _is_short_question(text: str, tokens: list) -> bool:
+    if not tokens or len(tokens) > _SHORT_QUESTION_MAX_WORDS:
+        return False
+    return "?" in text or "؟" in text or any(token in _QUESTION_WORDS for token in tokens)
+
+
+def pre_route(text: str) -> str | None:
+    """
+    NO_OP اگر پیام قطعاً مکالمه عمومی باشد (خالی، احوال‌پرسی و تشکر، یا پرسش کوتاه بدون دستور و بدون لحن درخواست)؛
+    None در بقیه موارد تا روتر LLM تصمیم بگیرد.
+    """
+    if not text or not text.strip():
+        return NO_OP
+    normalized = normalize(text)
+    tokens = normalized.split()
+    if has_command_keyword(text) or any(token in _IMPERATIVE_WORDS for token in tokens):
+        return None
+    if _looks_like_request(text, normalized, tokens):
+        return None
+    if all(token in _SMALL_TALK_WORDS for token in tokens):
+        return NO_OP
+    if _is_short_question(text, tokens):
+        return NO_OP
+    return None
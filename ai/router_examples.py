@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+"""
+بانک مثال‌های آموزشی روتر و انتخاب پویای few-shot.
+
+به جای ارسال همه مثال‌ها در هر فراخوانی روتر، فقط k مثال شبیه‌تر به پیام کاربر انتخاب می‌شوند. شباهت با
+بردار TF-IDF از n-gramهای کاراکتری متن نرمال‌شده و فاصله کسینوسی محاسبه می‌شود (بدون مدل embedding و بدون
+وابستگی خارجی)، پس برای فارسی محاوره‌ای و شکل‌های صرفی مختلف یک کلمه هم کار می‌کند.
+"""
+import json
+import math
+from collections import Counter
+from typing import NamedTuple
+
+import config
+from ai import prompts
+from ai.pre_router import normalize
+
+
+class RouterExample(NamedTuple):
+    text: str
+    tool_name: str
+    arguments: dict
+
+
+EXAMPLES = [
+    RouterExample("سلام", "no_op", {}),
+    RouterExample("یه تسک به نام دیزاین جدید بساز تو لیست uiux", "create_task", {"task_name": "دیزاین جدید", "list_name": "uiux"}),
+    RouterExample("تسک 'بازبینی کد' رو از لیست 'دواپس' حذف کن.", "confirm_and_delete_task", {"task_name": "بازبینی کد", "list_name": "دواپس"}),
+    RouterExample("عالیه خوشوقتم. یه تسک جدید درست کن به نام 'قیمت ایفون ۱۶' و داخل لیست 'uiux' قرارش بده", "create_task", {"task_name": "قیمت ایفون ۱۶", "list_name": "uiux"}),
+    RouterExample("برای مدیریت پروژه به شیوه اجایل چه راهکاری پیشنهاد میدی؟", "no_op", {}),
+    RouterExample("لطفا تسک 'آماده سازی گزارش هفتگی' رو پاک کن. توی لیست 'گزارش ها' هست.", "confirm_and_delete_task", {"task_name": "آماده سازی گزارش هفتگی", "list_name": "گزارش ها"}),
+    RouterExample("یه تسک به اسم 'ریسرچ بازار' برای پس فردا با اولویت بالا تو لیست 'استراتژی' بساز و به سامان اساین کن.", "create_task", {"task_name": "ریسرچ بازار", "due_date": "پس فردا", "priority": "بالا", "list_name": "استراتژی", "assignee_name": "سامان"}),
+    RouterExample("مرسی که تسک رو ساختی. حالا وضعیتش چطوره؟", "no_op", {}),
+    RouterExample("اون تسک مربوط به 'تماس با مشتری' رو دیگه لازم نداریم، از لیست 'فروش' حذفش کن.", "confirm_and_delete_task", {"task_name": "تماس با مشتری", "list_name": "فروش"}),
+    RouterExample("یه تسک فوری بساز با عنوان 'رفع باگ پرداخت' در لیست 'فنی'.", "create_task", {"task_name": "رفع باگ پرداخت", "priority": "فوری", "list_name": "فنی"}),
+    RouterExample("یادم بنداز فردا جلسه داریم.", "no_op", {}),
+    RouterExample("تسک 'نوشتن پست وبلاگ' رو برای فردا تو لیست 'محتوا' ایجاد کن.", "create_task", {"task_name": "نوشتن پست وبلاگ", "due_date": "فردا", "list_name": "محتوا"}),
+    RouterExample("لیست uiux چه تسک‌هایی داره؟", "no_op", {}),
+    RouterExample("یه تسک بساز: 'تحقیق کلمات کلیدی'. توضیحات: 'پیدا کردن ۱۰ کلمه کلیدی اصلی'. لیست: 'سئو'.", "create_task", {"task_name": "تحقیق کلمات کلیدی", "description": "پیدا کردن ۱۰ کلمه کلیدی اصلی", "list_name": "سئو"}),
+    RouterExample("خسته نباشی.", "no_op", {}),
+    RouterExample("تسک 'تست نسخه جدید' رو با وضعیت 'در حال انجام' تو لیست 'QA' بساز.", "create_task", {"task_name": "تست نسخه جدید", "status": "در حال انجام", "list_name": "QA"}),
+    RouterExample("تو کی هستی؟", "no_op", {}),
+    RouterExample("تسک 'طراحی بنر تبلیغاتی' رو به مریم اساین کن و در لیست 'گرافیک' قرار بده.", "create_task", {"task_name": "طراحی بنر تبلیغاتی", "assignee_name": "مریم", "list_name": "گرافیک"}),
+    RouterExample("این پروژه چقدر پیشرفت داشته؟", "no_op", {}),
+    RouterExample("create task 'Code Refactor' in list 'backend' and set priority to high.", "create_task", {"task_name": "Code Refactor", "list_name": "backend", "priority": "high"}),
+    RouterExample("چطور می‌تونم بهره‌وری تیم رو بالا ببرم؟", "no_op", {}),
+    RouterExample("یه تسک با تاریخ تحویل 2025-10-20 به نام 'برنامه‌ریزی رویداد' در لیست 'رویدادها' ایجاد کن.", "create_task", {"task_name": "برنامه‌ریزی رویداد", "due_date": "2025-10-20", "list_name": "رویدادها"}),
+    RouterExample("فراموشش کن، نیازی نیست.", "no_op", {}),
+    RouterExample("delete the task named 'Deploy to Staging' from the 'DevOps' list.", "confirm_and_delete_task", {"task_name": "Deploy to Staging", "list_name": "DevOps"}),
+    RouterExample("نام تسک 'دیزاین رابط کاربری' در لیست uiux را به 'طراحی نهایی رابط کاربری' تغییر بده.", "update_task", {"task_name": "دیزاین رابط کاربری", "list_name": "uiux", "new_name": "طراحی نهایی رابط کاربری"}),
+    RouterExample("تسک 'ریسرچ بازار' در لیست 'استراتژی' را به سامان اساین کن و اولویتش را فوری قرار بده.", "update_task", {"task_name": "ریسرچ بازار", "list_name": "استراتژی", "new_assignee_name": "سامان", "new_priority": "فوری"}),
+    RouterExample("وضعیت تسک 'تست نسخه جدید' در لیست 'QA' رو به 'انجام شده' تغییر بده.", "update_task", {"task_name": "تست نسخه جدید", "list_name": "QA", "new_status": "انجام شده"}),
+    RouterExample("اولویت تسک 'رفع باگ' رو از لیست 'فنی' به 'فوری' تغییر بده.", "update_task", {"task_name": "رفع باگ", "list_name": "فنی", "new_priority": "فوری"}),
+    RouterExample("به سامان اساین کن و اولویتش رو بکن بالا برای تسک 'بررسی گزارش مالی' در لیست 'مالی'.", "update_task", {"task_name": "بررسی گزارش مالی", "list_name": "مالی", "new_assignee_name": "سامان", "new_priority": "بالا"}),
+    RouterExample("تسک 'ایجاد کمپین' در لیست 'بازاریابی' رو به تاریخ 2025-11-01 تغییر بده.", "update_task", {"task_name": "ایجاد کمپین", "list_name": "بازاریابی", "new_due_date": "2025-11-01"}),
+    RouterExample("وضعیت تسک 'تست رابط کاربری' در لیست 'UI/UX' رو به 'در حال انجام' و مسئولش رو به مریم تغییر بده.", "update_task", {"task_name": "تست رابط کاربری", "list_name": "UI/UX", "new_status": "در حال انجام", "new_assignee_name": "مریم"}),
+    RouterExample("تغییراتی در تسک 'طراحی لوگو' در لیست 'گرافیک': وضعیت رو بکن 'آماده', اولویتش رو به 'متوسط' تغییر بده.", "update_task", {"task_name": "طراحی لوگو", "list_name": "گرافیک", "new_status": "آماده", "new_priority": "متوسط"}),
+    RouterExample("تسک‌های 'بررسی سرور' و 'نوشتن مستندات API' در لیست 'DevOps' رو به وضعیت 'انجام شده' ببر و مسئولیتشون رو از سامان بردار.", "update_task", {"task_names": ["بررسی سرور", "نوشتن مستندات API"], "list_name": "DevOps", "new_status": "انجام شده", "new_assignee_name": None}),
+    RouterExample("عنوان تسک 'پروفایل کاربر جدید' رو به 'طراحی رابط پروفایل' تغییر بده و تو لیست 'UI/UX' قرار بده.", "update_task", {"task_name": "پروفایل کاربر جدید", "list_name": "UI/UX", "new_name": "طراحی رابط پروفایل"}),
+    RouterExample("میشه وضعیت 'گزارش' رو بذاری روی done؟", "update_task", {"task_name": "گزارش", "new_status": "done"}),
+    RouterExample("میشه 'گزارش' رو ببندی؟", "update_task", {"task_name": "گزارش", "new_status": "closed"}),
+    RouterExample("میشه دیزاین رو به علی بسپاری؟", "update_task", {"task_name": "دیزاین", "new_assignee_name": "علی"}),
+    RouterExample("توضیحات تسک 'تحلیل داده‌ها' رو به 'جمع‌آوری داده‌های فروش سه ماهه اخیر' تغییر بده. این تسک در لیست 'تجزیه و تحلیل' هست.", "update_task", {"task_name": "تحلیل داده‌ها", "list_name": "تجزیه و تحلیل", "new_description": "جمع‌آوری داده‌های فروش سه ماهه اخیر"}),
+    RouterExample("میخوام اولویت تسک تست هفتم سیستم داخل لیست uiux رو ویرایش کنی و به High تغییر بدی", "update_task", {"task_name": "تسک تست هفتم سیستم", "list_name": "uiux", "new_priority": "High"}),
+    RouterExample("وضعیت تسک های تست هفتم سیستم و تست هشتم سیستم و تست ششم سیستم داخل لیست uiux رو ویرایش کنی و به In Progress تغییر بدی", "update_task", {"task_names": ["تسک تست هفتم سیستم", "تسک تست هشتم سیستم", "تسک تست ششم سیستم"], "list_name": "uiux", "new_status": "In Progress"}),
+    RouterExample("میخوام تسک های تست خروجی جدید / تست هوش مصنوعی ماژولار / Flow Chart داخل لیست uiux رو ویرایش کنی و به Saman Arani اساین کنی", "update_task", {"task_names": ["تست خروجی جدید", "تست هوش مصنوعی ماژولار", "Flow Chart"], "list_name": "uiux", "new_assignee_name": "Saman Arani"}),
+    RouterExample("اولویت تسک های تست هفتم سیستم و تست هشتم سیستم و تست ششم سیستم داخل لیست uiux رو ویرایش کنی و به متوسط تغییر بدی", "update_task", {"task_names": ["تسک تست هفتم سیستم", "تسک تست هشتم سیستم", "تسک تست ششم سیستم"], "list_name": "uiux", "new_priority": "متوسط"}),]
+
+
+def render_examples(examples: list[RouterExample]) -> str:
+    blocks = []
+    for example in examples:
+        plan = {"steps": [{"tool_name": example.tool_name, "arguments": example.arguments}]}
+        blocks.append(
+            f'**ورودی کاربر:** "{example.text}"\n**خروجی صحیح:**\n```json\n{json.dumps(plan, ensure_ascii=False)}\n```'
+        )
+    return "\n\n".join(blocks)
+
+
+# پرامپت کامل با همه مثال‌ها (رفتار قبلی؛ برای خاموش بودن انتخاب پویا و مقایسه در بنچمارک)
+STATIC_ROUTER_PROMPT = prompts.TOOL_ROUTER_INSTRUCTIONS + "\n" + render_examples(EXAMPLES) + "\n"
+
+
+# --- Similarity ---
+
+def _ngrams(text: str, n: int = 3) -> Counter:
+    grams = Counter()
+    for word in normalize(text).split():
+        padded = f" {word} "
+        if len(padded) <= n:
+            grams[padded] += 1
+            continue
+        for i in range(len(padded) - n + 1):
+            grams[padded[i:i + n]] += 1
+    return grams
+
+
+class ExampleSelector:
+    def __init__(self, examples: list[RouterExample]):
+        self.examples = list(examples)
+        document_frequency = Counter()
+        example_grams = [_ngrams(example.text) for example in self.examples]
+        for grams in example_grams:
+            document_frequency.update(grams.keys())
+        total = len(self.examples)
+        self._idf = {gram: math.log((1 + total) / (1 + count)) + 1 for gram, count in document_frequency.items()}
+        self._default_idf = math.log(1 + total) + 1
+        self._vectors = [self._vectorize(grams) for grams in example_grams]
+
+    def _vectorize(self, grams: Counter) -> dict:
+        vector = {gram: count * self._idf.get(gram, self._default_idf) for gram, count in grams.items()}
+        norm = math.sqrt(sum(value * value for value in vector.values())) or 1.0
+        return {gram: value / norm for gram, value in vector.items()}
+
+    def scores(self, text: str) -> list[float]:
+        query = self._vectorize(_ngrams(text))
+        return [sum(weight * vector.get(gram, 0.0) for gram, weight in query.items()) for vector in self._vectors]
+
+    def select(self, text: str, k: int, exclude: RouterExample | None = None) -> list[RouterExample]:
+        """
+        k مثال شبیه‌تر را برمی‌گرداند؛ همیشه حداقل یک مثال no_op هم آورده می‌شود تا مدل گزینه مکالمه عمومی را فراموش نکند.
+        exclude برای ارزیابی leave-one-out در بنچمارک است.
+        """
+        ranked = sorted(
+            (pair for pair in zip(self.scores(text), self.examples) if pair[1] is not exclude),
+            key=lambda pair: pair[0], reverse=True,
+        )
+        selected = [example for _, example in ranked[:k]]
+        if not any(example.tool_name == "no_op" for example in selected):
+            best_no_op = next((example for _, example in ranked if example.tool_name == "no_op"), None)
+            if best_no_op is not None:
+                selected = selected[:max(k - 1, 0)] + [best_no_op]
+        return selected
+
+
+selector = ExampleSelector(EXAMPLES)
+
+
+def build_router_prompt(user_text: str, combined: bool = False) -> str:
+    """
+    پرامپت سیستمی روتر برای این پیام: دستورالعمل ثابت + k مثال شبیه‌تر (یا همه مثال‌ها اگر انتخاب پویا خاموش باشد).
+    combined: دستورالعمل تولید پاسخ مکالمه عمومی در همان فراخوانی (فیلد reply) به انتها اضافه می‌شود.
+    """
+    if not config.ROUTER_DYNAMIC_FEW_SHOT:
+        prompt = STATIC_ROUTER_PROMPT
+    else:
+        prompt = prompts.TOOL_ROUTER_INSTRUCTIONS + "\n" + render_examples(selector.select(user_text, config.ROUTER_FEW_SHOT_K)) + "\n"
+    return prompt + prompts.COMBINED_REPLY_INSTRUCTIONS if combined else prompt
@@ -2,10 +2,8 @@
 import asyncio
 import logging
 from typing import Optional, Dict, Any, Tuple, List
-from datetime import datetime, timedelta
-from dateutil.parser import parse as dateutil_parse
+from datetime import datetime
 from thefuzz import process as fuzz_process
-import re
 from functools import partial
 
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
@@ -16,38 +14,12 @@ import config
 import database
 import clickup_api
 from handlers import common as standard_handlers
+from handlers.common import parse_date
 
 logger = logging.getLogger(__name__)
 
 # --- توابع کمکی ---
 
-def parse_date(date_str: str) -> Optional[int]:
-    """تاریخ را به فرمت timestamp کلیک‌اپ تبدیل می‌کند."""
-    if not date_str: return None
-    today = datetime.now()
-    try:
-        parsed_date = datetime.strptime(date_str, "%Y-%m-%d")
-    except ValueError:
-        try:
-            parsed_date = dateutil_parse(date_str, default=today, fuzzy=True, dayfirst=False)
-        except (ValueError, TypeError):
-            date_str_lower = date_str.lower()
-            if "امروز" in date_str_lower: parsed_date = today
-            elif "فردا" in date_str_lower: parsed_date = today + timedelta(days=1)
-            elif "پس فردا" in date_str_lower: parsed_date = today + timedelta(days=2)
-            elif "دیروز" in date_str_lower: parsed_date = today - timedelta(days=1)
-            elif "روز دیگه" in date_str_lower or "روز دیگر" in date_str_lower:
-                try:
-                    days_match = re.search(r'\d+', date_str)
-                    if days_match:
-                        days = int(days_match.group(0))
-                        parsed_date = today + timedelta(days=days)
-                    else: return None
-                except (ValueError, IndexError): return None
-            else:
-                return None
-    return int(parsed_date.timestamp() * 1000)
-
 def _clean_text(text: str) -> str:
     """Removes leading/trailing whitespace and non-breaking spaces."""
     if not isinstance(text, str):
@@ -56,7 +28,7 @@ def _clean_text(text: str) -> str:
 
 def _find_task_in_db(task_name: str, list_name: str, user_id: str) -> Optional[Tuple[Dict[str, Any], str]]:
     """یک تسک را با جستجوی دقیق و سپس فازی برای یک کاربر مشخص پیدا کرده و خود تسک به همراه نام لیست را برمی‌گرداند."""
-    user_query = [Query.equal("telegram_id", [user_id])]
+    user_query = database.get_user_scope_queries(user_id, config.LISTS_COLLECTION_ID)
     
     lists = database.get_documents(config.APPWRITE_DATABASE_ID, config.LISTS_COLLECTION_ID, user_query)
     if not lists:
@@ -95,7 +67,8 @@ def _find_task_in_db(task_name: str, list_name: str, user_id: str) -> Optional[T
 
     best_list_match = best_list_match_original_name
     list_id = list_choices[best_list_match]
-    task_query = user_query + [Query.equal("list_id", [list_id])]
+    # list_id از میان لیست‌های قابل مشاهده کاربر انتخاب شده است
+    task_query = [Query.equal("list_id", [list_id])]
     tasks_in_list = database.get_documents(config.APPWRITE_DATABASE_ID, config.TASKS_COLLECTION_ID, task_query)
     
     if not tasks_in_list:
@@ -143,7 +116,7 @@ async def _handle_find_task_error(
     """Handles ValueError from _find_task_in_db by starting an interactive correction flow."""
     error_msg = str(e)
     user_id = str(update.effective_user.id)
-    user_query = [Query.equal("telegram_id", [user_id])]
+    user_query = database.get_user_scope_queries(user_id, config.LISTS_COLLECTION_ID)
     
     target_message = update.effective_message
     if not target_message:
@@ -175,7 +148,7 @@ async def _handle_find_task_error(
         best_list_match_name, _ = fuzz_process.extractOne(list_name, list_choices.keys())
         list_id = list_choices[best_list_match_name]
 
-        task_query = user_query + [Query.equal("list_id", [list_id])]
+        task_query = [Query.equal("list_id", [list_id])]
         tasks_in_list = database.get_documents(config.APPWRITE_DATABASE_ID, config.TASKS_COLLECTION_ID, task_query)
         
         context.chat_data['ai_correction_context'] = {'tool_name': tool_name, 'original_args': retry_args}
@@ -215,7 +188,7 @@ async def create_task(
     original_args = {k: v for k, v in locals().items() if k not in ['update', 'context', 'user_id', 'token'] and v is not None}
     
     try:
-        user_query = [Query.equal("telegram_id", [user_id])]
+        user_query = database.get_user_scope_queries(user_id, config.LISTS_COLLECTION_ID)
         lists = database.get_documents(config.APPWRITE_DATABASE_ID, config.LISTS_COLLECTION_ID, user_query)
         list_choices = {lst['name']: lst['clickup_list_id'] for lst in lists}
         if not list_choices: return {"message": "هیچ لیستی برای شما یافت نشد. لطفاً ابتدا از همگام‌سازی اطلاعات خود مطمئن شوید."}
@@ -232,7 +205,7 @@ async def create_task(
     if description: payload["description"] = description
     
     if assignee_name:
-        users = database.get_documents(config.APPWRITE_DATABASE_ID, config.CLICKUP_USERS_COLLECTION_ID, [Query.equal("telegram_id", [user_id])])
+        users = database.get_documents(config.APPWRITE_DATABASE_ID, config.CLICKUP_USERS_COLLECTION_ID, database.get_user_scope_queries(user_id, config.CLICKUP_USERS_COLLECTION_ID))
         user_choices = {user['username']: user['clickup_user_id'] for user in users}
         best_user_match, user_score = fuzz_process.extractOne(assignee_name, user_choices.keys())
         if user_score < 80: return {"message": f"کاربر '{assignee_name}' یافت نشد."}
@@ -302,7 +275,7 @@ async def update_task(
     if new_name: payload['name'] = new_name
     if new_description: payload['description'] = new_description
     if new_assignee_name:
-        user_query = [Query.equal("telegram_id", [user_id])]
+        user_query = database.get_user_scope_queries(user_id, config.CLICKUP_USERS_COLLECTION_ID)
         users = database.get_documents(config.APPWRITE_DATABASE_ID, config.CLICKUP_USERS_COLLECTION_ID, user_query)
         user_choices = {user['username']: user['clickup_user_id'] for user in users}
         best_user_match, user_score = fuzz_process.extractOne(new_assignee_name, user_choices.keys())
@@ -0,0 +1,291 @@
+# -*- coding: utf-8 -*-
+"""
+یک سرور HTTP جعلی و محلی که endpointهای مورد استفاده در clickup_api.py را شبیه‌سازی می‌کند.
+
+امکانات:
+- تأخیر قابل تنظیم (ثابت + jitter) برای هر درخواست
+- هدرهای محدودیت نرخ (X-RateLimit-*) و پاسخ 429 در صورت عبور از سقف
+- صفحه‌بندی تسک‌ها مشابه API واقعی (۱۰۰ تسک در هر صفحه و فیلد last_page)
+- شمارش درخواست‌ها به تفکیک مسیر، از طریق GET /_stats
+
+اجرای مستقل:
+    python -m bench.fake_clickup_server --size medium --port 8900 --latency-ms 50
+"""
+import argparse
+import asyncio
+import logging
+import random
+import time
+from collections import Counter
+
+from aiohttp import web
+
+from bench.workspace import SIZES, generate_sized_workspace, workspace_stats
+
+logger = logging.getLogger(__name__)
+
+API_PREFIX = "/api/v2"
+TASKS_PAGE_SIZE = 100
+
+
+class FakeClickUpServer:
+    """وضعیت سرور جعلی: workspace، تنظیمات تأخیر/محدودیت نرخ و شمارنده‌ها."""
+
+    def __init__(self, workspace: dict, latency_ms: float = 0.0, jitter_ms: float = 0.0, rate_limit_per_minute: int = 0, seed: int = 0):
+        self.workspace = workspace
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.rate_limit_per_minute = rate_limit_per_minute
+        self.calls = Counter()
+        self.rate_limited = 0
+        self._rng = random.Random(seed)
+        self._windows = {}  # token -> (window_start, count)
+        self._runner = None
+        self.port = None
+
+    # --- Middleware ---
+
+    def _check_rate_limit(self, token: str) -> tuple[bool, dict]:
+        if not self.rate_limit_per_minute:
+            return True, {}
+        now = time.monotonic()
+        window_start, count = self._windows.get(token, (now, 0))
+        if now - window_start >= 60:
+            window_start, count = now, 0
+        count += 1
+        self._windows[token] = (window_start, count)
+        remaining = max(0, self.rate_limit_per_minute - count)
+        headers = {
+            "X-RateLimit-Limit": str(self.rate_limit_per_minute),
+            "X-RateLimit-Remaining": str(remaining),
+            "X-RateLimit-Reset": str(int(time.time() + 60 - (now - window_start))),
+        }
+        return count <= self.rate_limit_per_minute, headers
+
+    @web.middleware
+    async def middleware(self, request: web.Request, handler):
+        if request.path.startswith("/_stats"):
+            return await handler(request)
+
+        token = request.headers.get("Authorization")
+        if not token:
+            return web.json_response({"err": "Token invalid", "ECODE": "OAUTH_025"}, status=401)
+
+        allowed, rate_headers = self._check_rate_limit(token)
+        if not allowed:
+            self.rate_limited += 1
+            return web.json_response({"err": "Rate limit reached", "ECODE": "APP_002"}, status=429, headers=rate_headers)
+
+        if self.latency_ms or self.jitter_ms:
+            delay = self.latency_ms + self._rng.uniform(0, self.jitter_ms)
+            await asyncio.sleep(delay / 1000)
+
+        route = request.match_info.route.resource.canonical if request.match_info.route.resource else request.path
+        self.calls[f"{request.method} {route}"] += 1
+
+        response = await handler(request)
+        response.headers.update(rate_headers)
+        return response
+
+    # --- Helpers ---
+
+    def _list_payload(self, list_id: str) -> dict:
+        lst = dict(self.workspace["lists"][list_id])
+        lst["task_count"] = len(self.workspace["list_tasks"].get(list_id, []))
+        return lst
+
+    def _folder_payload(self, folder_id: str) -> dict:
+        folder = dict(self.workspace["folders"][folder_id])
+        # پاسخ واقعی کلیک‌اپ لیست‌های هر پوشه را هم در خود دارد
+        folder["lists"] = [self._list_payload(list_id) for list_id in self.workspace["folder_lists"].get(folder_id, [])]
+        return folder
+
+    @staticmethod
+    def _not_found(what: str) -> web.Response:
+        return web.json_response({"err": f"{what} not found", "ECODE": "ITEM_015"}, status=404)
+
+    # --- Endpoints ---
+
+    async def get_user(self, request: web.Request):
+        return web.json_response({"user": {"id": 1, "username": "benchmark", "email": "benchmark@example.com"}})
+
+    async def get_teams(self, request: web.Request):
+        return web.json_response({"teams": self.workspace["teams"]})
+
+    async def get_spaces(self, request: web.Request):
+        team_id = request.match_info["team_id"]
+        space_ids = self.workspace["team_spaces"].get(team_id, [])
+        return web.json_response({"spaces": [self.workspace["spaces"][s] for s in space_ids]})
+
+    async def get_folders(self, request: web.Request):
+        space_id = request.match_info["space_id"]
+        folder_ids = self.workspace["space_folders"].get(space_id, [])
+        return web.json_response({"folders": [self._folder_payload(f) for f in folder_ids]})
+
+    async def get_folder_lists(self, request: web.Request):
+        folder_id = request.match_info["folder_id"]
+        if folder_id not in self.workspace["folders"]:
+            return self._not_found("Folder")
+        return web.json_response({"lists": [self._list_payload(l) for l in self.workspace["folder_lists"].get(folder_id, [])]})
+
+    async def get_folderless_lists(self, request: web.Request):
+        space_id = request.match_info["space_id"]
+        return web.json_response({"lists": [self._list_payload(l) for l in self.workspace["space_lists"].get(space_id, [])]})
+
+    async def get_list(self, request: web.Request):
+        list_id = request.match_info["list_id"]
+        if list_id not in self.workspace["lists"]:
+            return self._not_found("List")
+        payload = self._list_payload(list_id)
+        space = self.workspace["spaces"].get(payload["space"]["id"], {})
+        payload["statuses"] = space.get("statuses", [])
+        return web.json_response(payload)
+
+    async def get_list_tasks(self, request: web.Request):
+        list_id = request.match_info["list_id"]
+        if list_id not in self.workspace["lists"]:
+            return self._not_found("List")
+        try:
+            page = int(request.query.get("page", 0))
+        except ValueError:
+            page = 0
+        task_ids = self.workspace["list_tasks"].get(list_id, [])
+        start = page * TASKS_PAGE_SIZE
+        page_ids = task_ids[start:start + TASKS_PAGE_SIZE]
+        return web.json_response({
+            "tasks": [self.workspace["tasks"][t] for t in page_ids],
+            "last_page": start + TASKS_PAGE_SIZE >= len(task_ids),
+        })
+
+    async def get_task(self, request: web.Request):
+        task = self.workspace["tasks"].get(request.match_info["task_id"])
+        if not task:
+            return self._not_found("Task")
+        return web.json_response(task)
+
+    async def create_task(self, request: web.Request):
+        list_id = request.match_info["list_id"]
+        if list_id not in self.workspace["lists"]:
+            return self._not_found("List")
+        body = await request.json()
+        task_id = f"t{len(self.workspace['tasks']) + 10_000_000}"
+        task = {
+            "id": task_id,
+            "name": body.get("name", ""),
+            "description": body.get("description", ""),
+            "text_content": body.get("description", ""),
+            "status": {"status": body.get("status", "to do")},
+            "priority": body.get("priority"),
+            "assignees": [],
+            "list": {"id": list_id},
+            "team_id": self.workspace["teams"][0]["id"],
+            "start_date": body.get("start_date"),
+            "due_date": body.get("due_date"),
+            "date_updated": str(int(time.time() * 1000)),
+            "url": f"https://app.clickup.com/t/{task_id}",
+        }
+        self.workspace["tasks"][task_id] = task
+        self.workspace["list_tasks"][list_id].append(task_id)
+        return web.json_response(task)
+
+    async def update_task(self, request: web.Request):
+        task = self.workspace["tasks"].get(request.match_info["task_id"])
+        if not task:
+            return self._not_found("Task")
+        body = await request.json()
+        if "name" in body: task["name"] = body["name"]
+        if "description" in body: task["description"] = task["text_content"] = body["description"]
+        if "status" in body: task["status"] = {"status": body["status"]}
+        if "priority" in body: task["priority"] = body["priority"]
+        if "due_date" in body: task["due_date"] = body["due_date"]
+        task["date_updated"] = str(int(time.time() * 1000))
+        return web.json_response(task)
+
+    async def delete_task(self, request: web.Request):
+        task = self.workspace["tasks"].pop(request.match_info["task_id"], None)
+        if not task:
+            return self._not_found("Task")
+        self.workspace["list_tasks"][task["list"]["id"]].remove(task["id"])
+        return web.Response(status=204)
+
+    async def get_stats(self, request: web.Request):
+        return web.json_response({"calls": dict(self.calls), "total_calls": sum(self.calls.values()), "rate_limited": self.rate_limited})
+
+    async def reset_stats(self, request: web.Request):
+        self.reset_stats_counters()
+        return web.Response(status=204)
+
+    def reset_stats_counters(self):
+        self.calls.clear()
+        self.rate_limited = 0
+        self._windows.clear()
+
+    # --- App lifecycle ---
+
+    def build_app(self) -> web.Application:
+        app = web.Application(middlewares=[self.middleware])
+        app.add_routes([
+            web.get(f"{API_PREFIX}/user", self.get_user),
+            web.get(f"{API_PREFIX}/team", self.get_teams),
+            web.get(f"{API_PREFIX}/team/{{team_id}}/space", self.get_spaces),
+            web.get(f"{API_PREFIX}/space/{{space_id}}/folder", self.get_folders),
+            web.get(f"{API_PREFIX}/space/{{space_id}}/list", self.get_folderless_lists),
+            web.get(f"{API_PREFIX}/folder/{{folder_id}}/list", self.get_folder_lists),
+            web.get(f"{API_PREFIX}/list/{{list_id}}", self.get_list),
+            web.get(f"{API_PREFIX}/list/{{list_id}}/task", self.get_list_tasks),
+            web.post(f"{API_PREFIX}/list/{{list_id}}/task", self.create_task),
+            web.get(f"{API_PREFIX}/task/{{task_id}}", self.get_task),
+            web.put(f"{API_PREFIX}/task/{{task_id}}", self.update_task),
+            web.delete(f"{API_PREFIX}/task/{{task_id}}", self.delete_task),
+            web.get("/_stats", self.get_stats),
+            web.post("/_stats/reset", self.reset_stats),
+        ])
+        return app
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        """سرور را راه‌اندازی کرده و آدرس پایه API (برای config.CLICKUP_API_BASE_URL) را برمی‌گرداند."""
+        self._runner = web.AppRunner(self.build_app())
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        self.port = self._runner.addresses[0][1]
+        return f"http://{host}:{self.port}{API_PREFIX}"
+
+    async def stop(self):
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
+
+
+async def _serve_forever(args):
+    workspace = generate_sized_workspace(args.size, description_size=args.description_size, seed=args.seed)
+    server = FakeClickUpServer(workspace, args.latency_ms, args.jitter_ms, args.rate_limit, seed=args.seed)
+    base_url = await server.start(args.host, args.port)
+    logger.info(f"Fake ClickUp server ({workspace_stats(workspace)}) listening on {base_url}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local fake ClickUp API server")
+    parser.add_argument("--size", choices=SIZES.keys(), default="small")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--rate-limit", type=int, default=0, help="requests per minute per token (0 = unlimited)")
+    parser.add_argument("--description-size", type=int, default=400)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    try:
+        asyncio.run(_serve_forever(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+"""
+بنچمارک زمان‌بند LLM: یک هجوم (burst) پیام هوش مصنوعی را روی یک سرور Ollama شبیه‌سازی شده اجرا کرده و
+حالت بدون محدودیت (همه درخواست‌ها هم‌زمان) را با LLMScheduler مقایسه می‌کند.
+
+سرور شبیه‌سازی شده مثل Ollama روی CPU رفتار می‌کند: ظرفیت پردازش ثابت بین درخواست‌های فعال تقسیم می‌شود و
+هر درخواست هم‌زمان اضافه، به دلیل رقابت روی cache و حافظه، کارایی کل را کمی کاهش می‌دهد. درخواستی که بیشتر از
+--timeout منتظر بماند شکست خورده حساب می‌شود (مثل timeout خواندن در کلاینت).
+
+زمان‌ها به ثانیه شبیه‌سازی گزارش می‌شوند؛ --speedup فقط اجرای بنچمارک را سریع‌تر می‌کند.
+
+نمونه:
+    python -m bench.llm_scheduler_benchmark
+    python -m bench.llm_scheduler_benchmark --requests 60 --burst-seconds 5 --concurrency 2 --json
+"""
+import argparse
+import asyncio
+import json
+import logging
+import random
+import time
+
+import config
+from ai.llm_scheduler import LLMScheduler, SchedulerBusy, PAID, STANDARD
+
+logger = logging.getLogger(__name__)
+
+
+class SimulatedOllama:
+    """پردازش اشتراکی (processor sharing) با افت کارایی contention به ازای هر درخواست هم‌زمان اضافه."""
+
+    def __init__(self, contention: float, speedup: float, tick: float = 0.01):
+        self.contention = contention
+        self.speedup = speedup
+        self.tick = tick
+        self._active = {}  # future -> کار باقی‌مانده (ثانیه پردازش تکی)
+        self._task = None
+
+    async def _run(self):
+        last = time.monotonic()
+        while True:
+            await asyncio.sleep(self.tick / self.speedup)
+            now = time.monotonic()
+            elapsed, last = (now - last) * self.speedup, now
+            if not self._active:
+                continue
+            n = len(self._active)
+            share = elapsed / n / (1 + self.contention * (n - 1))
+            for future in list(self._active):
+                self._active[future] -= share
+                if self._active[future] <= 0:
+                    del self._active[future]
+                    if not future.done():
+                        future.set_result(None)
+
+    async def generate(self, work_seconds: float):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+        future = asyncio.get_running_loop().create_future()
+        self._active[future] = work_seconds
+        try:
+            await future
+        finally:
+            # درخواست لغو شده (timeout) دیگر ظرفیت سرور را مصرف نمی‌کند
+            self._active.pop(future, None)
+
+    def close(self):
+        if self._task is not None:
+            self._task.cancel()
+
+
+async def _run_mode(mode: str, plan: list, args) -> dict:
+    server = SimulatedOllama(args.contention, args.speedup)
+    scheduler = None
+    if mode == "scheduler":
+        scheduler = LLMScheduler(args.concurrency, args.max_queue, config.LLM_QUEUE_MAX_PER_USER, args.max_wait, config.LLM_PAID_PRIORITY_WEIGHT)
+    timeout = args.timeout / args.speedup
+    started = time.monotonic()
+    results = []
+
+    async def one_request(at: float, user_id: str, priority: str, work: float):
+        await asyncio.sleep(at / args.speedup)
+        sent = time.monotonic()
+        outcome = "ok"
+        try:
+            async with asyncio.timeout(timeout):
+                if scheduler is None:
+                    await server.generate(work)
+                else:
+                    async with scheduler.slot(user_id, priority):
+                        await server.generate(work)
+        except SchedulerBusy:
+            outcome = "busy"
+        except TimeoutError:
+            outcome = "timeout"
+        results.append({"priority": priority, "outcome": outcome, "latency_s": (time.monotonic() - sent) * args.speedup})
+
+    await asyncio.gather(*(one_request(*request) for request in plan))
+    elapsed = (time.monotonic() - started) * args.speedup
+    server.close()
+    return _summarize(results, elapsed)
+
+
+def _percentile(values: list, fraction: float):
+    if not values:
+        return None
+    values = sorted(values)
+    return round(values[min(len(values) - 1, int(len(values) * fraction))], 2)
+
+
+def _summarize(results: list, elapsed: float) -> dict:
+    ok = [r for r in results if r["outcome"] == "ok"]
+    summary = {
+        "completed": len(ok),
+        "busy": sum(r["outcome"] == "busy" for r in results),
+        "timeout": sum(r["outcome"] == "timeout" for r in results),
+        "throughput_per_min": round(len(ok) / elapsed * 60, 2) if elapsed else 0.0,
+        "latency_p50_s": _percentile([r["latency_s"] for r in ok], 0.5),
+        "latency_p95_s": _percentile([r["latency_s"] for r in ok], 0.95),
+    }
+    for priority in (PAID, STANDARD):
+        summary[f"{priority}_p95_s"] = _percentile([r["latency_s"] for r in ok if r["priority"] == priority], 0.95)
+    return summary
+
+
+def _build_plan(args) -> list:
+    rng = random.Random(args.seed)
+    plan = []
+    for i in range(args.requests):
+        user_id = f"user-{rng.randrange(args.users)}"
+        priority = PAID if int(user_id.split("-")[1]) < args.users * args.paid_fraction else STANDARD
+        work = max(0.5, rng.gauss(args.work_seconds, args.work_seconds / 4))
+        plan.append((rng.uniform(0, args.burst_seconds), user_id, priority, work))
+    return plan
+
+
+async def run_llm_scheduler_benchmark(args) -> dict:
+    plan = _build_plan(args)
+    return {
+        "requests": len(plan),
+        "summary": {mode: await _run_mode(mode, plan, args) for mode in ("unbounded", "scheduler")},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare unbounded Ollama concurrency against the LLM scheduler under a burst")
+    parser.add_argument("--requests", type=int, default=40)
+    parser.add_argument("--users", type=int, default=25)
+    parser.add_argument("--paid-fraction", type=float, default=0.3)
+    parser.add_argument("--burst-seconds", type=float, default=10.0, help="all requests arrive within this window")
+    parser.add_argument("--work-seconds", type=float, default=3.0, help="mean single-request generation time on an idle server")
+    parser.add_argument("--contention", type=float, default=0.05, help="efficiency loss per extra concurrent request")
+    parser.add_argument("--timeout", type=float, default=config.OLLAMA_READ_TIMEOUT_SECONDS)
+    parser.add_argument("--concurrency", type=int, default=config.LLM_MAX_CONCURRENT_REQUESTS)
+    parser.add_argument("--max-queue", type=int, default=config.LLM_QUEUE_MAX_SIZE)
+    parser.add_argument("--max-wait", type=float, default=config.LLM_QUEUE_MAX_WAIT_SECONDS)
+    parser.add_argument("--speedup", type=float, default=50.0, help="simulated seconds per wall-clock second")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", action="store_true", help="print the raw result as JSON")
+    args = parser.parse_args()
+    # زمان انتظار صف به زمان شبیه‌سازی تبدیل می‌شود
+    args.max_wait /= args.speedup
+
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    result = asyncio.run(run_llm_scheduler_benchmark(args))
+    if args.json:
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+        return
+    print(f"requests={result['requests']}, concurrency={args.concurrency}, max_queue={args.max_queue}")
+    columns = ("completed", "busy", "timeout", "throughput_per_min", "latency_p50_s", "latency_p95_s", "paid_p95_s", "standard_p95_s")
+    print(f"{'mode':>10} " + " ".join(f"{column:>18}" for column in columns))
+    for mode, summary in result["summary"].items():
+        print(f"{mode:>10} " + " ".join(f"{str(summary.get(column, '-')):>18}" for column in columns))
+
+
+if __name__ == "__main__":
+    main()
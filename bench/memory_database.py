@@ -0,0 +1,196 @@
+# -*- coding: utf-8 -*-
+"""
+یک جایگزین درون‌حافظه‌ای برای توابع ماژول database، تا بنچمارک‌ها بدون Appwrite اجرا شوند.
+
+فقط کوئری‌های equal (که در کد همگام‌سازی استفاده می‌شوند) پشتیبانی می‌شوند و بقیه
+کوئری‌ها (limit، order و ...) نادیده گرفته می‌شوند. تمام خواندن‌ها و نوشتن‌ها شمرده می‌شوند.
+"""
+import contextlib
+import json
+import re
+import threading
+import uuid
+from collections import Counter
+
+_LEGACY_QUERY_RE = re.compile(r'^(\w+)\("([^"]+)"(?:,\s*(.*))?\)$')
+
+WRITE_OPERATIONS = {"create_document", "create_documents", "upsert_document", "update_document", "delete_document"}
+
+
+def _parse_query(query: str) -> tuple[str, str | None, list]:
+    """کوئری Appwrite را (چه فرمت JSON جدید و چه فرمت قدیمی متنی) به (method, attribute, values) تبدیل می‌کند."""
+    try:
+        parsed = json.loads(query)
+        return parsed.get("method"), parsed.get("attribute"), parsed.get("values") or []
+    except (TypeError, ValueError):
+        match = _LEGACY_QUERY_RE.match(str(query))
+        if not match:
+            return "", None, []
+        method, attribute, raw_values = match.groups()
+        try:
+            values = json.loads(raw_values) if raw_values else []
+        except ValueError:
+            values = []
+        return method, attribute, values if isinstance(values, list) else [values]
+
+
+class MemoryDatabase:
+    """ذخیره‌ساز درون‌حافظه‌ای با همان امضای توابع ماژول database."""
+
+    def __init__(self):
+        self.collections = {}  # (database_id, collection_id) -> {doc_id: doc}
+        self.operations = Counter()
+        self._lock = threading.Lock()
+
+    # --- Helpers ---
+
+    def _collection(self, database_id, collection_id) -> dict:
+        return self.collections.setdefault((database_id, collection_id), {})
+
+    @staticmethod
+    def _matches(doc: dict, queries) -> bool:
+        for query in queries or []:
+            method, attribute, values = _parse_query(query)
+            if method != "equal" or attribute is None:
+                continue
+            if doc.get(attribute) not in values and str(doc.get(attribute)) not in [str(v) for v in values]:
+                return False
+        return True
+
+    @property
+    def reads(self) -> int:
+        return sum(count for op, count in self.operations.items() if op not in WRITE_OPERATIONS)
+
+    @property
+    def writes(self) -> int:
+        return sum(count for op, count in self.operations.items() if op in WRITE_OPERATIONS)
+
+    def document_count(self) -> int:
+        return sum(len(docs) for docs in self.collections.values())
+
+    def document_bytes(self) -> int:
+        """حجم تقریبی داده‌های ذخیره شده (JSON کد شده با UTF-8)."""
+        return sum(len(json.dumps(doc, ensure_ascii=False).encode("utf-8")) for docs in self.collections.values() for doc in docs.values())
+
+    # --- database.* API ---
+
+    def create_document(self, database_id, collection_id, data):
+        with self._lock:
+            self.operations["create_document"] += 1
+            doc = dict(data, **{"$id": uuid.uuid4().hex})
+            self._collection(database_id, collection_id)[doc["$id"]] = doc
+            return dict(doc)
+
+    def create_documents(self, database_id, collection_id, documents):
+        with self._lock:
+            self.operations["create_documents"] += 1
+            created = []
+            for data in documents:
+                doc = dict(data)
+                doc.setdefault("$id", uuid.uuid4().hex)
+                self._collection(database_id, collection_id)[doc["$id"]] = doc
+                created.append(dict(doc))
+            return {"total": len(created), "documents": created}
+
+    def get_documents(self, database_id, collection_id, queries=None):
+        with self._lock:
+            self.operations["get_documents"] += 1
+            docs = self._collection(database_id, collection_id).values()
+            return [dict(d) for d in docs if self._matches(d, queries)][:500]
+
+    def iter_documents(self, database_id, collection_id, queries=None, page_size=100):
+        with self._lock:
+            self.operations["get_documents"] += 1
+            docs = [dict(d) for d in self._collection(database_id, collection_id).values() if self._matches(d, queries)]
+        yield from docs
+
+    def list_documents_page(self, database_id, collection_id, queries=None, limit=100, cursor_after=None):
+        with self._lock:
+            self.operations["list_documents_page"] += 1
+            docs = [dict(d) for d in self._collection(database_id, collection_id).values() if self._matches(d, queries)]
+        if cursor_after:
+            ids = [d["$id"] for d in docs]
+            docs = docs[ids.index(cursor_after) + 1:] if cursor_after in ids else []
+        return docs[:limit]
+
+    def get_single_document(self, database_id, collection_id, key, value):
+        with self._lock:
+            self.operations["get_single_document"] += 1
+            for doc in self._collection(database_id, collection_id).values():
+                if str(doc.get(key)) == str(value):
+                    return dict(doc)
+            return None
+
+    def get_single_document_by_id(self, database_id, collection_id, document_id):
+        with self._lock:
+            self.operations["get_single_document_by_id"] += 1
+            doc = self._collection(database_id, collection_id).get(document_id)
+            return dict(doc) if doc else None
+
+    def upsert_document(self, database_id, collection_id, query_key, query_value, data):
+        with self._lock:
+            self.operations["upsert_document"] += 1
+            collection = self._collection(database_id, collection_id)
+            for doc in collection.values():
+                if str(doc.get(query_key)) == str(query_value):
+                    doc.update(data)
+                    return dict(doc)
+            doc = dict(data, **{"$id": uuid.uuid4().hex})
+            doc.setdefault(query_key, query_value)
+            collection[doc["$id"]] = doc
+            return dict(doc)
+
+    def update_document(self, database_id, collection_id, document_id, data):
+        with self._lock:
+            self.operations["update_document"] += 1
+            doc = self._collection(database_id, collection_id)[document_id]
+            doc.update(data)
+            return dict(doc)
+
+    def delete_document(self, database_id, collection_id, document_id):
+        with self._lock:
+            self.operations["delete_document"] += 1
+            return self._collection(database_id, collection_id).pop(document_id, None) is not None
+
+    def delete_document_by_clickup_id(self, database_id, collection_id, clickup_id_key, clickup_id):
+        doc = self.get_single_document(database_id, collection_id, clickup_id_key, clickup_id)
+        if doc:
+            return self.delete_document(database_id, collection_id, doc["$id"])
+        return False
+
+
+@contextlib.contextmanager
+def patched_database(database_module, memory_db: MemoryDatabase):
+    """توابع ماژول database را موقتاً با نسخه درون‌حافظه‌ای جایگزین می‌کند."""
+    names = [name for name in dir(MemoryDatabase) if not name.startswith("_") and callable(getattr(MemoryDatabase, name))]
+    names = [name for name in names if name not in ("document_count", "document_bytes")]
+    originals = {name: getattr(database_module, name) for name in names if hasattr(database_module, name)}
+    try:
+        for name in originals:
+            setattr(database_module, name, getattr(memory_db, name))
+        yield memory_db
+    finally:
+        for name, original in originals.items():
+            setattr(database_module, name, original)
+
+
+@contextlib.contextmanager
+def counted_database(database_module, counter: Counter):
+    """برای اجرای بنچمارک روی Appwrite واقعی: فقط تعداد فراخوانی توابع database را می‌شمارد."""
+    names = ["create_document", "create_documents", "get_documents", "list_documents_page", "get_single_document", "get_single_document_by_id",
+             "upsert_document", "update_document", "delete_document"]
+    originals = {name: getattr(database_module, name) for name in names if hasattr(database_module, name)}
+
+    def wrap(name, func):
+        def wrapper(*args, **kwargs):
+            counter[name] += 1
+            return func(*args, **kwargs)
+        return wrapper
+
+    try:
+        for name, func in originals.items():
+            setattr(database_module, name, wrap(name, func))
+        yield counter
+    finally:
+        for name, original in originals.items():
+            setattr(database_module, name, original)
@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+"""
+بنچمارک روتر: پرامپت ثابت (همه مثال‌ها) را با انتخاب پویای k مثال شبیه‌تر مقایسه می‌کند.
+
+ارزیابی به صورت leave-one-out روی بانک مثال‌ها انجام می‌شود: هر مثال به عنوان پیام کاربر استفاده و از هر دو
+پرامپت حذف می‌شود تا مدل جواب را مستقیماً در پرامپت نبیند.
+
+- حالت پیش‌فرض (بدون Ollama): طول پرامپت و درصد مواردی که مثالی از ابزار درست بین مثال‌های انتخاب شده هست،
+  و مثال‌های دستوری که مسیریاب قاعده‌محور اشتباهاً مستقیم no_op کرده است (pre_router_misses).
+- با --live: هر پرامپت به Ollama تنظیم شده در config فرستاده می‌شود و تعداد توکن پرامپت (prompt_eval_count)،
+  زمان پاسخ و دقت انتخاب ابزار و آرگومان‌ها گزارش می‌شود.
+
+نمونه:
+    python -m bench.router_benchmark
+    python -m bench.router_benchmark --live --k 4 --limit 20
+"""
+import argparse
+import asyncio
+import json
+import logging
+import statistics
+import time
+
+import httpx
+
+import config
+from ai import prompts
+from ai.pre_router import NO_OP, pre_route
+from ai.router_examples import EXAMPLES, ExampleSelector, render_examples
+
+logger = logging.getLogger(__name__)
+
+
+def _prompt_for(mode: str, example, selector: ExampleSelector, k: int) -> tuple[str, list]:
+    if mode == "static":
+        shots = [other for other in EXAMPLES if other is not example]
+    else:
+        shots = selector.select(example.text, k, exclude=example)
+    return prompts.TOOL_ROUTER_INSTRUCTIONS + "\n" + render_examples(shots) + "\n", shots
+
+
+async def _ask_router(client: httpx.AsyncClient, system_prompt: str, text: str) -> dict:
+    payload = {
+        "model": config.OLLAMA_MODEL,
+        "messages": [{"role": "system", "content": system_prompt}, {"role": "user", "content": text}],
+        "format": "json",
+        "stream": False,
+        "keep_alive": config.OLLAMA_MODEL_KEEP_ALIVE,
+        "options": {"temperature": 0},
+    }
+    started = time.perf_counter()
+    response = await client.post("/api/chat", json=payload)
+    response.raise_for_status()
+    body = response.json()
+    try:
+        step = (json.loads(body["message"]["content"]).get("steps") or [{}])[0]
+    except (ValueError, AttributeError):
+        step = {}
+    return {
+        "latency_s": time.perf_counter() - started,
+        "prompt_tokens": body.get("prompt_eval_count"),
+        "tool_name": step.get("tool_name"),
+        "arguments": step.get("arguments") or {},
+    }
+
+
+def _summarize(rows: list) -> dict:
+    summary = {
+        "cases": len(rows),
+        "prompt_chars_mean": round(statistics.mean(r["prompt_chars"] for r in rows)),
+        "tool_in_shots": round(sum(r["tool_in_shots"] for r in rows) / len(rows), 3),
+    }
+    live = [r for r in rows if "tool_name" in r]
+    if live:
+        latencies = sorted(r["latency_s"] for r in live)
+        tokens = [r["prompt_tokens"] for r in live if r["prompt_tokens"] is not None]
+        summary.update({
+            "prompt_tokens_mean": round(statistics.mean(tokens)) if tokens else None,
+            "latency_p50_s": round(latencies[len(latencies) // 2], 3),
+            "latency_p95_s": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))], 3),
+            "tool_accuracy": round(sum(r["tool_correct"] for r in live) / len(live), 3),
+            "exact_match": round(sum(r["exact_match"] for r in live) / len(live), 3),
+        })
+    return summary
+
+
+async def run_router_benchmark(k: int, live: bool = False, limit: int | None = None) -> dict:
+    selector = ExampleSelector(EXAMPLES)
+    cases = EXAMPLES[:limit] if limit else EXAMPLES
+    results = {"static": [], "dynamic": []}
+    timeout = httpx.Timeout(config.OLLAMA_READ_TIMEOUT_SECONDS, connect=config.OLLAMA_CONNECT_TIMEOUT_SECONDS)
+    async with httpx.AsyncClient(base_url=config.OLLAMA_BASE_URL, timeout=timeout) as client:
+        for example in cases:
+            for mode in ("static", "dynamic"):
+                system_prompt, shots = _prompt_for(mode, example, selector, k)
+                row = {
+                    "text": example.text,
+                    "expected_tool": example.tool_name,
+                    "prompt_chars": len(system_prompt),
+                    "tool_in_shots": any(shot.tool_name == example.tool_name for shot in shots),
+                }
+                if live:
+                    answer = await _ask_router(client, system_prompt, example.text)
+                    row.update(answer)
+                    row["tool_correct"] = answer["tool_name"] == example.tool_name
+                    row["exact_match"] = row["tool_correct"] and answer["arguments"] == example.arguments
+                results[mode].append(row)
+    return {
+        "model": config.OLLAMA_MODEL if live else None,
+        "k": k,
+        "examples_in_bank": len(EXAMPLES),
+        "summary": {mode: _summarize(rows) for mode, rows in results.items()},
+        "pre_router_misses": [example.text for example in cases if example.tool_name != NO_OP and pre_route(example.text) == NO_OP],
+        "cases": results,
+    }
+
+
+def _print_report(result: dict):
+    print(f"bank={result['examples_in_bank']} examples, k={result['k']}, model={result['model'] or '-(offline)'}")
+    columns = ("cases", "prompt_chars_mean", "tool_in_shots", "prompt_tokens_mean", "latency_p50_s", "latency_p95_s", "tool_accuracy", "exact_match")
+    print(f"{'mode':>8} " + " ".join(f"{column:>18}" for column in columns))
+    for mode, summary in result["summary"].items():
+        print(f"{mode:>8} " + " ".join(f"{str(summary.get(column, '-')):>18}" for column in columns))
+    print(f"pre_router_misses={len(result['pre_router_misses'])}")
+    for text in result["pre_router_misses"]:
+        print(f"  {text}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the static router prompt against dynamic few-shot selection")
+    parser.add_argument("--k", type=int, default=config.ROUTER_FEW_SHOT_K, help="examples selected per message")
+    parser.add_argument("--live", action="store_true", help="send prompts to the Ollama server from config")
+    parser.add_argument("--limit", type=int, default=None, help="evaluate only the first N examples")
+    parser.add_argument("--json", action="store_true", help="print the raw result as JSON")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    result = asyncio.run(run_router_benchmark(args.k, args.live, args.limit))
+    if args.json:
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+    else:
+        _print_report(result)
+
+
+if __name__ == "__main__":
+    main()
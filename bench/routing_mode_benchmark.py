@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+"""
+بنچمارک حالت مسیریابی: خط لوله دو فراخوانی (روتر JSON و سپس مدل چت برای no_op) را با حالت ترکیبی
+(یک فراخوانی که یا برنامه ابزار یا پاسخ مکالمه را برمی‌گرداند) روی مثال‌های روتر مقایسه می‌کند.
+
+ارزیابی leave-one-out است: هر مثال به عنوان پیام کاربر استفاده و از مثال‌های few-shot پرامپت حذف می‌شود.
+پیام‌هایی که مسیریاب قاعده‌محور (pre_router) مستقیماً به چت می‌فرستد در هر دو حالت یک فراخوانی دارند؛ تعداد آن‌ها
+فقط در گزارش آورده می‌شود و همه مثال‌ها از مسیر LLM ارزیابی می‌شوند.
+
+- حالت پیش‌فرض (بدون Ollama): طول پرامپت سیستمی هر حالت.
+- با --live: هر مثال به Ollama تنظیم شده در config فرستاده می‌شود و زمان کل پاسخ (p50/p95، کل و فقط no_op)،
+  تعداد فراخوانی مدل، دقت انتخاب ابزار و آرگومان‌ها و درصد no_opهایی که پاسخ دارند گزارش می‌شود.
+
+نمونه:
+    python -m bench.routing_mode_benchmark
+    python -m bench.routing_mode_benchmark --live --limit 20 --json
+"""
+import argparse
+import asyncio
+import json
+import logging
+import statistics
+import time
+
+import httpx
+
+import config
+from ai import prompts, pre_router
+from ai.router_examples import EXAMPLES, ExampleSelector, STATIC_ROUTER_PROMPT, render_examples
+
+logger = logging.getLogger(__name__)
+
+MODES = ("two_call", "combined")
+
+
+def _router_prompt(example, selector: ExampleSelector, k: int, combined: bool) -> str:
+    if config.ROUTER_DYNAMIC_FEW_SHOT:
+        prompt = prompts.TOOL_ROUTER_INSTRUCTIONS + "\n" + render_examples(selector.select(example.text, k, exclude=example)) + "\n"
+    else:
+        prompt = STATIC_ROUTER_PROMPT
+    return prompt + prompts.COMBINED_REPLY_INSTRUCTIONS if combined else prompt
+
+
+async def _chat(client: httpx.AsyncClient, system_prompt: str, text: str, json_format: bool, temperature: float) -> dict:
+    payload = {
+        "model": config.OLLAMA_MODEL,
+        "messages": [{"role": "system", "content": system_prompt}, {"role": "user", "content": text}],
+        "stream": False,
+        "keep_alive": config.OLLAMA_MODEL_KEEP_ALIVE,
+        "options": {"temperature": temperature},
+    }
+    if json_format:
+        payload["format"] = "json"
+    response = await client.post("/api/chat", json=payload)
+    response.raise_for_status()
+    return response.json()
+
+
+def _parse_plan(content: str) -> dict:
+    try:
+        plan = json.loads(content)
+    except ValueError:
+        return {}
+    return plan if isinstance(plan, dict) else {}
+
+
+async def _run_case(client: httpx.AsyncClient, mode: str, example, selector: ExampleSelector, k: int) -> dict:
+    combined = mode == "combined"
+    started = time.perf_counter()
+    body = await _chat(client, _router_prompt(example, selector, k, combined), example.text, True, 0.3 if combined else 0)
+    plan = _parse_plan(body["message"]["content"])
+    step = (plan.get("steps") or [{}])[0] if isinstance(plan.get("steps"), list) else {}
+    tool_name = step.get("tool_name")
+    calls = 1
+    reply = plan.get("reply") if combined else None
+    if tool_name == "no_op" and not combined:
+        chat_body = await _chat(client, prompts.CHAT_PROMPT, example.text, False, 0.7)
+        reply = chat_body["message"]["content"]
+        calls = 2
+    return {
+        "latency_s": time.perf_counter() - started,
+        "llm_calls": calls,
+        "tool_name": tool_name,
+        "tool_correct": tool_name == example.tool_name,
+        "exact_match": tool_name == example.tool_name and (step.get("arguments") or {}) == example.arguments,
+        "has_reply": bool(isinstance(reply, str) and reply.strip()) if tool_name == "no_op" else None,
+    }
+
+
+def _percentile(values: list, fraction: float):
+    if not values:
+        return None
+    values = sorted(values)
+    return round(values[min(len(values) - 1, int(len(values) * fraction))], 3)
+
+
+def _summarize(rows: list) -> dict:
+    summary = {
+        "cases": len(rows),
+        "prompt_chars_mean": round(statistics.mean(r["prompt_chars"] for r in rows)),
+    }
+    live = [r for r in rows if "latency_s" in r]
+    if live:
+        no_op = [r for r in live if r["expected_tool"] == "no_op"]
+        replies = [r["has_reply"] for r in live if r["has_reply"] is not None]
+        summary.update({
+            "latency_p50_s": _percentile([r["latency_s"] for r in live], 0.5),
+            "latency_p95_s": _percentile([r["latency_s"] for r in live], 0.95),
+            "no_op_p50_s": _percentile([r["latency_s"] for r in no_op], 0.5),
+            "llm_calls_mean": round(statistics.mean(r["llm_calls"] for r in live), 2),
+            "tool_accuracy": round(sum(r["tool_correct"] for r in live) / len(live), 3),
+            "exact_match": round(sum(r["exact_match"] for r in live) / len(live), 3),
+            "no_op_reply_rate": round(sum(replies) / len(replies), 3) if replies else None,
+        })
+    return summary
+
+
+async def run_routing_mode_benchmark(k: int, live: bool = False, limit: int | None = None) -> dict:
+    selector = ExampleSelector(EXAMPLES)
+    cases = EXAMPLES[:limit] if limit else EXAMPLES
+    results = {mode: [] for mode in MODES}
+    timeout = httpx.Timeout(config.OLLAMA_READ_TIMEOUT_SECONDS, connect=config.OLLAMA_CONNECT_TIMEOUT_SECONDS)
+    async with httpx.AsyncClient(base_url=config.OLLAMA_BASE_URL, timeout=timeout) as client:
+        for example in cases:
+            for mode in MODES:
+                row = {
+                    "text": example.text,
+                    "expected_tool": example.tool_name,
+                    "prompt_chars": len(_router_prompt(example, selector, k, mode == "combined")),
+                }
+                if live:
+                    row.update(await _run_case(client, mode, example, selector, k))
+                results[mode].append(row)
+    return {
+        "model": config.OLLAMA_MODEL if live else None,
+        "k": k,
+        "cases": len(cases),
+        "pre_routed_to_chat": sum(pre_router.pre_route(example.text) is not None for example in cases),
+        "summary": {mode: _summarize(rows) for mode, rows in results.items()},
+        "rows": results,
+    }
+
+
+def _print_report(result: dict):
+    print(f"cases={result['cases']} (pre-routed to chat by rules: {result['pre_routed_to_chat']}), k={result['k']}, model={result['model'] or '-(offline)'}")
+    columns = ("prompt_chars_mean", "latency_p50_s", "latency_p95_s", "no_op_p50_s", "llm_calls_mean", "tool_accuracy", "exact_match", "no_op_reply_rate")
+    print(f"{'mode':>9} " + " ".join(f"{column:>17}" for column in columns))
+    for mode, summary in result["summary"].items():
+        print(f"{mode:>9} " + " ".join(f"{str(summary.get(column, '-')):>17}" for column in columns))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the two-call router+chat pipeline against the combined single-call mode")
+    parser.add_argument("--k", type=int, default=config.ROUTER_FEW_SHOT_K, help="examples selected per message")
+    parser.add_argument("--live", action="store_true", help="send prompts to the Ollama server from config")
+    parser.add_argument("--limit", type=int, default=None, help="evaluate only the first N examples")
+    parser.add_argument("--json", action="store_true", help="print the raw result as JSON")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    result = asyncio.run(run_routing_mode_benchmark(args.k, args.live, args.limit))
+    if args.json:
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+    else:
+        _print_report(result)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+"""
+بنچمارک همگام‌سازی: sync_all_user_data را روی یک workspace مصنوعی و سرور جعلی کلیک‌اپ اجرا
+کرده و زمان کل، تعداد فراخوانی‌های API و تعداد خواندن/نوشتن‌های دیتابیس را گزارش می‌کند.
+
+نمونه:
+    python -m bench.sync_benchmark --size medium --latency-ms 30
+    python -m bench.sync_benchmark --size small --users 3 --json
+    python -m bench.sync_benchmark --size tiny --real-db    # روی Appwrite تنظیم شده در config
+"""
+import argparse
+import asyncio
+import json
+import logging
+import time
+from collections import Counter
+
+import config
+import clickup_api
+import database
+from bench.fake_clickup_server import FakeClickUpServer
+from bench.memory_database import MemoryDatabase, patched_database, counted_database
+from bench.workspace import SIZES, generate_sized_workspace, workspace_stats
+
+logger = logging.getLogger(__name__)
+
+
+async def run_sync_benchmark(size: str, latency_ms: float = 0.0, jitter_ms: float = 0.0, rate_limit: int = 0,
+                             users: int = 1, description_size: int = 400, real_db: bool = False, seed: int = 0) -> dict:
+    """یک دور بنچمارک را اجرا کرده و نتایج را به صورت دیکشنری برمی‌گرداند."""
+    workspace = generate_sized_workspace(size, description_size=description_size, seed=seed)
+    server = FakeClickUpServer(workspace, latency_ms, jitter_ms, rate_limit, seed=seed)
+    base_url = await server.start()
+
+    original_base_url = config.CLICKUP_API_BASE_URL
+    config.CLICKUP_API_BASE_URL = base_url
+    db_counter = Counter()
+    memory_db = MemoryDatabase()
+    db_context = counted_database(database, db_counter) if real_db else patched_database(database, memory_db)
+
+    runs = []
+    plan = None
+    try:
+        with db_context:
+            # حالت dry-run: تعداد درخواست‌های پیش‌بینی شده را قبل از همگام‌سازی واقعی محاسبه می‌کنیم
+            plan = await asyncio.to_thread(clickup_api.plan_sync, "pk_bench_plan", True)
+            # هر کاربر تلگرام با توکن مخصوص خودش همان تیم را همگام‌سازی می‌کند
+            for user_index in range(users):
+                server.reset_stats_counters()
+                reads_before = memory_db.reads if not real_db else 0
+                writes_before = memory_db.writes if not real_db else 0
+                db_counter.clear()
+
+                started = time.perf_counter()
+                success = await asyncio.to_thread(clickup_api.sync_all_user_data, f"pk_bench_{user_index}", f"{900_000 + user_index}")
+                elapsed = time.perf_counter() - started
+
+                if real_db:
+                    writes = sum(db_counter[op] for op in ("create_document", "create_documents", "upsert_document", "update_document", "delete_document"))
+                    reads = sum(db_counter.values()) - writes
+                else:
+                    writes = memory_db.writes - writes_before
+                    reads = memory_db.reads - reads_before
+
+                runs.append({
+                    "user": user_index,
+                    "success": success,
+                    "wall_time_s": round(elapsed, 3),
+                    "api_calls": sum(server.calls.values()),
+                    "api_calls_by_route": dict(server.calls),
+                    "rate_limited": server.rate_limited,
+                    "db_reads": reads,
+                    "db_writes": writes,
+                })
+    finally:
+        config.CLICKUP_API_BASE_URL = original_base_url
+        await server.stop()
+
+    return {
+        "size": size,
+        "workspace": workspace_stats(workspace),
+        "latency_ms": latency_ms,
+        "rate_limit_per_minute": rate_limit,
+        "real_db": real_db,
+        "stored_documents": None if real_db else memory_db.document_count(),
+        "stored_bytes": None if real_db else memory_db.document_bytes(),
+        "planned_api_calls": plan["total_calls"] if plan else None,
+        "runs": runs,
+        "total": {
+            "wall_time_s": round(sum(r["wall_time_s"] for r in runs), 3),
+            "api_calls": sum(r["api_calls"] for r in runs),
+            "db_writes": sum(r["db_writes"] for r in runs),
+        },
+    }
+
+
+def _print_report(result: dict):
+    print(f"workspace={result['size']} {result['workspace']} latency={result['latency_ms']}ms real_db={result['real_db']}")
+    print(f"{'user':>4} {'ok':>3} {'wall(s)':>9} {'api':>7} {'429s':>5} {'db_r':>8} {'db_w':>8}")
+    for run in result["runs"]:
+        print(f"{run['user']:>4} {'y' if run['success'] else 'n':>3} {run['wall_time_s']:>9.3f} {run['api_calls']:>7} "
+              f"{run['rate_limited']:>5} {run['db_reads']:>8} {run['db_writes']:>8}")
+    total = result["total"]
+    print(f"total: wall={total['wall_time_s']}s api_calls={total['api_calls']} db_writes={total['db_writes']}"
+          + (f" stored_documents={result['stored_documents']} stored_bytes={result['stored_bytes']}" if result['stored_documents'] is not None else ""))
+    if result["planned_api_calls"] is not None and result["runs"]:
+        print(f"planned api calls (dry-run): {result['planned_api_calls']} vs actual first run: {result['runs'][0]['api_calls']}")
+    print("api calls by route (last run):")
+    for route, count in sorted(result["runs"][-1]["api_calls_by_route"].items(), key=lambda item: -item[1]):
+        print(f"  {count:>7}  {route}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark clickup_api.sync_all_user_data against a local fake ClickUp")
+    parser.add_argument("--size", choices=SIZES.keys(), default="small")
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--rate-limit", type=int, default=0, help="requests per minute per token (0 = unlimited)")
+    parser.add_argument("--users", type=int, default=1, help="number of telegram users syncing the same team")
+    parser.add_argument("--description-size", type=int, default=400)
+    parser.add_argument("--real-db", action="store_true", help="write to the Appwrite instance from config instead of memory")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", action="store_true", help="print the raw result as JSON")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    result = asyncio.run(run_sync_benchmark(
+        args.size, args.latency_ms, args.jitter_ms, args.rate_limit, args.users,
+        args.description_size, args.real_db, args.seed,
+    ))
+    if args.json:
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+    else:
+        _print_report(result)
+
+
+if __name__ == "__main__":
+    main()
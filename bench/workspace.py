@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+"""
+تولید workspaceهای مصنوعی کلیک‌اپ برای بنچمارک همگام‌سازی.
+
+خروجی generate_workspace یک دیکشنری ساده است که سرور جعلی (fake_clickup_server)
+مستقیماً از روی آن به درخواست‌ها پاسخ می‌دهد. ساختار داده‌ها تا حد امکان شبیه
+پاسخ‌های واقعی API نسخه ۲ کلیک‌اپ است.
+"""
+import math
+import random
+
+# --- اندازه‌های از پیش تعریف شده ---
+SIZES = {
+    "tiny": {"lists": 10, "tasks": 200},
+    "small": {"lists": 10, "tasks": 1_000},
+    "medium": {"lists": 100, "tasks": 10_000},
+    "large": {"lists": 1_000, "tasks": 100_000},
+}
+
+LISTS_PER_FOLDER = 5
+FOLDERS_PER_SPACE = 4
+FOLDERLESS_LISTS_PER_SPACE = 2
+DEFAULT_STATUSES = ["to do", "in progress", "review", "complete"]
+
+_WORDS = [
+    "طراحی", "بررسی", "پیاده‌سازی", "تست", "گزارش", "جلسه", "مستندات", "بهینه‌سازی",
+    "design", "review", "deploy", "refactor", "api", "backend", "frontend", "release",
+]
+
+
+def _name(rng: random.Random, prefix: str, index: int) -> str:
+    return f"{prefix} {rng.choice(_WORDS)} {index}"
+
+
+def _description(rng: random.Random, size: int) -> str:
+    if size <= 0:
+        return ""
+    words = []
+    length = 0
+    while length < size:
+        word = rng.choice(_WORDS)
+        words.append(word)
+        length += len(word) + 1
+    return " ".join(words)[:size]
+
+
+def generate_workspace(lists: int = 10, tasks: int = 1_000, members: int = 20, description_size: int = 400, seed: int = 0) -> dict:
+    """
+    یک workspace مصنوعی با یک تیم، تعداد مشخصی لیست و تسک تولید می‌کند.
+    تسک‌ها به صورت یکنواخت بین لیست‌ها پخش می‌شوند.
+    """
+    rng = random.Random(seed)
+    team_id = "9000001"
+    next_id = 100_000
+
+    def new_id() -> str:
+        nonlocal next_id
+        next_id += 1
+        return str(next_id)
+
+    team_members = [
+        {"user": {"id": 5_000_000 + i, "username": f"member{i}", "email": f"member{i}@example.com"}}
+        for i in range(members)
+    ]
+    workspace = {
+        "teams": [{"id": team_id, "name": "Benchmark Team", "members": team_members}],
+        "spaces": {},    # space_id -> space
+        "folders": {},   # folder_id -> folder
+        "lists": {},     # list_id -> list
+        "tasks": {},     # task_id -> task
+        "team_spaces": {team_id: []},
+        "space_folders": {},
+        "space_lists": {},
+        "folder_lists": {},
+        "list_tasks": {},
+    }
+
+    lists_per_space = FOLDERS_PER_SPACE * LISTS_PER_FOLDER + FOLDERLESS_LISTS_PER_SPACE
+    space_count = max(1, math.ceil(lists / lists_per_space))
+    created_lists = []
+
+    for s in range(space_count):
+        space_id = new_id()
+        workspace["spaces"][space_id] = {"id": space_id, "name": _name(rng, "Space", s), "statuses": [{"status": st} for st in DEFAULT_STATUSES]}
+        workspace["team_spaces"][team_id].append(space_id)
+        workspace["space_folders"][space_id] = []
+        workspace["space_lists"][space_id] = []
+
+        for f in range(FOLDERS_PER_SPACE):
+            if len(created_lists) >= lists:
+                break
+            folder_id = new_id()
+            workspace["folders"][folder_id] = {"id": folder_id, "name": _name(rng, "Folder", f), "space": {"id": space_id}}
+            workspace["space_folders"][space_id].append(folder_id)
+            workspace["folder_lists"][folder_id] = []
+            for _ in range(LISTS_PER_FOLDER):
+                if len(created_lists) >= lists:
+                    break
+                list_id = new_id()
+                workspace["lists"][list_id] = {"id": list_id, "name": _name(rng, "List", len(created_lists)), "folder": {"id": folder_id}, "space": {"id": space_id}}
+                workspace["folder_lists"][folder_id].append(list_id)
+                created_lists.append(list_id)
+
+        for _ in range(FOLDERLESS_LISTS_PER_SPACE):
+            if len(created_lists) >= lists:
+                break
+            list_id = new_id()
+            workspace["lists"][list_id] = {"id": list_id, "name": _name(rng, "List", len(created_lists)), "folder": {"hidden": True}, "space": {"id": space_id}}
+            workspace["space_lists"][space_id].append(list_id)
+            created_lists.append(list_id)
+
+    for list_id in created_lists:
+        workspace["list_tasks"][list_id] = []
+
+    base_ts = 1_735_689_600_000  # 2025-01-01
+    for t in range(tasks):
+        list_id = created_lists[t % len(created_lists)]
+        task_id = f"t{new_id()}"
+        assignee = rng.choice(team_members)["user"]
+        description = _description(rng, description_size)
+        workspace["tasks"][task_id] = {
+            "id": task_id,
+            "name": _name(rng, "Task", t),
+            "description": description,
+            "text_content": description,
+            "status": {"status": rng.choice(DEFAULT_STATUSES)},
+            "priority": {"priority": rng.choice(["urgent", "high", "normal", "low"])},
+            "assignees": [assignee],
+            "list": {"id": list_id},
+            "team_id": team_id,
+            "start_date": str(base_ts + t * 60_000),
+            "due_date": str(base_ts + (t + 1440) * 60_000),
+            "date_updated": str(base_ts + t * 1_000),
+            "url": f"https://app.clickup.com/t/{task_id}",
+        }
+        workspace["list_tasks"][list_id].append(task_id)
+
+    return workspace
+
+
+def generate_sized_workspace(size: str, **kwargs) -> dict:
+    """یک workspace با یکی از اندازه‌های از پیش تعریف شده در SIZES تولید می‌کند."""
+    if size not in SIZES:
+        raise ValueError(f"Unknown workspace size '{size}'. Choose one of: {', '.join(SIZES)}")
+    params = dict(SIZES[size])
+    params.update(kwargs)
+    return generate_workspace(**params)
+
+
+def workspace_stats(workspace: dict) -> dict:
+    return {
+        "teams": len(workspace["teams"]),
+        "spaces": len(workspace["spaces"]),
+        "folders": len(workspace["folders"]),
+        "lists": len(workspace["lists"]),
+        "tasks": len(workspace["tasks"]),
+    }
@@ -0,0 +1,240 @@
+# -*- coding: utf-8 -*-
+"""
+ثبت لاگ مکالمه‌های هوش مصنوعی در پس‌زمینه.
+
+- log() فقط رکورد را در یک صف درون‌حافظه‌ای با سقف max_queue قرار می‌دهد و هیچ‌وقت منتظر دیتابیس نمی‌ماند؛
+  اگر صف پر باشد رکورد دور انداخته و در متریک chat_log_dropped_total شمرده می‌شود.
+- یک worker رکوردها را دسته‌ای (حداکثر batch_size رکورد یا هر flush_interval ثانیه) با یک درخواست در
+  CHAT_LOGS_COLLECTION_ID می‌نویسد.
+- اگر Appwrite در دسترس نباشد (خطای 5xx، اتصال، محدودیت نرخ یا دسترسی)، دسته در فایل محلی fallback_path (هر خط یک JSON،
+  فقط اضافه می‌شود) ذخیره می‌شود و پس از راه‌اندازی مجدد یا اولین نوشتن موفق بعدی، دوباره به Appwrite فرستاده می‌شود.
+- اگر دسته با خطای 4xx مربوط به خود سندها رد شود، رکوردها یکی‌یکی نوشته می‌شوند و رکوردهای نامعتبر
+  با دلیل rejected دور انداخته می‌شوند تا رکوردهای سالم همان دسته از دست نروند.
+- هنگام خاموش شدن، رکوردهای باقی‌مانده در صف نوشته می‌شوند.
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+from datetime import datetime
+
+import config
+import database
+import metrics
+
+logger = logging.getLogger(__name__)
+
+CHAT_LOG_ENTRIES = metrics.counter("chat_log_entries_total", "Chat log entries by destination (appwrite, fallback_file, replayed)", ("destination",))
+CHAT_LOG_DROPPED = metrics.counter("chat_log_dropped_total", "Chat log entries that were lost", ("reason",))
+CHAT_LOG_BATCH_SIZE = metrics.histogram("chat_log_batch_size", "Entries written per chat log flush", buckets=(1, 5, 10, 25, 50, 100))
+
+_STOP = object()
+
+# خطاهای 4xx که به تنظیمات یا بار سرور مربوط‌اند و نه به محتوای سند
+_UNAVAILABLE_CLIENT_ERRORS = {401, 403, 404, 408, 429}
+
+
+def _is_rejection(error: Exception) -> bool:
+    """آیا Appwrite خود سند را نپذیرفته است (مثلاً فیلد طولانی‌تر از حد)؛ خطای اتصال کد ندارد."""
+    code = getattr(error, 'code', None)
+    return isinstance(code, int) and 400 <= code < 500 and code not in _UNAVAILABLE_CLIENT_ERRORS
+
+
+class ChatLogWriter:
+    def __init__(self, max_queue: int, batch_size: int, flush_interval: float, fallback_path: str):
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.fallback_path = fallback_path
+        # صف بدون سقف است تا علامت توقف همیشه جا شود؛ سقف رکوردها در log() اعمال می‌شود
+        self._queue = asyncio.Queue()
+        self._appwrite_failed = False
+        self._worker = asyncio.create_task(self._run())
+
+    def qsize(self) -> int:
+        return self._queue.qsize()
+
+    def log(self, entry: dict):
+        if self._queue.qsize() >= self.max_queue:
+            CHAT_LOG_DROPPED.inc(reason="queue_full")
+            return
+        self._queue.put_nowait(entry)
+
+    async def _next_batch(self) -> tuple[list, bool]:
+        """رکوردهای دسته بعدی و اینکه علامت توقف دریافت شده است یا نه."""
+        first = await self._queue.get()
+        if first is _STOP:
+            return [], True
+        batch = [first]
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                entry = await asyncio.wait_for(self._queue.get(), remaining)
+            except asyncio.TimeoutError:
+                break
+            if entry is _STOP:
+                return batch, True
+            batch.append(entry)
+        return batch, False
+
+    async def _run(self):
+        # هر خطای پیش‌بینی نشده فقط لاگ می‌شود؛ توقف worker باعث پر شدن صف و از دست رفتن همه لاگ‌های بعدی می‌شد
+        if os.path.exists(self.fallback_path):
+            try:
+                await asyncio.to_thread(self._replay_fallback)
+            except Exception as e:
+                logger.error(f"ارسال دوباره لاگ‌های فایل {self.fallback_path} ناموفق بود: {e}", exc_info=True)
+        while True:
+            batch, stopping = await self._next_batch()
+            if batch:
+                try:
+                    await asyncio.to_thread(self._flush, batch)
+                except Exception as e:
+                    logger.error(f"نوشتن دسته لاگ مکالمه ناموفق بود: {e}", exc_info=True)
+            if stopping:
+                return
+
+    # --- نوشتن (توابع همگام؛ با asyncio.to_thread اجرا می‌شوند) ---
+
+    def _mark_unavailable(self, error: Exception):
+        if not self._appwrite_failed:
+            logger.error(f"ذخیره لاگ مکالمه در Appwrite ناموفق بود؛ لاگ‌ها در {self.fallback_path} نوشته می‌شوند: {error}")
+        self._appwrite_failed = True
+
+    def _write(self, entries: list, destination: str) -> list:
+        """
+        رکوردها را در Appwrite می‌نویسد و رکوردهایی را برمی‌گرداند که به دلیل در دسترس نبودن Appwrite نوشته نشدند.
+        اگر دسته رد شود، رکوردها یکی‌یکی نوشته و رکوردهای نامعتبر دور انداخته می‌شوند.
+        """
+        try:
+            database.create_documents(config.APPWRITE_CHAT_DATABASE_ID, config.CHAT_LOGS_COLLECTION_ID, entries)
+        except Exception as e:
+            if not _is_rejection(e):
+                self._mark_unavailable(e)
+                return entries
+        else:
+            CHAT_LOG_ENTRIES.inc(len(entries), destination=destination)
+            return []
+
+        for index, entry in enumerate(entries):
+            try:
+                database.create_document(config.APPWRITE_CHAT_DATABASE_ID, config.CHAT_LOGS_COLLECTION_ID, entry)
+            except Exception as e:
+                if not _is_rejection(e):
+                    self._mark_unavailable(e)
+                    return entries[index:]
+                CHAT_LOG_DROPPED.inc(reason="rejected")
+                logger.warning(f"لاگ مکالمه کاربر {entry.get('user_id')} توسط Appwrite رد شد و دور انداخته شد: {e}")
+                continue
+            CHAT_LOG_ENTRIES.inc(destination=destination)
+        return []
+
+    def _flush(self, batch: list):
+        CHAT_LOG_BATCH_SIZE.observe(len(batch))
+        unwritten = self._write(batch, "appwrite")
+        if unwritten:
+            self._append_fallback(unwritten)
+            return
+        if self._appwrite_failed:
+            self._appwrite_failed = False
+            logger.info("ارتباط با Appwrite برقرار شد؛ لاگ‌های ذخیره شده در فایل ارسال می‌شوند.")
+            self._replay_fallback()
+
+    def _append_fallback(self, batch: list):
+        try:
+            with open(self.fallback_path, 'a', encoding='utf-8') as f:
+                f.writelines(json.dumps(entry, ensure_ascii=False) + "\n" for entry in batch)
+        except OSError as e:
+            CHAT_LOG_DROPPED.inc(len(batch), reason="fallback_error")
+            logger.error(f"نوشتن لاگ مکالمه در فایل {self.fallback_path} ناموفق بود: {e}")
+            return
+        CHAT_LOG_ENTRIES.inc(len(batch), destination="fallback_file")
+
+    def _replay_fallback(self):
+        """لاگ‌های فایل محلی را به Appwrite می‌فرستد؛ دسته‌هایی که ارسال نشوند در فایل باقی می‌مانند."""
+        replay_path = f"{self.fallback_path}.replay"
+        try:
+            # فایل ابتدا جابه‌جا می‌شود تا نوشتن‌های جدید (در صورت خطا) به فایل تازه اضافه شوند؛
+            # فایل replay باقی‌مانده از اجرای ناتمام قبلی، پیش از فایل اصلی ارسال می‌شود
+            if not os.path.exists(replay_path):
+                os.replace(self.fallback_path, replay_path)
+            with open(replay_path, encoding='utf-8') as f:
+                lines = [line for line in f if line.strip()]
+        except FileNotFoundError:
+            return
+        except OSError as e:
+            logger.error(f"خواندن فایل لاگ مکالمه {self.fallback_path} ناموفق بود: {e}")
+            return
+
+        entries = []
+        for line in lines:
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                CHAT_LOG_DROPPED.inc(reason="corrupt_line")
+        for start in range(0, len(entries), self.batch_size):
+            unwritten = self._write(entries[start:start + self.batch_size], "replayed")
+            if unwritten:
+                logger.warning("ارسال لاگ‌های ذخیره شده به Appwrite ناموفق بود و بعداً تکرار می‌شود.")
+                self._append_fallback(unwritten + entries[start + self.batch_size:])
+                break
+        os.remove(replay_path)
+        if not self._appwrite_failed and os.path.exists(self.fallback_path):
+            self._replay_fallback()
+
+    async def stop(self, timeout: float):
+        """رکوردهای صف را می‌نویسد؛ اگر تا timeout تمام نشود، باقی‌مانده مستقیماً در فایل محلی نوشته می‌شود."""
+        self._queue.put_nowait(_STOP)
+        try:
+            await asyncio.wait_for(asyncio.shield(self._worker), timeout)
+            return
+        except asyncio.TimeoutError:
+            self._worker.cancel()
+        remaining = []
+        while not self._queue.empty():
+            entry = self._queue.get_nowait()
+            if entry is not _STOP:
+                remaining.append(entry)
+        if remaining:
+            logger.warning(f"{len(remaining)} لاگ مکالمه تا زمان خاموش شدن به Appwrite نرسید و در فایل محلی ذخیره شد.")
+            self._append_fallback(remaining)
+
+
+_writer: ChatLogWriter | None = None
+
+
+def start() -> ChatLogWriter:
+    """نویسنده سراسری لاگ را با تنظیمات config راه‌اندازی می‌کند (باید داخل event loop فراخوانی شود)."""
+    global _writer
+    _writer = ChatLogWriter(
+        max_queue=config.CHAT_LOG_MAX_QUEUE,
+        batch_size=config.CHAT_LOG_BATCH_SIZE,
+        flush_interval=config.CHAT_LOG_FLUSH_INTERVAL_SECONDS,
+        fallback_path=config.CHAT_LOG_FALLBACK_PATH,
+    )
+    metrics.register_queue("chat_log", _writer.qsize)
+    return _writer
+
+
+async def stop():
+    global _writer
+    if _writer is not None:
+        await _writer.stop(config.CHAT_LOG_SHUTDOWN_TIMEOUT_SECONDS)
+        _writer = None
+
+
+def log_chat(user_id: str, user_name: str, user_message: str, bot_response: str, success: bool, error_message: str = None):
+    """یک رکورد لاگ مکالمه را بدون انتظار در صف قرار می‌دهد."""
+    entry = {
+        'user_id': user_id, 'user_name': user_name, 'user_message': user_message, 'bot_response': bot_response,
+        'success': success, 'error_message': error_message, 'timestamp': datetime.now().isoformat(),
+    }
+    if _writer is None:
+        CHAT_LOG_DROPPED.inc(reason="not_started")
+        logger.warning("نویسنده لاگ مکالمه راه‌اندازی نشده است (chat_log.start)؛ لاگ ذخیره نشد.")
+        return
+    _writer.log(entry)
@@ -1,8 +1,13 @@
 # -*- coding: utf-8 -*-
 import requests
 import logging
+import threading
+import time
+from datetime import datetime, timezone, timedelta
 import config
 import database
+import metrics
+import tracing
 from appwrite.query import Query
 
 logger = logging.getLogger(__name__)
@@ -16,28 +21,69 @@ def _make_request(url: str, token: str, method: str = 'GET', **kwargs) -> dict |
         'Authorization': token.encode('utf-8'),
         'Content-Type': 'application/json'
     }
-    try:
-        response = requests.request(method, url, headers=headers, timeout=15, **kwargs)
-        response.raise_for_status()
-        if response.status_code == 204: # No Content
-            return {}
-        return response.json()
-    except requests.exceptions.RequestException as e:
-        logger.error(f"خطا در درخواست API کلیک‌اپ به {url}: {e}")
-        return None
+    route = metrics.normalize_route(url.removeprefix(config.CLICKUP_API_BASE_URL))
+    status = "error"
+    started = time.perf_counter()
+    with tracing.span("clickup", method=method, route=route) as span:
+        try:
+            response = requests.request(method, url, headers=headers, timeout=15, **kwargs)
+            status = str(response.status_code)
+            response.raise_for_status()
+            if response.status_code == 204: # No Content
+                return {}
+            return response.json()
+        except requests.exceptions.RequestException as e:
+            logger.error(f"خطا در درخواست API کلیک‌اپ به {url}: {e}")
+            return None
+        finally:
+            span.set("status", status)
+            metrics.CLICKUP_SECONDS.observe(time.perf_counter() - started, method=method, route=route)
+            metrics.CLICKUP_REQUESTS.inc(method=method, route=route, status=status)
+
+class SyncSession:
+    """
+    یک جلسه همگام‌سازی: درخواست‌های GET یکسان را فقط یک بار ارسال می‌کند و تعداد درخواست‌ها را می‌شمارد.
+    """
+
+    def __init__(self, token: str):
+        self.token = token
+        self.api_calls = 0
+        self.deduped_calls = 0
+        self._responses = {}
+        self._lock = threading.Lock()
+
+    def get(self, url: str, cache: bool = True) -> dict | None:
+        if cache:
+            with self._lock:
+                if url in self._responses:
+                    self.deduped_calls += 1
+                    metrics.record_cache_lookup("clickup_sync_session", True)
+                    return self._responses[url]
+            metrics.record_cache_lookup("clickup_sync_session", False)
+        response = _make_request(url, self.token)
+        with self._lock:
+            self.api_calls += 1
+            if cache and response is not None:
+                self._responses[url] = response
+        return response
+
+def _get(url: str, token: str, session: SyncSession | None = None, cache: bool = True) -> dict | None:
+    if session is not None:
+        return session.get(url, cache=cache)
+    return _make_request(url, token)
 
 def validate_token(token: str) -> dict | None:
     """
     توکن API کلیک‌اپ را اعتبارسنجی می‌کند.
     در صورت موفقیت، اطلاعات کاربر را برمی‌گرداند، در غیر این صورت None.
     """
-    return _make_request("https://api.clickup.com/api/v2/user", token)
+    return _make_request(f"{config.CLICKUP_API_BASE_URL}/user", token)
 
 def delete_task_in_clickup(task_id: str, token: str) -> bool:
     """
     Deletes a task in ClickUp. Returns True if successful or if the task was already deleted (404).
     """
-    url = f"https://api.clickup.com/api/v2/task/{task_id}"
+    url = f"{config.CLICKUP_API_BASE_URL}/task/{task_id}"
     headers = {'Authorization': token.encode('utf-8')}
     try:
         response = requests.delete(url, headers=headers, timeout=15)
@@ -58,48 +104,65 @@ def delete_task_in_clickup(task_id: str, token: str) -> bool:
         return False
 
 def create_task_in_clickup_api(list_id: str, payload: dict, token: str) -> tuple[bool, dict]:
-    response = _make_request(f"https://api.clickup.com/api/v2/list/{list_id}/task", token, 'POST', json=payload)
+    response = _make_request(f"{config.CLICKUP_API_BASE_URL}/list/{list_id}/task", token, 'POST', json=payload)
     return response is not None, response or {}
 
 def update_task_in_clickup_api(task_id: str, payload: dict, token: str) -> tuple[bool, dict]:
-    response = _make_request(f"https://api.clickup.com/api/v2/task/{task_id}", token, 'PUT', json=payload)
+    response = _make_request(f"{config.CLICKUP_API_BASE_URL}/task/{task_id}", token, 'PUT', json=payload)
     return response is not None, response or {}
 
 def get_list_statuses(list_id: str, token: str) -> list:
-    response = _make_request(f"https://api.clickup.com/api/v2/list/{list_id}", token)
+    response = _make_request(f"{config.CLICKUP_API_BASE_URL}/list/{list_id}", token)
     return response.get('statuses', []) if response else []
 
-def get_tasks_from_clickup_list(list_id: str, token: str) -> list:
-    response = _make_request(f"https://api.clickup.com/api/v2/list/{list_id}/task?archived=false&include_closed=true", token)
-    return response.get('tasks', []) if response else []
+def get_tasks_from_clickup_list(list_id: str, token: str, session: SyncSession | None = None) -> list | None:
+    """
+    تمام تسک‌های یک لیست را صفحه به صفحه (هر صفحه حداکثر ۱۰۰ تسک) دریافت می‌کند.
+    اگر دریافت هر یک از صفحات ناموفق باشد None برمی‌گرداند تا لیست ناقص به جای لیست کامل استفاده نشود.
+    """
+    tasks = []
+    page = 0
+    while True:
+        # صفحات تسک‌ها حجیم هستند و در جلسه کش نمی‌شوند
+        response = _get(f"{config.CLICKUP_API_BASE_URL}/list/{list_id}/task?archived=false&include_closed=true&page={page}", token, session, cache=False)
+        if response is None:
+            logger.error(f"دریافت صفحه {page} تسک‌های لیست {list_id} ناموفق بود.")
+            return None
+        page_tasks = response.get('tasks', [])
+        tasks.extend(page_tasks)
+        # کلیک‌اپ در آخرین صفحه last_page=true برمی‌گرداند؛ اگر فیلد نبود، صفحه خالی پایان کار است
+        if response.get('last_page', True) or not page_tasks:
+            break
+        page += 1
+    return tasks
 
-def get_teams(token: str) -> list:
-    response = _make_request("https://api.clickup.com/api/v2/team", token)
+def get_teams(token: str, session: SyncSession | None = None) -> list:
+    response = _get(f"{config.CLICKUP_API_BASE_URL}/team", token, session)
     return response.get('teams', []) if response else []
 
-def get_team_members(team_id: str, token: str) -> list:
+def get_team_members(team_id: str, token: str, session: SyncSession | None = None) -> list:
     """اعضای یک تیم مشخص را از کلیک‌اپ دریافت می‌کند."""
-    team_data = get_teams(token)
+    team_data = get_teams(token, session)
     for team in team_data:
         if str(team['id']) == team_id:
             return [member['user'] for member in team.get('members', [])]
     return []
 
-def get_spaces(team_id: str, token: str) -> list:
-    response = _make_request(f"https://api.clickup.com/api/v2/team/{team_id}/space?archived=false", token)
+def get_spaces(team_id: str, token: str, session: SyncSession | None = None) -> list:
+    response = _get(f"{config.CLICKUP_API_BASE_URL}/team/{team_id}/space?archived=false", token, session)
     return response.get('spaces', []) if response else []
 
-def get_folders(space_id: str, token: str) -> list:
-    response = _make_request(f"https://api.clickup.com/api/v2/space/{space_id}/folder?archived=false", token)
+def get_folders(space_id: str, token: str, session: SyncSession | None = None) -> list:
+    response = _get(f"{config.CLICKUP_API_BASE_URL}/space/{space_id}/folder?archived=false", token, session)
     return response.get('folders', []) if response else []
 
-def get_lists(folder_id: str, token: str) -> list:
-    response = _make_request(f"https://api.clickup.com/api/v2/folder/{folder_id}/list?archived=false", token)
+def get_lists(folder_id: str, token: str, session: SyncSession | None = None) -> list:
+    response = _get(f"{config.CLICKUP_API_BASE_URL}/folder/{folder_id}/list?archived=false", token, session)
     return response.get('lists', []) if response else []
 
-def get_folderless_lists(space_id: str, token: str) -> list:
+def get_folderless_lists(space_id: str, token: str, session: SyncSession | None = None) -> list:
     """لیست‌های بدون پوشه را در یک فضا دریافت می‌کند."""
-    response = _make_request(f"https://api.clickup.com/api/v2/space/{space_id}/list?archived=false", token)
+    response = _get(f"{config.CLICKUP_API_BASE_URL}/space/{space_id}/list?archived=false", token, session)
     return response.get('lists', []) if response else []
 
 # --- توابع قالب‌بندی دیتا ---
@@ -116,7 +179,7 @@ def _format_list_data(lst: dict, folder_id: str | None = None) -> dict:
         data['folder_id'] = str(folder_id)
     return data
 
-def _format_task_data(task: dict) -> dict:
+def _format_task_data(task: dict, include_content: bool = True) -> dict:
     priority_map_from_int = {1: "فوری", 2: "بالا", 3: "متوسط", 4: "پایین"}
     priority_string = "خالی"
     priority_data = task.get('priority')
@@ -147,10 +210,14 @@ def _format_task_data(task: dict) -> dict:
         'status': task.get('status', {}).get('status'), 
         'list_id': str(list_obj.get('id')) if list_obj and list_obj.get('id') else None,
         'priority': priority_string,
-        'content': task.get('description') or task.get('text_content') or '',
         'start_date': to_int_timestamp(task.get('start_date')),
-        'due_date': to_int_timestamp(task.get('due_date'))
+        'due_date': to_int_timestamp(task.get('due_date')),
+        'date_updated': str(task['date_updated']) if task.get('date_updated') else None,
     }
+    # توضیحات فقط وقتی ذخیره می‌شود که صراحتاً خواسته شود؛ content_date_updated نشان می‌دهد نسخه ذخیره شده مربوط به کدام تغییر تسک است
+    if include_content:
+        data['content'] = task.get('description') or task.get('text_content') or ''
+        data['content_date_updated'] = data['date_updated']
     if assignees := task.get('assignees', []):
         if assignees and assignees[0]:
             data['assignee_name'] = assignees[0].get('username')
@@ -159,26 +226,154 @@ def _format_task_data(task: dict) -> dict:
 
 # --- توابع همگام‌سازی ---
 
+# داده‌های کلیک‌اپ به ازای هر تیم فقط یک بار ذخیره می‌شوند (فیلد team_id) و کاربران تلگرام از طریق
+# کالکشن عضویت‌ها به تیم‌ها متصل هستند. ساختار تیم در هر همگام‌سازی با توکن خود کاربر خوانده می‌شود و لیست‌هایی که
+# او می‌بیند در کالکشن LIST_ACCESS ثبت می‌شوند؛ فقط دریافت سنگین تسک‌ها بین هم‌تیمی‌ها مشترک است.
+# فیلد telegram_id روی اسناد فقط آخرین کاربری است که آن‌ها را همگام‌سازی کرده.
+
+# هر تیم یک قفل دارد تا همگام‌سازی هم‌زمان دو هم‌تیمی کار تکراری انجام ندهد
+_team_sync_locks: dict[str, threading.Lock] = {}
+_team_sync_locks_guard = threading.Lock()
+
+def _get_team_sync_lock(team_id: str) -> threading.Lock:
+    with _team_sync_locks_guard:
+        return _team_sync_locks.setdefault(team_id, threading.Lock())
+
+def _resolve_list_team_id(list_id: str) -> str | None:
+    """شناسه تیم یک لیست را از دیتابیس محلی پیدا می‌کند."""
+    list_doc = database.get_single_document(config.APPWRITE_DATABASE_ID, config.LISTS_COLLECTION_ID, 'clickup_list_id', str(list_id))
+    return list_doc.get('team_id') if list_doc else None
+
+def _ensure_team_membership(telegram_id: str, team_id: str):
+    membership_key = f"{team_id}:{telegram_id}"
+    existing = database.get_single_document(config.APPWRITE_DATABASE_ID, config.TEAM_MEMBERSHIPS_COLLECTION_ID, 'membership_key', membership_key)
+    if not existing:
+        database.create_document(config.APPWRITE_DATABASE_ID, config.TEAM_MEMBERSHIPS_COLLECTION_ID, {
+            'membership_key': membership_key,
+            'telegram_id': telegram_id,
+            'team_id': team_id,
+            'joined_at': datetime.now(timezone.utc).isoformat(),
+        })
+
+def _remove_stale_memberships(telegram_id: str, current_team_ids: set[str]):
+    """عضویت کاربر در تیم‌هایی که دیگر با توکن او قابل دسترسی نیستند را حذف می‌کند."""
+    memberships = database.get_documents(
+        config.APPWRITE_DATABASE_ID, config.TEAM_MEMBERSHIPS_COLLECTION_ID, [Query.equal("telegram_id", [telegram_id])]
+    )
+    for membership in memberships:
+        if membership.get('team_id') not in current_team_ids:
+            logger.info(f"عضویت کاربر {telegram_id} در تیم {membership.get('team_id')} حذف شد.")
+            database.delete_document(config.APPWRITE_DATABASE_ID, config.TEAM_MEMBERSHIPS_COLLECTION_ID, membership['$id'])
+            for row in _list_access_rows(telegram_id, membership.get('team_id')):
+                database.delete_document(config.APPWRITE_DATABASE_ID, config.LIST_ACCESS_COLLECTION_ID, row['$id'])
+            database.invalidate_user_visibility(telegram_id)
+
+def _list_access_rows(telegram_id: str, team_id: str) -> list:
+    return list(database.iter_documents(
+        config.APPWRITE_DATABASE_ID, config.LIST_ACCESS_COLLECTION_ID,
+        [Query.equal("telegram_id", [telegram_id]), Query.equal("team_id", [team_id])]
+    ))
+
+def _record_list_access(telegram_id: str, plan: dict):
+    """لیست‌هایی که در ساختار خوانده شده با توکن کاربر هستند را ثبت و دسترسی‌های قدیمی او در این تیم را حذف می‌کند."""
+    team_id = plan['team_id']
+    visible = {
+        str(lst['id']): {'space_id': space_id, 'folder_id': folder_id}
+        for lst, folder_id, space_id in _iter_plan_lists(plan)
+    }
+    for row in _list_access_rows(telegram_id, team_id):
+        expected = visible.get(row.get('list_id'))
+        if expected and row.get('space_id') == expected['space_id'] and row.get('folder_id') == expected['folder_id']:
+            del visible[row['list_id']]
+        else:
+            database.delete_document(config.APPWRITE_DATABASE_ID, config.LIST_ACCESS_COLLECTION_ID, row['$id'])
+
+    new_rows = [
+        {'telegram_id': telegram_id, 'team_id': team_id, 'list_id': list_id, **location}
+        for list_id, location in visible.items()
+    ]
+    for start in range(0, len(new_rows), 100):
+        database.create_documents(config.APPWRITE_DATABASE_ID, config.LIST_ACCESS_COLLECTION_ID, new_rows[start:start + 100])
+    database.invalidate_user_visibility(telegram_id)
+
+def _team_recently_synced(team_id: str) -> bool:
+    team_doc = database.get_single_document(config.APPWRITE_DATABASE_ID, config.TEAMS_COLLECTION_ID, 'clickup_team_id', team_id)
+    if not team_doc or not team_doc.get('last_synced_at'):
+        return False
+    try:
+        last_synced_at = datetime.fromisoformat(team_doc['last_synced_at'])
+    except (ValueError, TypeError):
+        return False
+    if last_synced_at.tzinfo is None:
+        last_synced_at = last_synced_at.replace(tzinfo=timezone.utc)
+    return datetime.now(timezone.utc) - last_synced_at < timedelta(seconds=config.TEAM_SYNC_MIN_INTERVAL_SECONDS)
+
+def _mark_team_synced(team: dict, telegram_id: str):
+    team_data = {
+        'name': team.get('name'),
+        'last_synced_at': datetime.now(timezone.utc).isoformat(),
+        'last_synced_by': telegram_id,
+    }
+    database.upsert_document(config.APPWRITE_DATABASE_ID, config.TEAMS_COLLECTION_ID, 'clickup_team_id', str(team['id']), team_data)
+
 def sync_single_task_from_clickup(task_id: str, token: str, telegram_id: str):
-    response = _make_request(f"https://api.clickup.com/api/v2/task/{task_id}", token)
+    response = _make_request(f"{config.CLICKUP_API_BASE_URL}/task/{task_id}", token)
     if response:
         task_data = _format_task_data(response)
         task_data['telegram_id'] = telegram_id
+        team_id = response.get('team_id') or (task_data['list_id'] and _resolve_list_team_id(task_data['list_id']))
+        if team_id:
+            task_data['team_id'] = str(team_id)
         database.upsert_document(config.APPWRITE_DATABASE_ID, config.TASKS_COLLECTION_ID, 'clickup_task_id', task_data['clickup_task_id'], task_data)
         logger.info(f"تسک {task_id} برای کاربر {telegram_id} همگام‌سازی شد.")
         return database.get_single_document(config.APPWRITE_DATABASE_ID, config.TASKS_COLLECTION_ID, 'clickup_task_id', task_id)
     return None
 
-def sync_tasks_for_list(list_id: str, token: str, telegram_id: str) -> int:
+def _content_is_stale(task_doc: dict) -> bool:
+    content_version = task_doc.get('content_date_updated')
+    return not content_version or content_version != task_doc.get('date_updated')
+
+def task_content_is_stale(task_doc: dict) -> bool:
+    """بررسی می‌کند که آیا توضیحات ذخیره شده تسک وجود ندارد یا مربوط به نسخه قدیمی‌تری از تسک است."""
+    stale = _content_is_stale(task_doc)
+    metrics.record_cache_lookup("task_content", not stale)
+    return stale
+
+def hydrate_task_content(task_doc: dict, token: str) -> dict:
+    """
+    توضیحات کامل یک تسک را در صورت نیاز از کلیک‌اپ دریافت کرده و در دیتابیس کش می‌کند.
+    در صورت خطای API، همان سند قبلی (با آخرین توضیحات ذخیره شده) برگردانده می‌شود.
+    """
+    if not _content_is_stale(task_doc):
+        return task_doc
+
+    task_id = task_doc.get('clickup_task_id')
+    response = _make_request(f"{config.CLICKUP_API_BASE_URL}/task/{task_id}", token)
+    if not response:
+        logger.warning(f"دریافت توضیحات تسک {task_id} از کلیک‌اپ ناموفق بود.")
+        return task_doc
+
+    date_updated = str(response['date_updated']) if response.get('date_updated') else task_doc.get('date_updated')
+    content_data = {
+        'content': response.get('description') or response.get('text_content') or '',
+        'date_updated': date_updated,
+        'content_date_updated': date_updated,
+    }
+    database.upsert_document(config.APPWRITE_DATABASE_ID, config.TASKS_COLLECTION_ID, 'clickup_task_id', task_id, content_data)
+    return {**task_doc, **content_data}
+
+def sync_tasks_for_list(list_id: str, token: str, telegram_id: str, team_id: str | None = None, session: SyncSession | None = None) -> int:
     """
     Performs a full synchronization for a given list.
     It adds/updates existing tasks and removes tasks from the local DB
     that have been deleted in ClickUp.
     """
     logger.info(f"شروع همگام‌سازی کامل تسک‌ها برای لیست {list_id}...")
+    if team_id is None:
+        team_id = _resolve_list_team_id(list_id)
     
     # 1. Fetch all tasks from ClickUp for the given list
-    clickup_tasks = get_tasks_from_clickup_list(list_id, token)
+    clickup_tasks = get_tasks_from_clickup_list(list_id, token, session)
     if clickup_tasks is None: # Handle API error
         logger.error(f"Failed to fetch tasks from ClickUp for list {list_id}.")
         return 0
@@ -186,8 +381,8 @@ def sync_tasks_for_list(list_id: str, token: str, telegram_id: str) -> int:
     clickup_task_ids = {str(task['id']) for task in clickup_tasks}
     logger.info(f"Found {len(clickup_task_ids)} tasks in ClickUp for list {list_id}.")
 
-    # 2. Fetch all task IDs from local DB for this user and list
-    local_task_query = [Query.equal("telegram_id", [telegram_id]), Query.equal("list_id", [list_id])]
+    # 2. Fetch all task IDs from local DB for this list (shared by the whole team)
+    local_task_query = [Query.equal("list_id", [list_id])]
     local_tasks = database.get_documents(config.APPWRITE_DATABASE_ID, config.TASKS_COLLECTION_ID, local_task_query)
     local_task_ids = {str(task['clickup_task_id']) for task in local_tasks}
     local_tasks_map = {str(task['clickup_task_id']): task for task in local_tasks}
@@ -197,8 +392,11 @@ def sync_tasks_for_list(list_id: str, token: str, telegram_id: str) -> int:
     upsert_count = 0
     for task_data_from_clickup in clickup_tasks:
         try:
-            formatted_task = _format_task_data(task_data_from_clickup)
+            # در همگام‌سازی لیست فقط خلاصه تسک ذخیره می‌شود و توضیحات هنگام اولین نمایش دریافت می‌شود
+            formatted_task = _format_task_data(task_data_from_clickup, include_content=False)
             formatted_task['telegram_id'] = telegram_id
+            if team_id:
+                formatted_task['team_id'] = team_id
             database.upsert_document(
                 config.APPWRITE_DATABASE_ID,
                 config.TASKS_COLLECTION_ID,
@@ -228,60 +426,190 @@ def sync_tasks_for_list(list_id: str, token: str, telegram_id: str) -> int:
     logger.info(f"همگام‌سازی کامل شد. {upsert_count} تسک آپدیت/اضافه شد. {delete_count} تسک حذف شد.")
     return upsert_count
 
-def sync_all_user_data(token: str, telegram_id: str) -> bool:
+def _plan_team_hierarchy(team: dict, token: str, session: SyncSession) -> dict:
+    """
+    ساختار یک تیم را با کمترین تعداد درخواست جمع‌آوری می‌کند:
+    اعضا از خود پاسخ /team و لیست‌های هر پوشه از پاسخ /folder برداشته می‌شوند و
+    فقط در صورت نبودن این داده‌های تو در تو، درخواست جداگانه ارسال می‌شود.
+    """
+    team_id = str(team['id'])
+    if 'members' in team:
+        members = [member['user'] for member in team.get('members', [])]
+    else:
+        members = get_team_members(team_id, token, session)
+
+    plan = {'team_id': team_id, 'members': members, 'spaces': []}
+    for space in get_spaces(team_id, token, session):
+        space_id = str(space['id'])
+        space_plan = {'space': space, 'folders': [], 'folderless_lists': get_folderless_lists(space_id, token, session)}
+        for folder in get_folders(space_id, token, session):
+            lists_in_folder = folder['lists'] if 'lists' in folder else get_lists(str(folder['id']), token, session)
+            space_plan['folders'].append({'folder': folder, 'lists': lists_in_folder})
+        plan['spaces'].append(space_plan)
+    return plan
+
+def _iter_plan_lists(plan: dict):
+    """(list, folder_id, space_id) را برای تمام لیست‌های یک برنامه تیم برمی‌گرداند."""
+    for space_plan in plan['spaces']:
+        space_id = str(space_plan['space']['id'])
+        for folder_plan in space_plan['folders']:
+            for lst in folder_plan['lists']:
+                yield lst, str(folder_plan['folder']['id']), space_id
+        for lst in space_plan['folderless_lists']:
+            yield lst, None, space_id
+
+def _stored_list_ids(team_id: str) -> set[str]:
+    lists = database.iter_documents(config.APPWRITE_DATABASE_ID, config.LISTS_COLLECTION_ID, [Query.equal("team_id", [team_id])])
+    return {str(lst['clickup_list_id']) for lst in lists}
+
+def _estimate_task_pages(lst: dict) -> int:
+    """تعداد صفحات تسک یک لیست را از task_count موجود در پاسخ لیست تخمین می‌زند (هر صفحه ۱۰۰ تسک)."""
+    try:
+        task_count = int(lst.get('task_count') or 0)
+    except (ValueError, TypeError):
+        task_count = 0
+    return max(1, -(-task_count // 100))
+
+def _upsert_team_member(member_key: str, user_data: dict):
+    existing = database.get_single_document(config.APPWRITE_DATABASE_ID, config.CLICKUP_USERS_COLLECTION_ID, 'team_member_key', member_key)
+    if existing is None:
+        # ردیف‌های ذخیره شده پیش از ذخیره‌سازی تیمی team_member_key ندارند؛ به جای ساخت ردیف تکراری، همان ردیف تکمیل می‌شود
+        legacy = [
+            doc for doc in database.get_documents(
+                config.APPWRITE_DATABASE_ID, config.CLICKUP_USERS_COLLECTION_ID, [Query.equal("clickup_user_id", [user_data['clickup_user_id']])]
+            )
+            if not doc.get('team_member_key')
+        ]
+        existing = next((doc for doc in legacy if doc.get('telegram_id') == user_data['telegram_id']), legacy[0] if legacy else None)
+    if existing:
+        database.update_document(config.APPWRITE_DATABASE_ID, config.CLICKUP_USERS_COLLECTION_ID, existing['$id'], user_data)
+    else:
+        database.create_document(config.APPWRITE_DATABASE_ID, config.CLICKUP_USERS_COLLECTION_ID, user_data)
+
+def _store_team_members(team_id: str, members: list, telegram_id: str):
+    for member in members:
+        username = member.get('username')
+        if not username:
+            username = f"کاربر مهمان ({member.get('id')})"
+            logger.warning(f"کاربر با شناسه {member.get('id')} نام کاربری ندارد. نام پیش‌فرض '{username}' اختصاص داده شد.")
+
+        member_key = f"{team_id}:{member['id']}"
+        user_data = {
+            'clickup_user_id': str(member['id']),
+            'username': username,
+            'email': member.get('email', ''),
+            'telegram_id': telegram_id,
+            'team_id': team_id,
+            'team_member_key': member_key,
+        }
+        _upsert_team_member(member_key, user_data)
+
+def _sync_team(plan: dict, token: str, telegram_id: str, session: SyncSession, only_missing: bool = False):
+    """
+    ساختار کامل یک تیم (اعضا، فضاها، پوشه‌ها، لیست‌ها و تسک‌ها) را یک بار برای کل تیم ذخیره می‌کند.
+    با only_missing=True (تیم اخیراً توسط هم‌تیمی همگام‌سازی شده) فقط لیست‌هایی که با توکن این کاربر دیده می‌شوند و
+    هنوز ذخیره نشده‌اند، همراه با فضا، پوشه و تسک‌هایشان ذخیره می‌شوند.
+    """
+    team_id = plan['team_id']
+    lists = list(_iter_plan_lists(plan))
+    if only_missing:
+        stored_list_ids = _stored_list_ids(team_id)
+        lists = [entry for entry in lists if str(entry[0]['id']) not in stored_list_ids]
+        if not lists:
+            return
+        logger.info(f"{len(lists)} لیست تیم {team_id} فقط با توکن کاربر {telegram_id} دیده می‌شود و همگام‌سازی می‌شود.")
+    needed_space_ids = {space_id for _, _, space_id in lists}
+    needed_folder_ids = {folder_id for _, folder_id, _ in lists if folder_id}
+
+    if not only_missing:
+        _store_team_members(team_id, plan['members'], telegram_id)
+    
+    for space_plan in plan['spaces']:
+        space_id = str(space_plan['space']['id'])
+        if only_missing and space_id not in needed_space_ids:
+            continue
+        space_data = _format_space_data(space_plan['space'])
+        space_data.update({'telegram_id': telegram_id, 'team_id': team_id})
+        database.upsert_document(config.APPWRITE_DATABASE_ID, config.SPACES_COLLECTION_ID, 'clickup_space_id', space_id, space_data)
+        
+        for folder_plan in space_plan['folders']:
+            folder_id = str(folder_plan['folder']['id'])
+            if only_missing and folder_id not in needed_folder_ids:
+                continue
+            folder_data = _format_folder_data(folder_plan['folder'], space_id)
+            folder_data.update({'telegram_id': telegram_id, 'team_id': team_id})
+            database.upsert_document(config.APPWRITE_DATABASE_ID, config.FOLDERS_COLLECTION_ID, 'clickup_folder_id', folder_id, folder_data)
+
+    for lst, folder_id, _ in lists:
+        list_id = str(lst['id'])
+        list_data = _format_list_data(lst, folder_id)
+        list_data.update({'telegram_id': telegram_id, 'team_id': team_id})
+        database.upsert_document(config.APPWRITE_DATABASE_ID, config.LISTS_COLLECTION_ID, 'clickup_list_id', list_id, list_data)
+        sync_tasks_for_list(list_id, token, telegram_id, team_id, session=session)
+
+def plan_sync(token: str, force: bool = False) -> dict:
+    """
+    حالت dry-run: ساختار تیم‌ها را می‌خواند (بدون نوشتن در دیتابیس و بدون دریافت تسک‌ها) و
+    گزارش می‌دهد که یک همگام‌سازی کامل چند درخواست API ارسال خواهد کرد.
+    """
+    session = SyncSession(token)
+    report = {'teams': 0, 'skipped_teams': [], 'spaces': 0, 'folders': 0, 'lists': 0,
+              'hierarchy_calls': 0, 'task_page_calls': 0, 'total_calls': 0}
+    teams = get_teams(token, session)
+    report['teams'] = len(teams)
+
+    for team in teams:
+        team_id = str(team['id'])
+        # ساختار تیم همیشه با توکن کاربر خوانده می‌شود؛ در تیم‌های اخیراً همگام‌سازی شده فقط تسک‌های لیست‌های ذخیره نشده دریافت می‌شوند
+        plan = _plan_team_hierarchy(team, token, session)
+        stored_list_ids = set()
+        if not force and _team_recently_synced(team_id):
+            report['skipped_teams'].append(team_id)
+            stored_list_ids = _stored_list_ids(team_id)
+        report['spaces'] += len(plan['spaces'])
+        report['folders'] += sum(len(space_plan['folders']) for space_plan in plan['spaces'])
+        for lst, _, _ in _iter_plan_lists(plan):
+            report['lists'] += 1
+            if str(lst['id']) not in stored_list_ids:
+                report['task_page_calls'] += _estimate_task_pages(lst)
+
+    report['hierarchy_calls'] = session.api_calls
+    report['total_calls'] = session.api_calls + report['task_page_calls']
+    logger.info(f"برنامه همگام‌سازی (dry-run): {report}")
+    return report
+
+def sync_all_user_data(token: str, telegram_id: str, force: bool = False) -> bool:
+    """
+    کاربر را به تیم‌های کلیک‌اپ خود متصل کرده و داده‌های هر تیم را همگام‌سازی می‌کند.
+    در تیم‌هایی که اخیراً توسط هم‌تیمی‌ها همگام‌سازی شده‌اند فقط لیست‌های ذخیره نشده همگام‌سازی می‌شوند، مگر اینکه force=True باشد.
+    """
     logger.info(f"شروع همگام‌سازی ساختار ClickUp برای کاربر {telegram_id}...")
-    teams = get_teams(token)
+    session = SyncSession(token)
+    teams = get_teams(token, session)
     if not teams:
         logger.error(f"هیچ تیمی برای توکن کاربر {telegram_id} یافت نشد.")
         return False
     logger.info(f"تعداد {len(teams)} تیم یافت شد.")
 
+    current_team_ids = set()
     for team in teams:
         team_id = str(team['id'])
-        members = get_team_members(team_id, token)
-        for member in members:
-            username = member.get('username')
-            if not username:
-                username = f"کاربر مهمان ({member.get('id')})"
-                logger.warning(f"کاربر با شناسه {member.get('id')} نام کاربری ندارد. نام پیش‌فرض '{username}' اختصاص داده شد.")
-
-            user_data = {
-                'clickup_user_id': str(member['id']),
-                'username': username,
-                'email': member.get('email', ''),
-                'telegram_id': telegram_id
-            }
-            database.upsert_document(config.APPWRITE_DATABASE_ID, config.CLICKUP_USERS_COLLECTION_ID, 'clickup_user_id', str(member['id']), user_data)
-        
-        spaces = get_spaces(team_id, token)
-        for space in spaces:
-            space_id = str(space['id'])
-            space_data = _format_space_data(space)
-            space_data['telegram_id'] = telegram_id
-            database.upsert_document(config.APPWRITE_DATABASE_ID, config.SPACES_COLLECTION_ID, 'clickup_space_id', space_id, space_data)
-            
-            folders = get_folders(space_id, token)
-            for folder in folders:
-                folder_id = str(folder['id'])
-                folder_data = _format_folder_data(folder, space_id)
-                folder_data['telegram_id'] = telegram_id
-                database.upsert_document(config.APPWRITE_DATABASE_ID, config.FOLDERS_COLLECTION_ID, 'clickup_folder_id', folder_id, folder_data)
-                
-                lists_in_folder = get_lists(folder_id, token)
-                for lst in lists_in_folder:
-                    list_id = str(lst['id'])
-                    list_data = _format_list_data(lst, folder_id)
-                    list_data['telegram_id'] = telegram_id
-                    database.upsert_document(config.APPWRITE_DATABASE_ID, config.LISTS_COLLECTION_ID, 'clickup_list_id', list_id, list_data)
-                    sync_tasks_for_list(list_id, token, telegram_id)
-
-            folderless_lists = get_folderless_lists(space_id, token)
-            for lst in folderless_lists:
-                 list_id = str(lst['id'])
-                 list_data = _format_list_data(lst)
-                 list_data['telegram_id'] = telegram_id
-                 database.upsert_document(config.APPWRITE_DATABASE_ID, config.LISTS_COLLECTION_ID, 'clickup_list_id', list_id, list_data)
-                 sync_tasks_for_list(list_id, token, telegram_id)
-
-    logger.info(f"همگام‌سازی ساختار ClickUp برای کاربر {telegram_id} با موفقیت به پایان رسید.")
+        current_team_ids.add(team_id)
+        _ensure_team_membership(telegram_id, team_id)
+
+        # ساختار تیم همیشه با توکن خود کاربر خوانده می‌شود تا فقط لیست‌هایی که او می‌بیند برایش ثبت شوند
+        plan = _plan_team_hierarchy(team, token, session)
+        with _get_team_sync_lock(team_id):
+            if not force and _team_recently_synced(team_id):
+                logger.info(f"تیم {team_id} اخیراً همگام‌سازی شده است؛ فقط لیست‌های ذخیره نشده همگام‌سازی می‌شوند.")
+                _sync_team(plan, token, telegram_id, session, only_missing=True)
+            else:
+                _sync_team(plan, token, telegram_id, session)
+                _mark_team_synced(team, telegram_id)
+        _record_list_access(telegram_id, plan)
+
+    _remove_stale_memberships(telegram_id, current_team_ids)
+
+    logger.info(f"همگام‌سازی ساختار ClickUp برای کاربر {telegram_id} با موفقیت به پایان رسید "
+                f"({session.api_calls} درخواست API، {session.deduped_calls} درخواست تکراری حذف شد).")
     return True
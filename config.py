@@ -25,7 +25,139 @@ BOT_USERS_COLLECTION_ID = '68bc596d00116e55ed9e'
 PACKAGES_COLLECTION_ID = '68bc5ba2003a51c394d5'
 PAYMENT_REQUESTS_COLLECTION_ID = '68b94154001ce836a003'
 SUPPORT_TICKETS_COLLECTION_ID = '68c24b9f000d5a3b8c2c' # New Collection ID
+TEAMS_COLLECTION_ID = 'clickup_teams'
+TEAM_MEMBERSHIPS_COLLECTION_ID = 'team_memberships'
+LIST_ACCESS_COLLECTION_ID = 'list_access'
+BROADCASTS_COLLECTION_ID = 'broadcasts'
 
 # --- تنظیمات هوش مصنوعی (Ollama) ---
 OLLAMA_BASE_URL = "http://localhost:11434"
 OLLAMA_MODEL = "orieg/gemma3-tools:1b"
+# مدت نگه داشتن مدل در حافظه سرور Ollama پس از آخرین درخواست
+OLLAMA_MODEL_KEEP_ALIVE = "30m"
+# pool مشترک اتصال‌های HTTP به Ollama (بین همه نقش‌ها: router، chat و summarizer)
+OLLAMA_MAX_CONNECTIONS = 20
+OLLAMA_MAX_KEEPALIVE_CONNECTIONS = 10
+OLLAMA_KEEPALIVE_EXPIRY_SECONDS = 120
+OLLAMA_CONNECT_TIMEOUT_SECONDS = 3
+OLLAMA_READ_TIMEOUT_SECONDS = 120
+# انتخاب پویای مثال‌های few-shot روتر: فقط k مثال شبیه‌تر به پیام کاربر در پرامپت قرار می‌گیرد
+ROUTER_DYNAMIC_FEW_SHOT = True
+ROUTER_FEW_SHOT_K = 4
+# حالت مسیریابی پیام‌هایی که به روتر LLM می‌رسند:
+# "two_call": روتر JSON و سپس (برای مکالمه عمومی) فراخوانی جداگانه مدل چت با نمایش تدریجی پاسخ
+# "combined": یک فراخوانی که یا برنامه ابزار یا پاسخ مکالمه عمومی (فیلد reply) را برمی‌گرداند
+AI_ROUTING_MODE = "two_call"
+# در حالت two_call، پاسخ چت هم‌زمان با روتر LLM تولید می‌شود (و اگر روتر ابزار انتخاب کند لغو می‌شود)؛
+# فقط وقتی زمان‌بند LLM دو نوبت آزاد و صف خالی دارد، تا زیر بار ظرفیت درخواست‌های دیگر گرفته نشود
+AI_SPECULATIVE_CHAT = False
+# کش خروجی روتر LLM (کلید: متن نرمال‌شده پیام + اثر انگشت نام لیست‌های کاربر)
+ROUTER_PLAN_CACHE_MAX_ENTRIES = 2000
+ROUTER_PLAN_CACHE_TTL_SECONDS = 60 * 60
+ROUTER_LIST_FINGERPRINT_TTL_SECONDS = 60
+# بارگذاری و گرم کردن مدل هنگام راه‌اندازی و بررسی دوره‌ای خروج مدل از حافظه Ollama
+OLLAMA_WARMUP_ENABLED = True
+OLLAMA_MODEL_CHECK_INTERVAL_SECONDS = 60
+# زمان‌بند درخواست‌های LLM: تعداد درخواست هم‌زمان به Ollama (روی CPU بیشتر از OLLAMA_NUM_PARALLEL سرور سودی ندارد)،
+# سقف صف انتظار، سقف درخواست‌های در صف هر کاربر و حداکثر زمان انتظار پیش از پاسخ «سرور شلوغ است»
+LLM_MAX_CONCURRENT_REQUESTS = 2
+LLM_QUEUE_MAX_SIZE = 30
+LLM_QUEUE_MAX_PER_USER = 2
+LLM_QUEUE_MAX_WAIT_SECONDS = 60
+# در هر LLM_PAID_PRIORITY_WEIGHT + 1 نوبت، حداکثر LLM_PAID_PRIORITY_WEIGHT نوبت به پکیج‌های پولی می‌رسد
+LLM_PAID_PRIORITY_WEIGHT = 3
+# فاصله حداقل بین ویرایش‌های پیام هنگام نمایش تدریجی پاسخ چت (محدودیت ویرایش تلگرام حدود یک بار در ثانیه است)
+AI_STREAM_EDIT_INTERVAL_SECONDS = 1.5
+
+# --- تنظیمات API کلیک‌اپ ---
+# برای اجرای بنچمارک‌ها می‌توان این آدرس را به سرور جعلی محلی (bench/fake_clickup_server.py) تغییر داد
+CLICKUP_API_BASE_URL = "https://api.clickup.com/api/v2"
+# اگر یک تیم در این بازه توسط هم‌تیمی دیگری همگام‌سازی شده باشد، همگام‌سازی مجدد آن رد می‌شود
+TEAM_SYNC_MIN_INTERVAL_SECONDS = 15 * 60
+
+# --- تنظیمات مانیتورینگ (/metrics و /healthz روی وب‌سرور وب‌هوک) ---
+# اگر تأخیر event loop از این مقدار بیشتر شود، /healthz وضعیت 503 برمی‌گرداند
+HEALTH_MAX_EVENT_LOOP_LAG_SECONDS = 2.0
+EVENT_LOOP_LAG_CHECK_INTERVAL_SECONDS = 1.0
+
+# --- حالت وب‌هوک تلگرام ---
+# در صورت فعال بودن، به جای polling آپدیت‌ها از طریق مسیر TELEGRAM_WEBHOOK_PATH روی همان وب‌سرور وب‌هوک دریافت می‌شوند
+TELEGRAM_WEBHOOK_ENABLED = False
+# آدرس عمومی (https) که تلگرام به آن درخواست می‌فرستد، بدون مسیر. مثال: "https://bot.example.com"
+TELEGRAM_WEBHOOK_URL = ""
+TELEGRAM_WEBHOOK_PATH = "/telegram-webhook"
+# توکن مخفی (۱ تا ۲۵۶ کاراکتر از A-Z، a-z، 0-9، _ و -) که تلگرام در هدر X-Telegram-Bot-Api-Secret-Token ارسال می‌کند
+TELEGRAM_WEBHOOK_SECRET = ""
+
+# --- تنظیمات وب‌سرور (وب‌هوک‌ها، متریک‌ها) ---
+WEBHOOK_SERVER_HOST = 'localhost'
+WEBHOOK_SERVER_PORT = 8080
+
+# --- ذخیره‌سازی دائمی وضعیت مکالمه‌ها (user_data، chat_data و ConversationHandlerها) ---
+# برای اجرای چند worker، این فایل باید روی دیسک مشترک باشد و کاربران بر اساس آیدی بین workerها تقسیم شوند
+PERSISTENCE_PATH = "bot_state.sqlite3"
+# فاصله زمانی (ثانیه) ذخیره تغییرات user_data/chat_data؛ وضعیت مکالمه‌ها بلافاصله ذخیره می‌شود
+PERSISTENCE_UPDATE_INTERVAL_SECONDS = 5
+# پرچم‌های موقت chat_data که فقط در طول اجرای جاری معنا دارند و ذخیره نمی‌شوند
+PERSISTENCE_TRANSIENT_CHAT_KEYS = ('conversation_handled', 'auth_flow_active', 'in_support_flow', 'block_message_sent')
+
+# --- پردازش هم‌زمان آپدیت‌ها ---
+# حداکثر تعداد آپدیت‌هایی که هم‌زمان اجرا می‌شوند (آپدیت‌های یک چت همیشه به ترتیب و یکی‌یکی اجرا می‌شوند)
+MAX_CONCURRENT_UPDATES = 16
+# حداکثر تعداد آپدیت‌های در جریان (در حال اجرا یا منتظر قفل چت خود)
+MAX_PENDING_UPDATES = 256
+
+# --- کش دسترسی کاربران (فایروال) ---
+# بارگذاری کامل دوره‌ای جدول is_active/is_admin از Appwrite (برای تغییراتی که خارج از ربات انجام می‌شوند)
+ACCESS_CACHE_RELOAD_INTERVAL_SECONDS = 5 * 60
+# مدت کش کردن نبودن یک کاربر در دیتابیس
+ACCESS_CACHE_NEGATIVE_TTL_SECONDS = 60
+# مدت کش کردن فضاها، پوشه‌ها و لیست‌های قابل مشاهده هر کاربر (کالکشن LIST_ACCESS)؛ همگام‌سازی کاربر کش را باطل می‌کند
+VISIBILITY_CACHE_TTL_SECONDS = 60
+
+# --- صف ارسال پیام‌های خروجی (اطلاع‌رسانی به ادمین‌ها و ...) ---
+OUTBOUND_WORKERS = 8
+# سقف سراسری تلگرام حدود ۳۰ پیام در ثانیه است
+OUTBOUND_GLOBAL_MESSAGES_PER_SECOND = 25
+# فاصله حداقل بین دو پیام به یک چت خصوصی / گروه
+OUTBOUND_PRIVATE_CHAT_INTERVAL_SECONDS = 1.0
+OUTBOUND_GROUP_CHAT_INTERVAL_SECONDS = 3.0
+# تعداد تلاش مجدد برای خطاهای شبکه (RetryAfter همیشه دوباره تلاش می‌شود)
+OUTBOUND_MAX_RETRIES = 3
+
+# --- لاگ مکالمه‌های هوش مصنوعی ---
+# لاگ‌ها در صف درون‌حافظه‌ای قرار می‌گیرند و دسته‌ای در Appwrite نوشته می‌شوند؛ با پر شدن صف، لاگ‌های جدید دور انداخته می‌شوند
+CHAT_LOG_MAX_QUEUE = 5000
+CHAT_LOG_BATCH_SIZE = 50
+CHAT_LOG_FLUSH_INTERVAL_SECONDS = 2.0
+# اگر Appwrite در دسترس نباشد لاگ‌ها در این فایل (هر خط یک JSON) ذخیره و بعداً ارسال می‌شوند
+CHAT_LOG_FALLBACK_PATH = "chat_logs_fallback.jsonl"
+CHAT_LOG_SHUTDOWN_TIMEOUT_SECONDS = 10
+
+# --- پیام همگانی ادمین ---
+# تعداد گیرندگانی که در هر مرحله هم‌زمان در صف ارسال قرار می‌گیرند؛ پس از هر مرحله نقطه ادامه ذخیره می‌شود
+BROADCAST_BATCH_SIZE = 50
+BROADCAST_PROGRESS_EDIT_INTERVAL_SECONDS = 3
+
+# --- راه‌اندازی سریع ---
+# ماژول‌های هوش مصنوعی (langchain و ...) در اولین استفاده بارگذاری می‌شوند؛ با فعال بودن این گزینه
+# پس از آماده شدن ربات در پس‌زمینه از قبل بارگذاری می‌شوند تا اولین پیام کاربر معطل نماند
+AI_PRELOAD_AFTER_STARTUP = True
+# تعداد پکیج‌های سنگین که در گزارش زمان import هنگام راه‌اندازی لاگ می‌شوند
+IMPORT_REPORT_TOP_PACKAGES = 15
+
+# --- ردیابی آپدیت‌ها ---
+# آپدیت‌هایی که پردازششان بیشتر از این مقدار (ثانیه) طول بکشد با جزئیات تمام درخواست‌ها لاگ می‌شوند
+TRACE_SLOW_UPDATE_SECONDS = 3.0
+# سقف تعداد span در هر trace (مثلاً برای همگام‌سازی کامل که صدها درخواست دارد)
+TRACE_MAX_SPANS = 200
+
+# --- حافظه مکالمه هوش مصنوعی ---
+# سقف تعداد کاربران و حجم تقریبی متن حافظه‌هایی که در RAM نگه داشته می‌شوند؛ بقیه از دیسک بازیابی می‌شوند
+AI_MEMORY_MAX_ENTRIES = 1000
+AI_MEMORY_MAX_BYTES = 16 * 1024 * 1024
+# سقف پیام‌هایی که هنوز در خلاصه مکالمه ادغام نشده‌اند
+AI_MEMORY_MAX_MESSAGES = 20
+# وقتی حجم تخمینی پیام‌های خلاصه نشده یک کاربر از این تعداد توکن بیشتر شود، در پس‌زمینه خلاصه می‌شوند
+AI_SUMMARY_TOKEN_THRESHOLD = 600
+AI_MEMORY_DIR = "ai_memory"
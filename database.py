@@ -1,12 +1,14 @@
 # -*- coding: utf-8 -*-
 import logging
 import asyncio
+import time
 from appwrite.client import Client
 from appwrite.services.databases import Databases
 from appwrite.id import ID
 from appwrite.query import Query
 from appwrite.exception import AppwriteException
 import config
+import metrics
 
 logger = logging.getLogger(__name__)
 
@@ -83,11 +85,13 @@ async def setup_database_schemas():
             "attributes": [
                 ("telegram_id", 'string', 128, True), ("clickup_user_id", 'string', 128, True),
                 ("username", 'string', 255, True), ("email", 'string', 255, True),
+                ("team_id", 'string', 128, False),
+                ("team_member_key", 'string', 300, False),
             ]
         },
-        config.SPACES_COLLECTION_ID: {"name": "Spaces", "attributes": [("telegram_id", 'string', 128, True), ("clickup_space_id", 'string', 128, True), ("name", 'string', 255, True)]},
-        config.FOLDERS_COLLECTION_ID: {"name": "Folders", "attributes": [("telegram_id", 'string', 128, True), ("clickup_folder_id", 'string', 128, True), ("name", 'string', 255, True), ("space_id", 'string', 128, True)]},
-        config.LISTS_COLLECTION_ID: {"name": "Lists", "attributes": [("telegram_id", 'string', 128, True), ("clickup_list_id", 'string', 128, True), ("name", 'string', 255, True), ("folder_id", 'string', 128, False)]},
+        config.SPACES_COLLECTION_ID: {"name": "Spaces", "attributes": [("telegram_id", 'string', 128, True), ("clickup_space_id", 'string', 128, True), ("name", 'string', 255, True), ("team_id", 'string', 128, False)]},
+        config.FOLDERS_COLLECTION_ID: {"name": "Folders", "attributes": [("telegram_id", 'string', 128, True), ("clickup_folder_id", 'string', 128, True), ("name", 'string', 255, True), ("space_id", 'string', 128, True), ("team_id", 'string', 128, False)]},
+        config.LISTS_COLLECTION_ID: {"name": "Lists", "attributes": [("telegram_id", 'string', 128, True), ("clickup_list_id", 'string', 128, True), ("name", 'string', 255, True), ("folder_id", 'string', 128, False), ("team_id", 'string', 128, False)]},
         config.TASKS_COLLECTION_ID: {
             "name": "Tasks",
             "attributes": [
@@ -98,6 +102,40 @@ async def setup_database_schemas():
                 ("start_date", 'datetime', None, False), # FIX: Changed from integer to datetime
                 ("due_date", 'datetime', None, False),   # FIX: Changed from integer to datetime
                 ("assignee_name", 'string', 255, False),
+                ("team_id", 'string', 128, False),
+                # توضیحات به صورت lazy ذخیره می‌شود؛ content_date_updated نسخه تسکی است که content از آن گرفته شده
+                ("date_updated", 'string', 32, False),
+                ("content_date_updated", 'string', 32, False),
+            ]
+        },
+        # هر تیم کلیک‌اپ فقط یک بار ذخیره و همگام‌سازی می‌شود و کاربران تلگرام از طریق عضویت به آن دسترسی دارند
+        config.TEAMS_COLLECTION_ID: {
+            "name": "ClickUp Teams",
+            "attributes": [
+                ("clickup_team_id", 'string', 128, True),
+                ("name", 'string', 255, False),
+                ("last_synced_at", 'datetime', None, False),
+                ("last_synced_by", 'string', 128, False),
+            ]
+        },
+        config.TEAM_MEMBERSHIPS_COLLECTION_ID: {
+            "name": "Team Memberships",
+            "attributes": [
+                ("membership_key", 'string', 300, True),
+                ("telegram_id", 'string', 128, True),
+                ("team_id", 'string', 128, True),
+                ("joined_at", 'datetime', None, False),
+            ]
+        },
+        # لیست‌هایی که هر کاربر با توکن کلیک‌اپ خودش می‌بیند؛ در هر همگام‌سازی همان کاربر بازنویسی می‌شود
+        config.LIST_ACCESS_COLLECTION_ID: {
+            "name": "List Access",
+            "attributes": [
+                ("telegram_id", 'string', 128, True),
+                ("team_id", 'string', 128, True),
+                ("space_id", 'string', 128, False),
+                ("folder_id", 'string', 128, False),
+                ("list_id", 'string', 128, True),
             ]
         },
         config.PACKAGES_COLLECTION_ID: {
@@ -140,6 +178,24 @@ async def setup_database_schemas():
                 ("created_at", 'datetime', None, True),
                 ("replied_at", 'datetime', None, False),
             ]
+        },
+        # پیام‌های همگانی ادمین؛ last_user_doc_id نقطه ادامه ارسال پس از راه‌اندازی مجدد است
+        config.BROADCASTS_COLLECTION_ID: {
+            "name": "Broadcasts",
+            "attributes": [
+                ("admin_id", 'string', 128, True),
+                ("message", 'string', 4096, True),
+                ("package_id", 'string', 128, False),
+                ("only_active", 'boolean', None, False, False),
+                ("status", 'string', 50, False, "running"),
+                ("last_user_doc_id", 'string', 128, False),
+                ("sent_count", 'integer', None, False, 0),
+                ("failed_count", 'integer', None, False, 0),
+                ("progress_chat_id", 'string', 128, False),
+                ("progress_message_id", 'integer', None, False),
+                ("created_at", 'datetime', None, False),
+                ("finished_at", 'datetime', None, False),
+            ]
         }
     }
     
@@ -159,6 +215,7 @@ async def setup_database_schemas():
         for attr in coll_info['attributes']:
             await _ensure_attribute(db, db_id, coll_id, keys, *attr)
 
+@metrics.timed(metrics.APPWRITE_SECONDS, metrics.APPWRITE_ERRORS, operation="create_document")
 def create_document(database_id, collection_id, data):
     try:
         db = Databases(get_db_client())
@@ -167,6 +224,18 @@ def create_document(database_id, collection_id, data):
         logger.error(f"خطای Appwrite در ایجاد سند در کالکشن {collection_id}: {e.message}")
         raise
 
+@metrics.timed(metrics.APPWRITE_SECONDS, metrics.APPWRITE_ERRORS, operation="create_documents")
+def create_documents(database_id, collection_id, documents):
+    """چند سند را با یک درخواست ایجاد می‌کند؛ سندهای بدون $id شناسه یکتا می‌گیرند."""
+    try:
+        db = Databases(get_db_client())
+        documents = [doc if '$id' in doc else dict(doc, **{'$id': ID.unique()}) for doc in documents]
+        return db.create_documents(database_id, collection_id, documents)
+    except AppwriteException as e:
+        logger.error(f"خطای Appwrite در ایجاد دسته‌ای {len(documents)} سند در کالکشن {collection_id}: {e.message}")
+        raise
+
+@metrics.timed(metrics.APPWRITE_SECONDS, metrics.APPWRITE_ERRORS, operation="get_documents")
 def get_documents(database_id, collection_id, queries=None):
     try:
         db = Databases(get_db_client())
@@ -174,27 +243,58 @@ def get_documents(database_id, collection_id, queries=None):
         queries.append(Query.limit(500)) 
         return db.list_documents(database_id, collection_id, queries=queries).get('documents', [])
     except AppwriteException as e:
+        metrics.APPWRITE_ERRORS.inc(operation="get_documents")
         logger.error(f"خطای Appwrite در دریافت اسناد از کالکشن {collection_id}: {e.message}")
         return []
 
+@metrics.timed(metrics.APPWRITE_SECONDS, metrics.APPWRITE_ERRORS, operation="list_documents_page")
+def list_documents_page(database_id, collection_id, queries=None, limit=100, cursor_after=None):
+    """یک صفحه از اسناد را برمی‌گرداند؛ cursor_after شناسه ($id) آخرین سند صفحه قبلی است."""
+    page_queries = list(queries or []) + [Query.limit(limit)]
+    if cursor_after:
+        page_queries.append(Query.cursor_after(cursor_after))
+    try:
+        db = Databases(get_db_client())
+        return db.list_documents(database_id, collection_id, queries=page_queries).get('documents', [])
+    except AppwriteException as e:
+        logger.error(f"خطای Appwrite در دریافت صفحه‌ای اسناد از کالکشن {collection_id}: {e.message}")
+        raise
+
+def iter_documents(database_id, collection_id, queries=None, page_size=100):
+    """
+    تمام اسناد منطبق با کوئری‌ها را صفحه به صفحه (با cursor) برمی‌گرداند؛ برخلاف get_documents به سقف ۵۰۰ سند محدود نیست.
+    """
+    last_id = None
+    while True:
+        documents = list_documents_page(database_id, collection_id, queries, page_size, last_id)
+        yield from documents
+        if len(documents) < page_size:
+            break
+        last_id = documents[-1]['$id']
+
+@metrics.timed(metrics.APPWRITE_SECONDS, metrics.APPWRITE_ERRORS, operation="get_single_document")
 def get_single_document(database_id, collection_id, key, value):
     try:
         db = Databases(get_db_client())
         response = db.list_documents(database_id, collection_id, queries=[Query.equal(key, [value])])
         return response['documents'][0] if response['total'] > 0 else None
     except AppwriteException as e:
+        metrics.APPWRITE_ERRORS.inc(operation="get_single_document")
         logger.error(f"خطای Appwrite در دریافت سند با {key}={value}: {e.message}")
         return None
 
+@metrics.timed(metrics.APPWRITE_SECONDS, metrics.APPWRITE_ERRORS, operation="get_single_document_by_id")
 def get_single_document_by_id(database_id, collection_id, document_id):
     """یک سند را با شناسه منحصر به فرد Appwrite ($id) آن دریافت می‌کند."""
     try:
         db = Databases(get_db_client())
         return db.get_document(database_id, collection_id, document_id)
     except AppwriteException as e:
+        metrics.APPWRITE_ERRORS.inc(operation="get_single_document_by_id")
         logger.error(f"خطای Appwrite در دریافت سند با ID={document_id}: {e.message}")
         return None
 
+@metrics.timed(metrics.APPWRITE_SECONDS, metrics.APPWRITE_ERRORS, operation="upsert_document")
 def upsert_document(database_id, collection_id, query_key, query_value, data):
     try:
         db = Databases(get_db_client())
@@ -211,6 +311,17 @@ def upsert_document(database_id, collection_id, query_key, query_value, data):
         logger.error(f"خطای Appwrite در ذخیره سند در کالکشن {collection_id}: {e.message}")
         raise
 
+@metrics.timed(metrics.APPWRITE_SECONDS, metrics.APPWRITE_ERRORS, operation="update_document")
+def update_document(database_id, collection_id, document_id, data):
+    """فیلدهای داده شده از یک سند را با شناسه ($id) آن به‌روزرسانی می‌کند."""
+    try:
+        db = Databases(get_db_client())
+        return db.update_document(database_id, collection_id, document_id, data)
+    except AppwriteException as e:
+        logger.error(f"خطای Appwrite در به‌روزرسانی سند {document_id} در کالکشن {collection_id}: {e.message}")
+        raise
+
+@metrics.timed(metrics.APPWRITE_SECONDS, metrics.APPWRITE_ERRORS, operation="delete_document")
 def delete_document(database_id, collection_id, document_id):
     """یک سند را با شناسه آن حذف می‌کند."""
     try:
@@ -218,6 +329,7 @@ def delete_document(database_id, collection_id, document_id):
         db.delete_document(database_id, collection_id, document_id)
         return True
     except AppwriteException as e:
+        metrics.APPWRITE_ERRORS.inc(operation="delete_document")
         logger.error(f"خطای Appwrite در حذف سند {document_id} از کالکشن {collection_id}: {e.message}")
         return False
 
@@ -227,3 +339,101 @@ def delete_document_by_clickup_id(database_id, collection_id, clickup_id_key, cl
     if doc:
         return delete_document(database_id, collection_id, doc['$id'])
     return False
+
+# --- دسترسی تیمی ---
+
+# داده‌های کلیک‌اپ یک بار برای هر تیم ذخیره می‌شوند، ولی هر کاربر فقط فضاها، پوشه‌ها، لیست‌ها و تسک‌هایی را می‌بیند
+# که توکن خودش به آن‌ها دسترسی دارد (کالکشن LIST_ACCESS). اعضای کلیک‌اپ برای همه اعضای تیم قابل مشاهده‌اند.
+_SCOPE_FIELDS = {
+    config.SPACES_COLLECTION_ID: ('clickup_space_id', 'space_ids'),
+    config.FOLDERS_COLLECTION_ID: ('clickup_folder_id', 'folder_ids'),
+    config.LISTS_COLLECTION_ID: ('clickup_list_id', 'list_ids'),
+    config.TASKS_COLLECTION_ID: ('list_id', 'list_ids'),
+    config.CLICKUP_USERS_COLLECTION_ID: ('team_id', 'team_ids'),
+}
+
+def get_user_team_ids(telegram_id: str) -> list[str]:
+    """شناسه تیم‌های کلیک‌اپی که کاربر تلگرام عضو آن‌هاست را برمی‌گرداند."""
+    memberships = get_documents(
+        config.APPWRITE_DATABASE_ID, config.TEAM_MEMBERSHIPS_COLLECTION_ID, [Query.equal("telegram_id", [str(telegram_id)])]
+    )
+    return [m['team_id'] for m in memberships if m.get('team_id')]
+
+# Appwrite کوئری با بیش از ۱۰۰ مقدار را نمی‌پذیرد
+_QUERY_MAX_VALUES = 100
+
+_visibility_cache = {}  # telegram_id -> (expires_at, visibility)
+# با هر باطل شدن کش زیاد می‌شود تا نتیجه خوانده شده پیش از همگام‌سازی دوباره در کش ننشیند
+_visibility_generation = 0
+
+def _load_user_visibility(telegram_id: str) -> dict | None:
+    rows = list(iter_documents(
+        config.APPWRITE_DATABASE_ID, config.LIST_ACCESS_COLLECTION_ID, [Query.equal("telegram_id", [str(telegram_id)])]
+    ))
+    if not rows:
+        return None
+    return {
+        'team_ids': set(get_user_team_ids(telegram_id)),
+        'space_ids': {row['space_id'] for row in rows if row.get('space_id')},
+        'folder_ids': {row['folder_id'] for row in rows if row.get('folder_id')},
+        'list_ids': {row['list_id'] for row in rows},
+    }
+
+def get_user_visibility(telegram_id: str) -> dict | None:
+    """
+    شناسه تیم‌ها، فضاها، پوشه‌ها و لیست‌هایی که کاربر با توکن خودش می‌بیند.
+    اگر دسترسی کاربر هنوز ثبت نشده باشد (پیش از اولین همگام‌سازی او) None برمی‌گرداند.
+    نتیجه به مدت VISIBILITY_CACHE_TTL_SECONDS کش می‌شود و همگام‌سازی کاربر آن را باطل می‌کند.
+    """
+    telegram_id = str(telegram_id)
+    cached = _visibility_cache.get(telegram_id)
+    if cached is not None and cached[0] >= time.monotonic():
+        metrics.record_cache_lookup("user_visibility", True)
+        return cached[1]
+    metrics.record_cache_lookup("user_visibility", False)
+    generation = _visibility_generation
+    try:
+        visibility = _load_user_visibility(telegram_id)
+    except AppwriteException:
+        return None
+    if generation == _visibility_generation:
+        if len(_visibility_cache) > 10_000:
+            now = time.monotonic()
+            for expired_user in [uid for uid, (expires_at, _) in _visibility_cache.items() if expires_at < now]:
+                _visibility_cache.pop(expired_user, None)
+        _visibility_cache[telegram_id] = (time.monotonic() + config.VISIBILITY_CACHE_TTL_SECONDS, visibility)
+    return visibility
+
+def invalidate_user_visibility(telegram_id: str):
+    """کش دسترسی کاربر را پس از تغییر LIST_ACCESS یا عضویت‌های تیمی او حذف می‌کند."""
+    global _visibility_generation
+    _visibility_generation += 1
+    _visibility_cache.pop(str(telegram_id), None)
+
+def get_user_scope_queries(telegram_id: str, collection_id: str) -> list:
+    """
+    کوئری محدودکننده اسناد کلیک‌اپ کالکشن collection_id (فضا، پوشه، لیست، تسک یا اعضا) به دسترسی‌های کاربر را می‌سازد.
+    برای کاربرانی که دسترسی‌شان هنوز ثبت نشده، به فیلتر قدیمی telegram_id برمی‌گردد.
+    """
+    visibility = get_user_visibility(telegram_id)
+    if visibility is None:
+        return [Query.equal("telegram_id", [str(telegram_id)])]
+    field, key = _SCOPE_FIELDS[collection_id]
+    # Appwrite کوئری equal با لیست خالی را نمی‌پذیرد؛ مقدار خالی با هیچ سندی منطبق نمی‌شود
+    ids = sorted(visibility[key]) or [""]
+    if len(ids) <= _QUERY_MAX_VALUES:
+        return [Query.equal(field, ids)]
+    # شناسه‌ها در چند equal حداکثر ۱۰۰ تایی شکسته و با or ترکیب می‌شوند
+    return [Query.or_queries([
+        Query.equal(field, ids[start:start + _QUERY_MAX_VALUES]) for start in range(0, len(ids), _QUERY_MAX_VALUES)
+    ])]
+
+def is_document_in_user_scope(doc: dict, telegram_id: str, collection_id: str = config.TASKS_COLLECTION_ID) -> bool:
+    """بررسی می‌کند که کاربر با توکن خودش به یک سند کلیک‌اپ (به طور پیش‌فرض تسک) دسترسی داشته باشد."""
+    if not doc:
+        return False
+    visibility = get_user_visibility(telegram_id)
+    if visibility is None:
+        return doc.get('telegram_id') == str(telegram_id)
+    field, key = _SCOPE_FIELDS[collection_id]
+    return doc.get(field) in visibility[key]
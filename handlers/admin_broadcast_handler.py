@@ -0,0 +1,288 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import logging
+import time
+from datetime import datetime, timezone
+
+from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.ext import (
+    ContextTypes,
+    ConversationHandler,
+    MessageHandler,
+    CallbackQueryHandler,
+    CommandHandler,
+    filters,
+)
+from appwrite.query import Query
+
+import config
+import database
+import outbound_queue
+from . import common
+
+logger = logging.getLogger(__name__)
+
+SELECTING_AUDIENCE, AWAITING_BROADCAST_MESSAGE, CONFIRMING_BROADCAST = range(3)
+
+# broadcast_id -> asyncio.Task برای ارسال‌های در حال اجرا در این پروسس
+_running_broadcasts = {}
+_stop_requested = set()
+
+
+# --- ارسال همگانی (اجرا در پس‌زمینه) ---
+
+def _recipient_queries(broadcast_doc: dict) -> list:
+    queries = []
+    if broadcast_doc.get('package_id'):
+        queries.append(Query.equal("package_id", [broadcast_doc['package_id']]))
+    if broadcast_doc.get('only_active'):
+        queries.append(Query.equal("is_active", [True]))
+    return queries
+
+def _progress_text(status: str, sent: int, failed: int) -> str:
+    titles = {
+        'running': "📢 در حال ارسال پیام همگانی... ⏳",
+        'completed': "✅ ارسال پیام همگانی به پایان رسید.",
+        'cancelled': "⛔ ارسال پیام همگانی متوقف شد.",
+        'failed': "⚠️ ارسال پیام همگانی به دلیل خطا متوقف شد.",
+    }
+    return f"{titles.get(status, status)}\n\n📨 ارسال شده: {sent}\n❌ ناموفق: {failed}"
+
+async def _edit_progress(bot, broadcast_doc: dict, status: str, sent: int, failed: int):
+    if not broadcast_doc.get('progress_chat_id') or not broadcast_doc.get('progress_message_id'):
+        return
+    reply_markup = None
+    if status == 'running':
+        reply_markup = InlineKeyboardMarkup([[InlineKeyboardButton("⛔ توقف ارسال", callback_data=f"broadcast_stop_{broadcast_doc['$id']}")]])
+    try:
+        await bot.edit_message_text(
+            chat_id=broadcast_doc['progress_chat_id'],
+            message_id=broadcast_doc['progress_message_id'],
+            text=_progress_text(status, sent, failed),
+            reply_markup=reply_markup,
+        )
+    except Exception as e:
+        logger.debug(f"Could not edit broadcast progress message: {e}")
+
+async def run_broadcast(bot, broadcast_id: str):
+    """
+    پیام همگانی را صفحه به صفحه برای گیرندگان ارسال می‌کند. نرخ ارسال توسط outbound_queue کنترل می‌شود و
+    پس از هر صفحه نقطه ادامه (last_user_doc_id) در دیتابیس ذخیره می‌شود تا پس از راه‌اندازی مجدد ادامه یابد.
+    """
+    broadcast_doc = await asyncio.to_thread(database.get_single_document_by_id, config.APPWRITE_DATABASE_ID, config.BROADCASTS_COLLECTION_ID, broadcast_id)
+    if not broadcast_doc or broadcast_doc.get('status') != 'running':
+        return
+
+    sent = broadcast_doc.get('sent_count') or 0
+    failed = broadcast_doc.get('failed_count') or 0
+    cursor = broadcast_doc.get('last_user_doc_id')
+    queries = _recipient_queries(broadcast_doc)
+    last_progress_edit = 0.0
+    status = 'running'
+    logger.info(f"Broadcast {broadcast_id} started/resumed (sent={sent}, failed={failed}, cursor={cursor}).")
+
+    try:
+        while True:
+            if broadcast_id in _stop_requested:
+                status = 'cancelled'
+                break
+
+            recipients = await asyncio.to_thread(
+                database.list_documents_page, config.APPWRITE_DATABASE_ID, config.BOT_USERS_COLLECTION_ID,
+                queries, config.BROADCAST_BATCH_SIZE, cursor
+            )
+            if not recipients:
+                status = 'completed'
+                break
+
+            futures = [outbound_queue.send_message(user['telegram_id'], broadcast_doc['message']) for user in recipients if user.get('telegram_id')]
+            results = await asyncio.gather(*futures, return_exceptions=True)
+            delivered = sum(1 for result in results if not isinstance(result, BaseException))
+            sent += delivered
+            failed += len(results) - delivered
+            cursor = recipients[-1]['$id']
+
+            await asyncio.to_thread(
+                database.update_document, config.APPWRITE_DATABASE_ID, config.BROADCASTS_COLLECTION_ID, broadcast_id,
+                {'last_user_doc_id': cursor, 'sent_count': sent, 'failed_count': failed}
+            )
+
+            if time.monotonic() - last_progress_edit >= config.BROADCAST_PROGRESS_EDIT_INTERVAL_SECONDS:
+                await _edit_progress(bot, broadcast_doc, status, sent, failed)
+                last_progress_edit = time.monotonic()
+
+            if len(recipients) < config.BROADCAST_BATCH_SIZE:
+                status = 'completed'
+                break
+    except asyncio.CancelledError:
+        # خاموش شدن ربات: وضعیت running باقی می‌ماند تا در اجرای بعدی ادامه یابد
+        logger.info(f"Broadcast {broadcast_id} interrupted at cursor {cursor}; it will resume on next start.")
+        raise
+    except Exception as e:
+        # با وضعیت running، ارسال پس از راه‌اندازی مجدد خودکار ادامه می‌یافت و همین صفحه دوباره ارسال می‌شد
+        logger.error(f"Broadcast {broadcast_id} failed at cursor {cursor}: {e}", exc_info=True)
+        status = 'failed'
+    finally:
+        _running_broadcasts.pop(broadcast_id, None)
+        _stop_requested.discard(broadcast_id)
+
+    try:
+        await asyncio.to_thread(
+            database.update_document, config.APPWRITE_DATABASE_ID, config.BROADCASTS_COLLECTION_ID, broadcast_id,
+            {'status': status, 'sent_count': sent, 'failed_count': failed, 'finished_at': datetime.now(timezone.utc).isoformat()}
+        )
+    except Exception as e:
+        logger.error(f"Could not save final status '{status}' of broadcast {broadcast_id}: {e}")
+    await _edit_progress(bot, broadcast_doc, status, sent, failed)
+    logger.info(f"Broadcast {broadcast_id} {status} (sent={sent}, failed={failed}).")
+
+def start_broadcast_task(application, broadcast_id: str):
+    if broadcast_id in _running_broadcasts:
+        return
+    _running_broadcasts[broadcast_id] = application.create_task(run_broadcast(application.bot, broadcast_id))
+
+async def resume_pending_broadcasts(application):
+    """ارسال‌های همگانی نیمه‌کاره (وضعیت running) را پس از راه‌اندازی ربات از نقطه ذخیره شده ادامه می‌دهد."""
+    pending = await asyncio.to_thread(
+        database.get_documents, config.APPWRITE_DATABASE_ID, config.BROADCASTS_COLLECTION_ID, [Query.equal("status", ["running"])]
+    )
+    for broadcast_doc in pending:
+        logger.info(f"Resuming broadcast {broadcast_doc['$id']}...")
+        start_broadcast_task(application, broadcast_doc['$id'])
+
+async def cancel_running_broadcasts():
+    """هنگام خاموش شدن، ارسال‌های در جریان را متوقف می‌کند؛ وضعیتشان running می‌ماند تا بعداً ادامه یابند."""
+    tasks = list(_running_broadcasts.values())
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+# --- Broadcast Conversation ---
+
+async def broadcast_entry(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """Entry point from the admin panel: asks the admin to choose the audience."""
+    if not await common.is_user_admin(str(update.effective_user.id)):
+        return ConversationHandler.END
+
+    packages = await asyncio.to_thread(database.get_documents, config.APPWRITE_DATABASE_ID, config.PACKAGES_COLLECTION_ID)
+    keyboard = [
+        [InlineKeyboardButton("👥 همه کاربران", callback_data="broadcast_audience_all")],
+        [InlineKeyboardButton("✅ فقط کاربران فعال", callback_data="broadcast_audience_active")],
+    ]
+    keyboard += [[InlineKeyboardButton(f"📦 {pkg['package_name']}", callback_data=f"broadcast_audience_pkg_{pkg['$id']}")] for pkg in packages]
+    keyboard.append([InlineKeyboardButton("❌ لغو", callback_data="broadcast_cancel")])
+
+    await update.message.reply_text("📢 پیام همگانی برای چه کاربرانی ارسال شود؟", reply_markup=InlineKeyboardMarkup(keyboard))
+    return SELECTING_AUDIENCE
+
+async def audience_selected(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    query = update.callback_query
+    await query.answer()
+
+    audience = query.data.replace("broadcast_audience_", "")
+    if audience == "all":
+        broadcast = {'package_id': None, 'only_active': False, 'audience_label': "همه کاربران"}
+    elif audience == "active":
+        broadcast = {'package_id': None, 'only_active': True, 'audience_label': "کاربران فعال"}
+    else:
+        package_id = audience.replace("pkg_", "")
+        pkg_doc = await asyncio.to_thread(database.get_single_document_by_id, config.APPWRITE_DATABASE_ID, config.PACKAGES_COLLECTION_ID, package_id)
+        package_name = pkg_doc['package_name'] if pkg_doc else package_id
+        broadcast = {'package_id': package_id, 'only_active': True, 'audience_label': f"کاربران فعال پکیج {package_name}"}
+    context.user_data['broadcast'] = broadcast
+
+    keyboard = [[InlineKeyboardButton("❌ لغو", callback_data="broadcast_cancel")]]
+    await query.message.edit_text(
+        f"گیرندگان: *{common.escape_markdown(broadcast['audience_label'])}*\n\nلطفاً متن پیام همگانی را ارسال کنید.",
+        reply_markup=InlineKeyboardMarkup(keyboard),
+        parse_mode='Markdown'
+    )
+    return AWAITING_BROADCAST_MESSAGE
+
+async def broadcast_message_received(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    context.chat_data['conversation_handled'] = True
+    broadcast = context.user_data.get('broadcast')
+    if not broadcast:
+        await update.message.reply_text("خطا: اطلاعات پیام همگانی یافت نشد. لطفاً دوباره تلاش کنید.")
+        return ConversationHandler.END
+
+    broadcast['message'] = update.message.text
+    keyboard = [[
+        InlineKeyboardButton("✅ ارسال", callback_data="broadcast_confirm"),
+        InlineKeyboardButton("❌ لغو", callback_data="broadcast_cancel"),
+    ]]
+    await update.message.reply_text(
+        f"پیش‌نمایش پیام برای «{broadcast['audience_label']}»:\n\n{broadcast['message']}\n\nآیا ارسال شود؟",
+        reply_markup=InlineKeyboardMarkup(keyboard)
+    )
+    return CONFIRMING_BROADCAST
+
+async def broadcast_confirmed(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    query = update.callback_query
+    await query.answer()
+    broadcast = context.user_data.pop('broadcast', None)
+    if not broadcast or not broadcast.get('message'):
+        await query.message.edit_text("خطا: اطلاعات پیام همگانی یافت نشد. لطفاً دوباره تلاش کنید.")
+        return ConversationHandler.END
+
+    # همین پیام تأیید به پیام نمایش پیشرفت تبدیل می‌شود
+    progress_message = await query.message.edit_text(_progress_text('running', 0, 0))
+    broadcast_data = {
+        'admin_id': str(update.effective_user.id),
+        'message': broadcast['message'],
+        'package_id': broadcast['package_id'],
+        'only_active': broadcast['only_active'],
+        'status': 'running',
+        'sent_count': 0,
+        'failed_count': 0,
+        'progress_chat_id': str(progress_message.chat_id),
+        'progress_message_id': progress_message.message_id,
+        'created_at': datetime.now(timezone.utc).isoformat(),
+    }
+    broadcast_doc = await asyncio.to_thread(database.create_document, config.APPWRITE_DATABASE_ID, config.BROADCASTS_COLLECTION_ID, broadcast_data)
+    start_broadcast_task(context.application, broadcast_doc['$id'])
+    return ConversationHandler.END
+
+async def broadcast_cancelled(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    query = update.callback_query
+    await query.answer()
+    context.user_data.pop('broadcast', None)
+    await query.message.edit_text("ارسال پیام همگانی لغو شد.")
+    return ConversationHandler.END
+
+async def broadcast_stop_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Stops a running broadcast from its progress message."""
+    query = update.callback_query
+    if not await common.is_user_admin(str(query.from_user.id)):
+        await query.answer()
+        return
+    broadcast_id = query.data.replace("broadcast_stop_", "")
+    if broadcast_id in _running_broadcasts:
+        _stop_requested.add(broadcast_id)
+        await query.answer("در حال توقف ارسال...")
+    else:
+        # ارسالی که در این پروسس اجرا نمی‌شود (مثلاً پس از خطا) مستقیماً متوقف علامت‌گذاری می‌شود
+        await asyncio.to_thread(
+            database.update_document, config.APPWRITE_DATABASE_ID, config.BROADCASTS_COLLECTION_ID, broadcast_id,
+            {'status': 'cancelled', 'finished_at': datetime.now(timezone.utc).isoformat()}
+        )
+        await query.answer("ارسال متوقف شد.")
+        await query.message.edit_reply_markup(reply_markup=None)
+
+def get_broadcast_conv_handler() -> ConversationHandler:
+    """Creates the ConversationHandler for admin broadcasts."""
+    return ConversationHandler(
+        name="admin_broadcast",
+        persistent=True,
+        entry_points=[MessageHandler(filters.Regex('^📢 پیام همگانی$'), broadcast_entry)],
+        states={
+            SELECTING_AUDIENCE: [CallbackQueryHandler(audience_selected, pattern='^broadcast_audience_')],
+            AWAITING_BROADCAST_MESSAGE: [MessageHandler(filters.TEXT & ~filters.COMMAND, broadcast_message_received)],
+            CONFIRMING_BROADCAST: [CallbackQueryHandler(broadcast_confirmed, pattern='^broadcast_confirm$')],
+        },
+        fallbacks=[
+            CallbackQueryHandler(broadcast_cancelled, pattern='^broadcast_cancel$'),
+            CommandHandler("cancel", common.generic_cancel_conversation)
+        ],
+    )
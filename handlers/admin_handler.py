@@ -8,25 +8,23 @@ from appwrite.query import Query
 import config
 import database
 import clickup_api
+import outbound_queue
 from . import common, admin_package_handler, admin_user_handler, support_handler, admin_payment_handler
 
 logger = logging.getLogger(__name__)
 
 # --- Admin Panel ---
 
-async def show_admin_panel(admin_id: str, context: ContextTypes.DEFAULT_TYPE):
-    """
-    Displays or sends the main admin menu with dynamic buttons.
-    This function is designed to be called from anywhere, including for live updates.
-    """
+async def count_unread_tickets() -> int:
     unread_tickets = await asyncio.to_thread(
         database.get_documents,
         config.APPWRITE_DATABASE_ID,
         config.SUPPORT_TICKETS_COLLECTION_ID,
         [Query.equal("status", ["unread"])]
     )
-    unread_count = len(unread_tickets)
-    
+    return len(unread_tickets)
+
+def build_admin_panel_markup(unread_count: int) -> ReplyKeyboardMarkup:
     messages_button_text = "✉️ پیام‌ها"
     if unread_count > 0:
         messages_button_text += f" ({unread_count})"
@@ -34,9 +32,19 @@ async def show_admin_panel(admin_id: str, context: ContextTypes.DEFAULT_TYPE):
     admin_keyboard = [
         [KeyboardButton("📦 مدیریت پکیج‌ها"), KeyboardButton("📊 مدیریت کاربران")],
         [KeyboardButton(messages_button_text), KeyboardButton("💳 بررسی پرداخت‌ها")],
-        [KeyboardButton("📈 گزارشات")]
+        [KeyboardButton("📈 گزارشات"), KeyboardButton("📢 پیام همگانی")]
     ]
-    reply_markup = ReplyKeyboardMarkup(admin_keyboard, resize_keyboard=True, one_time_keyboard=False)
+    return ReplyKeyboardMarkup(admin_keyboard, resize_keyboard=True, one_time_keyboard=False)
+
+async def show_admin_panel(admin_id: str, context: ContextTypes.DEFAULT_TYPE, unread_count: int | None = None):
+    """
+    Displays or sends the main admin menu with dynamic buttons.
+    This function is designed to be called from anywhere, including for live updates.
+    If unread_count is given, the support tickets are not queried again.
+    """
+    if unread_count is None:
+        unread_count = await count_unread_tickets()
+    reply_markup = build_admin_panel_markup(unread_count)
     
     try:
         await context.bot.send_message(
@@ -47,6 +55,25 @@ async def show_admin_panel(admin_id: str, context: ContextTypes.DEFAULT_TYPE):
     except Exception as e:
         logger.error(f"Could not send admin panel to {admin_id}: {e}")
 
+async def notify_admins(text: str, reply_markup=None, refresh_panel: bool = False):
+    """
+    یک پیام را از طریق صف ارسال به تمام ادمین‌ها می‌فرستد (بدون انتظار برای ارسال).
+    در صورت refresh_panel، پنل مدیریت با تعداد پیام‌های خوانده نشده (که فقط یک بار محاسبه می‌شود) هم ارسال می‌شود.
+    در پس‌زمینه اجرا می‌شود؛ خطاها فقط لاگ می‌شوند تا به error_handler (و کاربری که اطلاعیه را ندیده) نرسند.
+    """
+    try:
+        admins = await asyncio.to_thread(
+            database.get_documents, config.APPWRITE_DATABASE_ID, config.BOT_USERS_COLLECTION_ID, [Query.equal("is_admin", [True])]
+        )
+        panel_markup = build_admin_panel_markup(await count_unread_tickets()) if refresh_panel else None
+
+        for admin in admins:
+            outbound_queue.send_message(admin['telegram_id'], text, reply_markup=reply_markup, parse_mode='Markdown')
+            if panel_markup is not None:
+                outbound_queue.send_message(admin['telegram_id'], "پنل مدیریت:", reply_markup=panel_markup)
+    except Exception as e:
+        logger.error(f"ارسال اطلاعیه به ادمین‌ها ناموفق بود: {e}", exc_info=True)
+
 async def start_for_admin(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Entry point for an admin using /start or similar commands."""
     admin_id = str(update.effective_user.id)
@@ -82,7 +109,7 @@ async def resync_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     await update.message.reply_text("شروع همگام‌سازی مجدد اطلاعات از ClickUp... ⏳")
     try:
-        sync_success = await asyncio.to_thread(clickup_api.sync_all_user_data, token, user_id)
+        sync_success = await asyncio.to_thread(clickup_api.sync_all_user_data, token, user_id, force=True)
         if sync_success:
             await update.message.reply_text("✅ همگام‌سازی مجدد با موفقیت انجام شد.")
         else:
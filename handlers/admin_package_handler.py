@@ -286,6 +286,8 @@ async def pkg_monthly_cmd_limit_received(update: Update, context: ContextTypes.D
 
 def get_new_package_conv_handler() -> ConversationHandler:
     return ConversationHandler(
+        name="admin_new_package",
+        persistent=True,
         entry_points=[CallbackQueryHandler(new_package_start, pattern='^admin_pkg_add$')],
         states={
             PKG_NAME: [MessageHandler(filters.TEXT & ~filters.COMMAND, pkg_name_received)],
@@ -403,6 +405,8 @@ async def edit_pkg_value_received(update: Update, context: ContextTypes.DEFAULT_
 
 def get_edit_package_conv_handler() -> ConversationHandler:
     return ConversationHandler(
+        name="admin_edit_package",
+        persistent=True,
         entry_points=[CallbackQueryHandler(edit_package_start, pattern='^admin_pkg_edit_')],
         states={
             EDIT_PKG_SELECT_FIELD: [CallbackQueryHandler(edit_pkg_field_selected, pattern='^edit_pkg_field_')],
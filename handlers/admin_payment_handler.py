@@ -320,6 +320,8 @@ async def admin_payment_button_handler(update: Update, context: ContextTypes.DEF
 def get_payment_review_conv_handler():
     """Returns the ConversationHandler for the rejection reason flow."""
     return ConversationHandler(
+        name="admin_payment_review",
+        persistent=True,
         entry_points=[CallbackQueryHandler(admin_payment_button_handler, pattern=r'^admin_payment_action_reject_')],
         states={
             AWAITING_REJECTION_REASON: [MessageHandler(filters.TEXT & ~filters.COMMAND, rejection_reason_received)]
@@ -12,6 +12,7 @@ from telegram.ext import (
 )
 import config
 import database
+import access_cache
 from . import common
 
 logger = logging.getLogger(__name__)
@@ -172,6 +173,7 @@ async def admin_user_button_handler(update: Update, context: ContextTypes.DEFAUL
             current_status = user_doc.get('is_active', True)
             new_status = not current_status
             await asyncio.to_thread(database.upsert_document, config.APPWRITE_DATABASE_ID, config.BOT_USERS_COLLECTION_ID, 'telegram_id', user_telegram_id, {'is_active': new_status})
+            access_cache.set_user_active(user_telegram_id, new_status)
             
             status_text = "فعال" if new_status else "مسدود"
             try:
@@ -196,6 +198,7 @@ async def admin_user_button_handler(update: Update, context: ContextTypes.DEFAUL
         user_doc = await asyncio.to_thread(database.get_single_document, config.APPWRITE_DATABASE_ID, config.BOT_USERS_COLLECTION_ID, 'telegram_id', user_telegram_id)
         if user_doc:
             await asyncio.to_thread(database.delete_document, config.APPWRITE_DATABASE_ID, config.BOT_USERS_COLLECTION_ID, user_doc['$id'])
+            access_cache.remove_user(user_telegram_id)
             await query.message.edit_text(f"✅ کاربر با شناسه `{user_telegram_id}` با موفقیت حذف شد.")
             await manage_users_entry(update, context, page=0)
         else:
@@ -256,6 +259,8 @@ async def cancel_direct_message(update: Update, context: ContextTypes.DEFAULT_TY
 def get_send_direct_message_conv_handler():
     """Creates the ConversationHandler for sending direct messages."""
     return ConversationHandler(
+        name="admin_direct_message",
+        persistent=True,
         entry_points=[CallbackQueryHandler(send_direct_message_start, pattern='^admin_user_send_message_')],
         states={
             AWAITING_DIRECT_MESSAGE: [MessageHandler(filters.TEXT & ~filters.COMMAND, direct_message_received)]
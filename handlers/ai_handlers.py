@@ -4,32 +4,51 @@ import telegram
 import json
 import logging
 import inspect
+import time
+import contextlib
 from typing import Dict, Any, Tuple
 from datetime import datetime, date, timezone
 from dateutil.parser import parse as dateutil_parse
-from langchain.memory import ConversationSummaryMemory
-from langchain_ollama import ChatOllama
 from langchain_core.messages import SystemMessage, HumanMessage
 from httpx import ConnectError
 from functools import partial
 
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
+from telegram.constants import MessageLimit
+from telegram.error import BadRequest, RetryAfter, TelegramError
 
 import config
-from ai import prompts, tools
+from ai import prompts, tools, llm_clients, pre_router, plan_cache, router_examples
+from ai.memory_store import MemoryStore, prompt_history
+from ai.llm_scheduler import LLMScheduler, SchedulerBusy, PAID, STANDARD
 import database
+import metrics
 from . import common
 import clickup_api
+import chat_log
 
 logger = logging.getLogger(__name__)
 
-memories = {}
-
-def get_memory(user_id: str) -> ConversationSummaryMemory:
-    if user_id not in memories:
-        memories[user_id] = ConversationSummaryMemory(llm=ChatOllama(model=config.OLLAMA_MODEL, base_url=config.OLLAMA_BASE_URL))
-    return memories[user_id]
+llm_clients.init_clients()
+llm_scheduler = LLMScheduler(
+    max_concurrent=config.LLM_MAX_CONCURRENT_REQUESTS,
+    max_queue=config.LLM_QUEUE_MAX_SIZE,
+    max_per_user=config.LLM_QUEUE_MAX_PER_USER,
+    max_wait_seconds=config.LLM_QUEUE_MAX_WAIT_SECONDS,
+    paid_weight=config.LLM_PAID_PRIORITY_WEIGHT,
+)
+memory_store = MemoryStore(
+    llm_clients.get_client(llm_clients.SUMMARIZER),
+    max_entries=config.AI_MEMORY_MAX_ENTRIES,
+    max_bytes=config.AI_MEMORY_MAX_BYTES,
+    max_messages=config.AI_MEMORY_MAX_MESSAGES,
+    memory_dir=config.AI_MEMORY_DIR,
+    summary_token_threshold=config.AI_SUMMARY_TOKEN_THRESHOLD,
+    # خلاصه‌سازی پس‌زمینه مثل یک کاربر عادی در نوبت زمان‌بند قرار می‌گیرد
+    summary_slot=partial(llm_scheduler.slot, "background:summarizer", STANDARD),
+)
+router_plan_cache = plan_cache.PlanCache(config.ROUTER_PLAN_CACHE_MAX_ENTRIES, config.ROUTER_PLAN_CACHE_TTL_SECONDS)
 
 # --- AI Access Control ---
 
@@ -145,12 +164,169 @@ async def _execute_tool_and_handle_response(tool_name: str, args: dict, update:
         except Exception as inner_e:
             logger.error(f"Could not even edit the placeholder to show error: {inner_e}")
 
-def log_chat_to_db(user_id: str, user_name: str, user_message: str, bot_response: str, success: bool, error_message: str = None):
-    data = {'user_id': user_id, 'user_name': user_name, 'user_message': user_message, 'bot_response': bot_response, 'success': success, 'error_message': error_message, 'timestamp': datetime.now().isoformat()}
-    try:
-        database.create_document(config.APPWRITE_CHAT_DATABASE_ID, config.CHAT_LOGS_COLLECTION_ID, data)
-    except Exception as e:
-        logger.error(f"خطا در ذخیره لاگ مکالمه در Appwrite: {e}", exc_info=True)
+# --- Router ---
+
+async def _route_with_llm(user_id: str, user_input: str, history: list, llm_slot, on_llm_call=None) -> Tuple[dict, str]:
+    """
+    برنامه (plan) روتر را برمی‌گرداند؛ ابتدا کش بررسی می‌شود مگر اینکه پیام به تاریخچه مکالمه ارجاع دهد.
+    فراخوانی مدل داخل llm_slot (نوبت زمان‌بند LLM) انجام می‌شود.
+    در حالت combined برای مکالمه عمومی، پاسخ کاربر هم در فیلد reply برنامه برمی‌گردد.
+    on_llm_call (در صورت وجود) درست پیش از فراخوانی مدل (یعنی پس از عدم یافتن در کش) صدا زده می‌شود.
+    Returns: (plan, route_path)
+    """
+    cache_key = None
+    if plan_cache.history_matters(user_input):
+        metrics.CACHE_LOOKUPS.inc(cache="router_plan", result="bypass")
+    else:
+        cache_key = await plan_cache.cache_key(user_id, user_input)
+        cached_plan = router_plan_cache.get(cache_key)
+        if cached_plan is not None:
+            return cached_plan, "plan_cache"
+
+    combined = config.AI_ROUTING_MODE == "combined"
+    routing_messages = [SystemMessage(content=router_examples.build_router_prompt(user_input, combined))] + history + [HumanMessage(content=user_input)]
+    llm_router = llm_clients.get_client(llm_clients.COMBINED if combined else llm_clients.ROUTER)
+    if on_llm_call is not None:
+        on_llm_call()
+    async with llm_slot():
+        with metrics.track(metrics.OLLAMA_SECONDS, metrics.OLLAMA_ERRORS, purpose="combined" if combined else "router"):
+            response = await llm_router.ainvoke(routing_messages)
+    plan = json.loads(response.content)
+    if cache_key is not None:
+        # پاسخ مکالمه به تاریخچه وابسته است و کش نمی‌شود؛ برنامه no_op کش شده به مدل چت فرستاده می‌شود
+        router_plan_cache.put(cache_key, {key: value for key, value in plan.items() if key != 'reply'})
+    return plan, "llm_combined" if combined else "llm_router"
+
+# --- LLM scheduling ---
+
+@contextlib.asynccontextmanager
+async def _llm_slot(user_id: str, priority: str, placeholder_message):
+    """نوبت زمان‌بند LLM را می‌گیرد و تا زمان انتظار، جایگاه کاربر در صف را در پیام موقت نشان می‌دهد."""
+    queued = False
+
+    async def show_position(position: int):
+        nonlocal queued
+        queued = True
+        await placeholder_message.edit_text(f"⏳ سرور هوش مصنوعی مشغول است؛ درخواست شما در صف است (نفر {position}).")
+
+    async with llm_scheduler.slot(user_id, priority, show_position):
+        if queued:
+            try:
+                await placeholder_message.edit_text("در حال پردازش درخواست شما... ⏳")
+            except telegram.error.TelegramError as e:
+                logger.debug(f"Could not reset the placeholder after queueing: {e}")
+        yield
+
+# --- Streaming chat replies ---
+
+def _retry_after_seconds(error: RetryAfter) -> float:
+    retry_after = error.retry_after
+    return retry_after.total_seconds() if hasattr(retry_after, 'total_seconds') else float(retry_after)
+
+async def _finalize_streamed_reply(placeholder_message, text: str):
+    """متن کامل را جایگزین پیام موقت می‌کند؛ بخش‌های بیشتر از سقف طول پیام تلگرام جداگانه ارسال می‌شوند."""
+    limit = MessageLimit.MAX_TEXT_LENGTH
+    parts = [text[i:i + limit] for i in range(0, len(text), limit)] or ["🤖 پاسخی دریافت نشد."]
+    for attempt in range(2):
+        try:
+            await placeholder_message.edit_text(parts[0])
+            break
+        except RetryAfter as e:
+            if attempt:
+                raise
+            await asyncio.sleep(_retry_after_seconds(e))
+        except BadRequest as e:
+            if "not modified" not in str(e).lower():
+                raise
+            break
+    for part in parts[1:]:
+        await placeholder_message.reply_text(part)
+
+async def _ollama_chunks(llm, messages: list):
+    """متن تکه‌های پاسخ stream شده مدل؛ زمان رسیدن اولین تکه در متریک ثبت می‌شود."""
+    started = time.perf_counter()
+    first = True
+    async for chunk in llm.astream(messages):
+        if first:
+            metrics.OLLAMA_FIRST_TOKEN_SECONDS.observe(time.perf_counter() - started, purpose="chat")
+            first = False
+        yield chunk.content
+
+async def _stream_chat_reply(chunk_stream, placeholder_message) -> str:
+    """
+    تکه‌های پاسخ (chunk_stream) را دریافت می‌کند و پیام موقت را با متن دریافت شده تا این لحظه ویرایش می‌کند؛
+    ویرایش‌ها حداقل AI_STREAM_EDIT_INTERVAL_SECONDS فاصله دارند و در صورت RetryAfter تا پایان مهلت متوقف می‌شوند؛
+    خطاهای ویرایش‌های میانی نادیده گرفته می‌شوند. متن کامل برگردانده می‌شود و نمایش نهایی آن
+    (_finalize_streamed_reply) با فراخواننده است تا خارج از نوبت زمان‌بند LLM انجام شود.
+    """
+    chunks = []
+    shown = ""
+    next_edit_at = 0.0
+    async for content in chunk_stream:
+        chunks.append(content)
+        now = time.monotonic()
+        if now < next_edit_at:
+            continue
+        text = "".join(chunks).strip()
+        if not text or text == shown:
+            continue
+        next_edit_at = now + config.AI_STREAM_EDIT_INTERVAL_SECONDS
+        try:
+            await placeholder_message.edit_text(text[:MessageLimit.MAX_TEXT_LENGTH - 2] + " ▌")
+            shown = text
+        except RetryAfter as e:
+            next_edit_at = time.monotonic() + _retry_after_seconds(e)
+        except TelegramError as e:
+            # ویرایش‌های میانی فقط نمایشی‌اند؛ خطای شبکه یا BadRequest نباید تولید پاسخ را متوقف کند
+            logger.debug(f"Streaming edit skipped: {e}")
+    return "".join(chunks).strip()
+
+# --- Speculative chat ---
+
+_SPECULATION_END = object()
+
+class _SpeculativeChat:
+    """
+    پاسخ چت را هم‌زمان با روتر (در نوبت جداگانه زمان‌بند) تولید و بدون نمایش در بافر نگه می‌دارد.
+    اگر روتر no_op برگرداند، stream() تکه‌های دریافت شده و ادامه پاسخ را برمی‌گرداند؛ در غیر این صورت cancel() تولید را متوقف می‌کند.
+    """
+
+    def __init__(self, llm, messages: list, slot):
+        self._chunks = asyncio.Queue()
+        self._task = asyncio.create_task(self._produce(llm, messages, slot))
+
+    async def _produce(self, llm, messages: list, slot):
+        try:
+            async with slot():
+                with metrics.track(metrics.OLLAMA_SECONDS, metrics.OLLAMA_ERRORS, purpose="chat_speculative"):
+                    async for content in _ollama_chunks(llm, messages):
+                        self._chunks.put_nowait(content)
+        except Exception as e:
+            # خطا به مصرف‌کننده منتقل می‌شود (اگر پاسخ استفاده شود)
+            self._chunks.put_nowait(e)
+        finally:
+            self._chunks.put_nowait(_SPECULATION_END)
+
+    async def stream(self):
+        while True:
+            item = await self._chunks.get()
+            if item is _SPECULATION_END:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+
+    def cancel(self):
+        self._task.cancel()
+
+def _should_speculate() -> bool:
+    if not config.AI_SPECULATIVE_CHAT or config.AI_ROUTING_MODE == "combined":
+        return False
+    # روتر و چت هر کدام یک نوبت می‌گیرند؛ زیر بار، حدس زدن ظرفیت درخواست‌های دیگر را می‌گیرد
+    if not llm_scheduler.has_capacity(2):
+        metrics.AI_SPECULATIVE_CHAT.inc(outcome="skipped_load")
+        return False
+    return True
 
 async def ai_handler_entry(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = str(update.effective_user.id)
@@ -162,7 +338,7 @@ async def ai_handler_entry(update: Update, context: ContextTypes.DEFAULT_TYPE):
         
     context.chat_data.pop('ai_correction_context', None)
         
-    has_access, reason_code, user_doc, _ = await check_ai_access(user_id, 'chat')
+    has_access, reason_code, user_doc, package_doc = await check_ai_access(user_id, 'chat')
     if not has_access:
         reason_map = {
             "no_package": "شما برای استفاده از هوش مصنوعی نیاز به یک پکیج فعال دارید.",
@@ -191,19 +367,35 @@ async def ai_handler_entry(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_name = update.message.from_user.username or "Unknown"
     logger.info(f"درخواست هوش مصنوعی جدید از '{user_name}' ({user_id}): '{user_input}'")
     
-    memory = get_memory(user_id)
-    history = memory.chat_memory.messages
+    priority = PAID if package_doc.get('monthly_price', 0) > 0 else STANDARD
+    llm_slot = partial(_llm_slot, user_id, priority, placeholder_message)
+    memory = await memory_store.get(user_id)
+    history = prompt_history(memory)
+    chat_messages = [SystemMessage(content=prompts.CHAT_PROMPT)] + history + [HumanMessage(content=user_input)]
+    speculative_chat = None
+
+    def start_speculative_chat():
+        nonlocal speculative_chat
+        if _should_speculate():
+            speculative_chat = _SpeculativeChat(llm_clients.get_client(llm_clients.CHAT), chat_messages, partial(llm_scheduler.slot, user_id, priority))
     
     await update.message.chat.send_action(action='typing')
-    routing_messages = [SystemMessage(content=prompts.TOOL_ROUTER_PROMPT)] + history + [HumanMessage(content=user_input)]
-    llm_router = ChatOllama(model=config.OLLAMA_MODEL, base_url=config.OLLAMA_BASE_URL, format="json", temperature=0)
     
     try:
-        response = await llm_router.ainvoke(routing_messages)
-        plan = json.loads(response.content)
+        # مسیریاب قاعده‌محور: پیام‌هایی که قطعاً مکالمه‌اند (احوال‌پرسی، پرسش کوتاه) بدون فراخوانی روتر LLM به چت می‌روند
+        routed_tool = pre_router.pre_route(user_input)
+        if routed_tool is not None:
+            route_path = "rules"
+            plan = {"steps": [{"tool_name": routed_tool, "arguments": {}}]}
+        else:
+            plan, route_path = await _route_with_llm(user_id, user_input, history, llm_slot, start_speculative_chat)
         tool_name = plan.get('steps', [{}])[0].get('tool_name', 'no_op')
+        metrics.AI_ROUTE_DECISIONS.inc(path=route_path, tool=tool_name)
         
         if tool_name != 'no_op':
+            if speculative_chat is not None:
+                speculative_chat.cancel()
+                metrics.AI_SPECULATIVE_CHAT.inc(outcome="cancelled")
             has_access, reason, user_doc, _ = await check_ai_access(user_id, 'command')
             if not has_access:
                 reason_map = {
@@ -218,24 +410,46 @@ async def ai_handler_entry(update: Update, context: ContextTypes.DEFAULT_TYPE):
             tool_args = plan['steps'][0].get('arguments', {})
             await _execute_tool_and_handle_response(tool_name, tool_args, update, context, placeholder_message.message_id)
             await increment_usage_counters(user_id, 'command', user_doc)
-            log_chat_to_db(user_id, user_name, user_input, json.dumps(plan), True)
+            chat_log.log_chat(user_id, user_name, user_input, json.dumps(plan), True)
 
         else: # It's a general chat message
-            llm_chat = ChatOllama(model=config.OLLAMA_MODEL, base_url=config.OLLAMA_BASE_URL, temperature=0.7)
-            chat_response = await llm_chat.ainvoke([SystemMessage(content=prompts.CHAT_PROMPT)] + history + [HumanMessage(content=user_input)])
-            await placeholder_message.edit_text(chat_response.content)
-            memory.save_context({"input": user_input}, {"output": chat_response.content})
+            reply_text = plan.get('reply')
+            if isinstance(reply_text, str) and reply_text.strip():
+                # حالت combined: پاسخ در همان فراخوانی روتر تولید شده است
+                reply_text = reply_text.strip()
+                await _finalize_streamed_reply(placeholder_message, reply_text)
+            elif speculative_chat is not None:
+                # پاسخ از زمان شروع روتر در حال تولید بوده است
+                metrics.AI_SPECULATIVE_CHAT.inc(outcome="used")
+                reply_text = await _stream_chat_reply(speculative_chat.stream(), placeholder_message)
+                await _finalize_streamed_reply(placeholder_message, reply_text)
+            else:
+                llm_chat = llm_clients.get_client(llm_clients.CHAT)
+                async with llm_slot():
+                    with metrics.track(metrics.OLLAMA_SECONDS, metrics.OLLAMA_ERRORS, purpose="chat"):
+                        reply_text = await _stream_chat_reply(_ollama_chunks(llm_chat, chat_messages), placeholder_message)
+                # نوبت LLM پیش از ویرایش نهایی آزاد می‌شود؛ ویرایش ممکن است به خاطر RetryAfter تلگرام منتظر بماند
+                await _finalize_streamed_reply(placeholder_message, reply_text)
+            # خلاصه‌سازی در worker پس‌زمینه انجام می‌شود
+            await memory_store.add_turn(user_id, memory, user_input, reply_text)
             await increment_usage_counters(user_id, 'chat', user_doc)
-            log_chat_to_db(user_id, user_name, user_input, chat_response.content, True)
+            chat_log.log_chat(user_id, user_name, user_input, reply_text, True)
 
+    except SchedulerBusy as e:
+        logger.warning(f"AI request from user {user_id} shed by the LLM scheduler: {e.reason}")
+        await placeholder_message.edit_text("🚦 سرور هوش مصنوعی در حال حاضر شلوغ است. لطفاً چند لحظه دیگر دوباره تلاش کنید.")
+        chat_log.log_chat(user_id, user_name, user_input, "Scheduler Busy", False, e.reason)
     except ConnectError as e:
         logger.error(f"Could not connect to Ollama server: {e}")
         await placeholder_message.edit_text("🚨 متاسفانه در حال حاضر امکان ارتباط با سرور هوش مصنوعی وجود ندارد. لطفاً بعداً تلاش کنید.")
-        log_chat_to_db(user_id, user_name, user_input, "Connection Error", False, str(e))
+        chat_log.log_chat(user_id, user_name, user_input, "Connection Error", False, str(e))
     except Exception as e:
         logger.critical(f"خطای غیرمنتظره در پردازش هوشمند: {e}", exc_info=True)
         await placeholder_message.edit_text(f"🚨 یک خطای غیرمنتظره رخ داد.")
-        log_chat_to_db(user_id, user_name, user_input, str(e), False, str(e))
+        chat_log.log_chat(user_id, user_name, user_input, str(e), False, str(e))
+    finally:
+        if speculative_chat is not None:
+            speculative_chat.cancel()
 
 async def handle_ai_delete_confirmation(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handles the 'Yes' or 'No' buttons for an AI-initiated task deletion."""
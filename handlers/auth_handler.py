@@ -15,6 +15,7 @@ from appwrite.query import Query
 from dateutil.parser import parse as dateutil_parse
 import config
 import database
+import access_cache
 import clickup_api
 from . import common
 from . import admin_handler
@@ -102,6 +103,7 @@ async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> i
     user_doc = await asyncio.to_thread(
         database.get_single_document, config.APPWRITE_DATABASE_ID, config.BOT_USERS_COLLECTION_ID, 'telegram_id', user_id
     )
+    access_cache.update_from_document(user_doc)
 
     if user_doc and user_doc.get('is_admin'):
         await admin_handler.start_for_admin(update, context)
@@ -271,7 +273,7 @@ async def handle_resync_confirmation(update: Update, context: ContextTypes.DEFAU
              await query.message.edit_text("❌ توکن شما یافت نشد. لطفاً با /start مجدداً تلاش کنید.")
              return ConversationHandler.END
 
-        sync_success = await asyncio.to_thread(clickup_api.sync_all_user_data, token, user_id)
+        sync_success = await asyncio.to_thread(clickup_api.sync_all_user_data, token, user_id, force=True)
         if not sync_success:
             await query.message.edit_text("❌ در همگام‌سازی مجدد اطلاعات خطایی رخ داد. لطفاً با پشتیبانی تماس بگیرید.")
             context.chat_data.pop('auth_flow_active', None)
@@ -303,15 +305,10 @@ async def payment_details_received(update: Update, context: ContextTypes.DEFAULT
     }
     await asyncio.to_thread(database.create_document, config.APPWRITE_DATABASE_ID, config.PAYMENT_REQUESTS_COLLECTION_ID, payment_data)
 
-    admins = await asyncio.to_thread(database.get_documents, config.APPWRITE_DATABASE_ID, config.BOT_USERS_COLLECTION_ID, [Query.equal("is_admin", [True])])
     user_display_name = update.effective_user.full_name or f"@{update.effective_user.username}" or user_id
     notification_text = f"💳 درخواست پرداخت جدیدی از طرف *{common.escape_markdown(user_display_name)}* ثبت شد."
     keyboard = [[InlineKeyboardButton("بررسی درخواست", callback_data="admin_payment_review_pending")]]
-    for admin in admins:
-        try:
-            await context.bot.send_message(chat_id=admin['telegram_id'], text=notification_text, reply_markup=InlineKeyboardMarkup(keyboard), parse_mode='Markdown')
-        except Exception as e:
-            logger.error(f"Failed to send new payment notification to admin {admin['telegram_id']}: {e}")
+    context.application.create_task(admin_handler.notify_admins(notification_text, InlineKeyboardMarkup(keyboard)))
 
     await update.message.reply_text("✅ اطلاعات پرداخت شما ثبت و برای ادمین ارسال شد. پس از تایید، تمام امکانات پکیج برای شما فعال خواهد شد.")
     
@@ -380,6 +377,8 @@ def get_auth_handler() -> ConversationHandler:
     token_filter = filters.TEXT & ~filters.COMMAND & ~filters.Regex('^📞 پشتیبانی$')
     
     return ConversationHandler(
+        name="auth",
+        persistent=True,
         entry_points=[
             CommandHandler("start", start_command),
             # This is the NEW entry point for buttons clicked outside the initial flow.
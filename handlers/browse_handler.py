@@ -36,10 +36,16 @@ async def render_task_view(query_or_update: Update | CallbackQuery, task_id: str
         task_id
     )
     
-    if not task or task.get('telegram_id') != user_id:
+    if not task or not await asyncio.to_thread(database.is_document_in_user_scope, task, user_id):
         await common.send_or_edit(query_or_update, "تسک پیدا نشد یا شما به آن دسترسی ندارید.")
         return
 
+    # توضیحات تسک در همگام‌سازی لیست ذخیره نمی‌شود؛ در اولین نمایش یا پس از تغییر تسک از کلیک‌اپ دریافت می‌شود
+    if clickup_api.task_content_is_stale(task):
+        user_doc = await asyncio.to_thread(database.get_single_document, config.APPWRITE_DATABASE_ID, config.BOT_USERS_COLLECTION_ID, 'telegram_id', user_id)
+        if user_doc and user_doc.get('clickup_token'):
+            task = await asyncio.to_thread(clickup_api.hydrate_task_content, task, user_doc['clickup_token'])
+
     def format_date(iso_date_str: str | None) -> str:
         """Formats an ISO 8601 date string into a readable format."""
         if not iso_date_str: return "خالی"
@@ -88,31 +94,33 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     action = parts[0]
 
     keyboard, text, back_button = [], "لطفاً انتخاب کنید:", None
-    user_query = [Query.equal("telegram_id", [user_id])]
+
+    async def scope(collection_id: str) -> list:
+        return await asyncio.to_thread(database.get_user_scope_queries, user_id, collection_id)
 
     if action == "browse" and parts[1] == "spaces":
-        docs = await asyncio.to_thread(database.get_documents, config.APPWRITE_DATABASE_ID, config.SPACES_COLLECTION_ID, user_query)
+        docs = await asyncio.to_thread(database.get_documents, config.APPWRITE_DATABASE_ID, config.SPACES_COLLECTION_ID, await scope(config.SPACES_COLLECTION_ID))
         text, keyboard = "لیست فضاها:", [[InlineKeyboardButton(s['name'], callback_data=f"view_space_{s['clickup_space_id']}")] for s in docs]
     
     elif action == "view":
         entity, entity_id = parts[1], '_'.join(parts[2:])
         if entity == "space":
             text = "لیست پوشه‌ها:"
-            space_query = user_query + [Query.equal("space_id", [entity_id])]
+            space_query = await scope(config.FOLDERS_COLLECTION_ID) + [Query.equal("space_id", [entity_id])]
             docs = await asyncio.to_thread(database.get_documents, config.APPWRITE_DATABASE_ID, config.FOLDERS_COLLECTION_ID, space_query)
             keyboard = [[InlineKeyboardButton(f['name'], callback_data=f"view_folder_{f['clickup_folder_id']}")] for f in docs]
             back_button = InlineKeyboardButton("↩️ بازگشت به فضاها", callback_data="browse_spaces")
         elif entity == "folder":
             text = "لیست لیست‌ها:"
             folder = await asyncio.to_thread(database.get_single_document, config.APPWRITE_DATABASE_ID, config.FOLDERS_COLLECTION_ID, 'clickup_folder_id', entity_id)
-            folder_query = user_query + [Query.equal("folder_id", [entity_id])]
+            folder_query = await scope(config.LISTS_COLLECTION_ID) + [Query.equal("folder_id", [entity_id])]
             docs = await asyncio.to_thread(database.get_documents, config.APPWRITE_DATABASE_ID, config.LISTS_COLLECTION_ID, folder_query)
             keyboard = [[InlineKeyboardButton(l['name'], callback_data=f"view_list_{l['clickup_list_id']}")] for l in docs]
             if folder and folder.get('space_id'): back_button = InlineKeyboardButton("↩️ بازگشت به پوشه‌ها", callback_data=f"view_space_{folder['space_id']}")
         elif entity == "list":
             text = "لیست تسک‌ها:"
             lst = await asyncio.to_thread(database.get_single_document, config.APPWRITE_DATABASE_ID, config.LISTS_COLLECTION_ID, 'clickup_list_id', entity_id)
-            list_query = user_query + [Query.equal("list_id", [entity_id])]
+            list_query = await scope(config.TASKS_COLLECTION_ID) + [Query.equal("list_id", [entity_id])]
             tasks = await asyncio.to_thread(database.get_documents, config.APPWRITE_DATABASE_ID, config.TASKS_COLLECTION_ID, list_query)
             keyboard = [[InlineKeyboardButton(t['title'], callback_data=f"view_task_{t['clickup_task_id']}")] for t in tasks]
             keyboard.append([InlineKeyboardButton("➕ ساخت تسک جدید", callback_data=f"newtask_in_list_{entity_id}")])
@@ -127,7 +135,7 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
             sync_call = partial(clickup_api.sync_tasks_for_list, list_id, token=token, telegram_id=user_id)
             synced_count = await asyncio.to_thread(sync_call)
             text = f"همگام‌سازی کامل شد. {synced_count} تسک پردازش شد.\n\nلیست تسک‌ها:"
-            list_query = user_query + [Query.equal("list_id", [list_id])]
+            list_query = await scope(config.TASKS_COLLECTION_ID) + [Query.equal("list_id", [list_id])]
             tasks = await asyncio.to_thread(database.get_documents, config.APPWRITE_DATABASE_ID, config.TASKS_COLLECTION_ID, list_query)
             keyboard = [[InlineKeyboardButton(t['title'], callback_data=f"view_task_{t['clickup_task_id']}")] for t in tasks]
             keyboard.append([InlineKeyboardButton("➕ ساخت تسک جدید", callback_data=f"newtask_in_list_{list_id}")])
@@ -147,7 +155,7 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await query.edit_message_text("در حال حذف تسک...")
         task = await asyncio.to_thread(database.get_single_document, config.APPWRITE_DATABASE_ID, config.TASKS_COLLECTION_ID, 'clickup_task_id', task_id)
         
-        if not task or task.get('telegram_id') != user_id:
+        if not task or not await asyncio.to_thread(database.is_document_in_user_scope, task, user_id):
             await query.edit_message_text("خطا: تسک برای حذف یافت نشد یا شما دسترسی ندارید.")
             return
 
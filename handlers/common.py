@@ -5,9 +5,12 @@ import re
 from telegram import Update, InlineKeyboardMarkup, ReplyKeyboardMarkup, KeyboardButton, CallbackQuery
 from telegram.ext import ContextTypes, ConversationHandler
 from telegram.error import BadRequest
-from datetime import datetime
+from datetime import datetime, timedelta
+from typing import Optional
+from dateutil.parser import parse as dateutil_parse
 import config
 import database
+import access_cache
 
 logger = logging.getLogger(__name__)
 
@@ -52,6 +55,33 @@ def format_datetime_field(dt_string: str) -> str:
         logger.warning(f"Could not parse datetime string: {dt_string}")
         return "نامعتبر"
 
+def parse_date(date_str: str) -> Optional[int]:
+    """تاریخ را به فرمت timestamp کلیک‌اپ تبدیل می‌کند."""
+    if not date_str: return None
+    today = datetime.now()
+    try:
+        parsed_date = datetime.strptime(date_str, "%Y-%m-%d")
+    except ValueError:
+        try:
+            parsed_date = dateutil_parse(date_str, default=today, fuzzy=True, dayfirst=False)
+        except (ValueError, TypeError):
+            date_str_lower = date_str.lower()
+            if "امروز" in date_str_lower: parsed_date = today
+            elif "فردا" in date_str_lower: parsed_date = today + timedelta(days=1)
+            elif "پس فردا" in date_str_lower: parsed_date = today + timedelta(days=2)
+            elif "دیروز" in date_str_lower: parsed_date = today - timedelta(days=1)
+            elif "روز دیگه" in date_str_lower or "روز دیگر" in date_str_lower:
+                try:
+                    days_match = re.search(r'\d+', date_str)
+                    if days_match:
+                        days = int(days_match.group(0))
+                        parsed_date = today + timedelta(days=days)
+                    else: return None
+                except (ValueError, IndexError): return None
+            else:
+                return None
+    return int(parsed_date.timestamp() * 1000)
+
 def escape_markdown(text: str) -> str:
     """
     Escapes characters that are special in Telegram's default Markdown.
@@ -114,11 +144,9 @@ async def get_user_token(user_id: str, update: Update, context: ContextTypes.DEF
         return None
 
 async def is_user_admin(user_id: str) -> bool:
-    """بررسی می‌کند که آیا کاربر ادمین است یا خیر."""
-    user_doc = await asyncio.to_thread(
-        database.get_single_document, config.APPWRITE_DATABASE_ID, config.BOT_USERS_COLLECTION_ID, 'telegram_id', user_id
-    )
-    return user_doc and user_doc.get('is_admin', False)
+    """بررسی می‌کند که آیا کاربر ادمین است یا خیر (از جدول درون‌حافظه‌ای دسترسی‌ها)."""
+    access = await access_cache.get_user_access(user_id)
+    return bool(access and access.is_admin)
 
 async def send_or_edit(update_or_query: Update | CallbackQuery, text: str, reply_markup: InlineKeyboardMarkup = None, parse_mode='Markdown'):
     """
@@ -93,28 +93,12 @@ async def user_message_received(update: Update, context: ContextTypes.DEFAULT_TY
         "✅ پیام شما با موفقیت ثبت شد. پس از بررسی توسط ادمین، پاسخ برای شما ارسال خواهد شد."
     )
 
-    admins = await asyncio.to_thread(
-        database.get_documents,
-        config.APPWRITE_DATABASE_ID,
-        config.BOT_USERS_COLLECTION_ID,
-        [Query.equal("is_admin", [True])]
-    )
-    
     notification_text = f"✉️ پیام پشتیبانی جدیدی از طرف *{common.escape_markdown(user.full_name)}* دریافت شد."
     notification_keyboard = [[InlineKeyboardButton("مشاهده پیام", callback_data=f"support_admin_ticket_{new_ticket['$id']}")]]
-
-    for admin in admins:
-        try:
-            await context.bot.send_message(
-                chat_id=admin['telegram_id'],
-                text=notification_text,
-                reply_markup=InlineKeyboardMarkup(notification_keyboard),
-                parse_mode='Markdown'
-            )
-            # Update the admin panel to show the new message count
-            await admin_panel_handler.show_admin_panel(admin['telegram_id'], context)
-        except Exception as e:
-            logger.error(f"Failed to send new message notification to admin {admin['telegram_id']}: {e}")
+    # اطلاع‌رسانی به ادمین‌ها در پس‌زمینه انجام می‌شود تا پاسخ کاربر معطل نماند
+    context.application.create_task(
+        admin_panel_handler.notify_admins(notification_text, InlineKeyboardMarkup(notification_keyboard), refresh_panel=True)
+    )
 
     # After finishing, check if the user needs to be re-prompted for a token
     await check_and_reprompt_for_token(update, context, 
@@ -346,6 +330,8 @@ async def admin_button_handler(update: Update, context: ContextTypes.DEFAULT_TYP
 def get_user_support_conv_handler():
     """ConversationHandler for user message submission."""
     return ConversationHandler(
+        name="user_support",
+        persistent=True,
         entry_points=[CallbackQueryHandler(start_support_conversation, pattern='^support_start_conv$')],
         states={
             AWAITING_USER_MESSAGE: [MessageHandler(filters.TEXT & ~filters.COMMAND, user_message_received)],
@@ -357,6 +343,8 @@ def get_user_support_conv_handler():
 def get_admin_reply_conv_handler():
     """ConversationHandler for admin replies."""
     return ConversationHandler(
+        name="admin_support_reply",
+        persistent=True,
         entry_points=[CallbackQueryHandler(view_single_ticket, pattern='^support_admin_ticket_')],
         states={
             AWAITING_ADMIN_REPLY: [
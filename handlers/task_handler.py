@@ -19,7 +19,6 @@ import database
 import clickup_api
 from . import common
 from . import browse_handler
-from ai.tools import parse_date
 
 logger = logging.getLogger(__name__)
 
@@ -34,7 +33,7 @@ logger = logging.getLogger(__name__)
 async def _start_fresh_task_creation(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Encapsulates the logic for starting the task creation process from scratch."""
     user_id = str(update.effective_user.id)
-    user_query = [Query.equal("telegram_id", [user_id])]
+    user_query = await asyncio.to_thread(database.get_user_scope_queries, user_id, config.LISTS_COLLECTION_ID)
     lists = await asyncio.to_thread(database.get_documents, config.APPWRITE_DATABASE_ID, config.LISTS_COLLECTION_ID, user_query)
     
     if not lists:
@@ -235,7 +234,7 @@ async def due_date_received(update: Update, context: ContextTypes.DEFAULT_TYPE)
 async def ask_for_assignee(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Asks the user to select an assignee."""
     user_id = str(update.effective_user.id)
-    user_query = [Query.equal("telegram_id", [user_id])]
+    user_query = await asyncio.to_thread(database.get_user_scope_queries, user_id, config.CLICKUP_USERS_COLLECTION_ID)
     users = await asyncio.to_thread(database.get_documents, config.APPWRITE_DATABASE_ID, config.CLICKUP_USERS_COLLECTION_ID, user_query)
 
     keyboard = [[InlineKeyboardButton(user['username'], callback_data=f"select_user_{user['clickup_user_id']}")] for user in users]
@@ -262,11 +261,11 @@ async def assignee_selected(update: Update, context: ContextTypes.DEFAULT_TYPE)
     if user_data.get('priority'): payload["priority"] = user_data['priority']
 
     if start_date_str := user_data.get('start_date'):
-        if start_timestamp := parse_date(start_date_str):
+        if start_timestamp := common.parse_date(start_date_str):
             payload["start_date"] = start_timestamp
             
     if due_date_str := user_data.get('due_date'):
-        if due_timestamp := parse_date(due_date_str):
+        if due_timestamp := common.parse_date(due_date_str):
             payload["due_date"] = due_timestamp
     
     success, task_data = await asyncio.to_thread(
@@ -290,6 +289,8 @@ async def cancel_conversation(update: Update, context: ContextTypes.DEFAULT_TYPE
 def get_create_task_conv_handler() -> ConversationHandler:
     """Returns the ConversationHandler for the task creation flow."""
     return ConversationHandler(
+        name="create_task",
+        persistent=True,
         entry_points=[
             MessageHandler(filters.Regex('^➕ ساخت تسک جدید$'), new_task_entry), 
             CallbackQueryHandler(new_task_in_list_start, pattern='^newtask_in_list_')
@@ -348,7 +349,7 @@ async def edit_task_start(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     context.user_data['edit_task_id'] = task_id
     task = await asyncio.to_thread(database.get_single_document, config.APPWRITE_DATABASE_ID, config.TASKS_COLLECTION_ID, 'clickup_task_id', task_id)
     
-    if not task or task.get('telegram_id') != user_id:
+    if not task or not await asyncio.to_thread(database.is_document_in_user_scope, task, user_id):
         await common.send_or_edit(query, "خطا: تسک مورد نظر یافت نشد یا شما به آن دسترسی ندارید.")
         return ConversationHandler.END
     context.user_data['task'] = task
@@ -381,6 +382,9 @@ async def edit_field_selected(update: Update, context: ContextTypes.DEFAULT_TYPE
     if field_to_edit in ['name', 'description', 'start_date', 'due_date']:
         field_map = {'name': 'title', 'description': 'content', 'start_date': 'start_date', 'due_date': 'due_date'}
         next_state = EDIT_TYPING_VALUE
+        if field_to_edit == 'description' and clickup_api.task_content_is_stale(task):
+            task = await asyncio.to_thread(clickup_api.hydrate_task_content, task, token)
+            context.user_data['task'] = task
         current_value = task.get(field_map[field_to_edit], 'خالی') or 'خالی'
         prompt_text = f"مقدار فعلی: *{common.escape_markdown(current_value)}*\n\nلطفاً مقدار جدید را وارد کنید:"
     elif field_to_edit == 'status':
@@ -391,7 +395,8 @@ async def edit_field_selected(update: Update, context: ContextTypes.DEFAULT_TYPE
         keyboard = [[InlineKeyboardButton(p_name, callback_data=f"edit_value_{p_val}")] for p_name, p_val in [("فوری",1), ("بالا",2), ("متوسط",3), ("پایین",4), ("حذف",0)]]
         prompt_text = f"اولویت فعلی: *{common.escape_markdown(task.get('priority', 'N/A'))}*\n\nاولویت جدید را انتخاب کنید:"
     elif field_to_edit == 'assignees':
-        users = await asyncio.to_thread(database.get_documents, config.APPWRITE_DATABASE_ID, config.CLICKUP_USERS_COLLECTION_ID, [Query.equal("telegram_id", [user_id])])
+        user_query = await asyncio.to_thread(database.get_user_scope_queries, user_id, config.CLICKUP_USERS_COLLECTION_ID)
+        users = await asyncio.to_thread(database.get_documents, config.APPWRITE_DATABASE_ID, config.CLICKUP_USERS_COLLECTION_ID, user_query)
         keyboard = [[InlineKeyboardButton(u['username'], callback_data=f"edit_value_{u['clickup_user_id']}")] for u in users]
         prompt_text = "مسئول جدید را انتخاب کنید:"
 
@@ -414,7 +419,7 @@ async def process_edit(update: Update, context: ContextTypes.DEFAULT_TYPE, new_v
     if field == 'priority': api_value = int(new_value) if new_value != "0" else None
     elif field == 'assignees': api_value = {'add': [int(new_value)], 'rem': []}
     elif field in ['start_date', 'due_date']:
-        timestamp = parse_date(new_value)
+        timestamp = common.parse_date(new_value)
         if timestamp is None:
             await common.send_or_edit(update, "فرمت تاریخ نامعتبر است. لطفاً دوباره تلاش کنید.")
             return EDIT_TYPING_VALUE
@@ -457,6 +462,8 @@ async def back_to_task_from_edit(update: Update, context: ContextTypes.DEFAULT_T
 def get_edit_task_conv_handler() -> ConversationHandler:
     """Returns the ConversationHandler for the task editing flow."""
     return ConversationHandler(
+        name="edit_task",
+        persistent=True,
         entry_points=[CallbackQueryHandler(edit_task_start, pattern='^edit_task_')],
         states={
             EDIT_SELECTING_FIELD: [
@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+"""
+بارگذاری تنبل (lazy) ماژول‌های سنگین و گزارش زمان import هنگام راه‌اندازی.
+
+- install_import_timer باید پیش از بقیه importهای main.py فراخوانی شود. زمان اجرای هر ماژول (مشابه
+  python -X importtime) ثبت می‌شود و log_import_report آن را به تفکیک پکیج سطح بالا جمع‌بندی و لاگ می‌کند.
+- lazy_callback یک callback نازک برای هندلرهای تلگرام می‌سازد که ماژول اصلی را فقط در اولین استفاده
+  (در یک thread جداگانه تا event loop مسدود نشود) import می‌کند.
+"""
+import asyncio
+import importlib
+import logging
+import sys
+import threading
+import time
+from collections import defaultdict
+
+logger = logging.getLogger(__name__)
+
+_process_start = time.perf_counter()
+_self_seconds = defaultdict(float)   # پکیج سطح بالا -> مجموع زمان اجرای ماژول‌هایش (بدون زیرماژول‌های import شده)
+_module_counts = defaultdict(int)
+_stats_lock = threading.Lock()
+_stack = threading.local()
+
+
+def _record(module_name: str, self_seconds: float):
+    package = module_name.partition('.')[0]
+    with _stats_lock:
+        _self_seconds[package] += self_seconds
+        _module_counts[package] += 1
+
+
+def _timed_exec_module(original):
+    def exec_module(module):
+        frames = getattr(_stack, 'frames', None)
+        if frames is None:
+            frames = _stack.frames = []
+        start = time.perf_counter()
+        frames.append(0.0)
+        try:
+            original(module)
+        finally:
+            elapsed = time.perf_counter() - start
+            children = frames.pop()
+            if frames:
+                frames[-1] += elapsed
+            _record(module.__name__, elapsed - children)
+    return exec_module
+
+
+class _ImportTimer:
+    """
+    MetaPathFinder که فقط spec را از finderهای بعدی می‌گیرد و exec_module همان loader را زمان‌سنجی می‌کند؛
+    خود loader جایگزین نمی‌شود تا بررسی‌های isinstance کتابخانه‌ها دست نخورد.
+    """
+
+    def find_spec(self, fullname, path=None, target=None):
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, 'find_spec'):
+                continue
+            spec = finder.find_spec(fullname, path, target)
+            if spec is None:
+                continue
+            loader = spec.loader
+            # BuiltinImporter/FrozenImporter خود کلاس هستند و زمان ناچیزی دارند
+            if loader is not None and not isinstance(loader, type) and hasattr(loader, 'exec_module'):
+                try:
+                    if 'exec_module' not in vars(loader):
+                        loader.exec_module = _timed_exec_module(loader.exec_module)
+                except (AttributeError, TypeError):
+                    pass
+            return spec
+        return None
+
+
+_timer = _ImportTimer()
+
+
+def install_import_timer():
+    if _timer not in sys.meta_path:
+        sys.meta_path.insert(0, _timer)
+
+
+def log_import_report(top: int = 15):
+    """مجموع زمان importها و سنگین‌ترین پکیج‌ها را لاگ می‌کند."""
+    with _stats_lock:
+        totals = sorted(_self_seconds.items(), key=lambda item: item[1], reverse=True)
+        counts = dict(_module_counts)
+    total_import = sum(seconds for _, seconds in totals)
+    lines = [f"  {package:<28} {seconds * 1000:8.1f} ms  ({counts[package]} ماژول)" for package, seconds in totals[:top]]
+    logger.info(
+        f"زمان راه‌اندازی تا این لحظه: {time.perf_counter() - _process_start:.2f} ثانیه؛ "
+        f"مجموع importها: {total_import:.2f} ثانیه در {sum(counts.values())} ماژول.\n" + "\n".join(lines)
+    )
+
+
+# --- Lazy handler callbacks ---
+
+_loaded = {}      # نام ماژول -> ماژولی که import آن کامل شده است
+_load_locks = {}
+
+
+async def load_module(module_name: str):
+    """ماژول را در صورت نیاز در یک thread جداگانه import می‌کند و برمی‌گرداند."""
+    module = _loaded.get(module_name)
+    if module is not None:
+        return module
+    async with _load_locks.setdefault(module_name, asyncio.Lock()):
+        if module_name not in _loaded:
+            start = time.perf_counter()
+            _loaded[module_name] = await asyncio.to_thread(importlib.import_module, module_name)
+            logger.info(f"ماژول {module_name} در اولین استفاده در {time.perf_counter() - start:.2f} ثانیه بارگذاری شد.")
+    return _loaded[module_name]
+
+
+def lazy_callback(module_name: str, attr_name: str):
+    """callback هندلری می‌سازد که module_name.attr_name را در اولین فراخوانی بارگذاری و اجرا می‌کند."""
+    async def callback(update, context):
+        module = await load_module(module_name)
+        return await getattr(module, attr_name)(update, context)
+    # نام هندلر در متریک‌ها و traceها همان نام تابع اصلی باقی می‌ماند
+    callback.__module__ = module_name
+    callback.__name__ = callback.__qualname__ = attr_name
+    return callback
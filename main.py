@@ -1,3 +1,6 @@
+import lazy_import
+lazy_import.install_import_timer()
+
 import asyncio
 import logging
 from telegram.ext import (
@@ -16,18 +19,26 @@ from telegram.error import TimedOut
 import config
 from handlers import (
     auth_handler, 
-    ai_handlers, 
     browse_handler, 
     task_handler,
     admin_handler,
     admin_package_handler,
     admin_payment_handler,
     admin_user_handler,
+    admin_broadcast_handler,
     support_handler,
     profile_handler,
 )
-from webhook_server import run_webhook_server
+from webhook_server import run_webhook_server, register_telegram_application
 import database
+import metrics
+import tracing
+import access_cache
+import outbound_queue
+import chat_log
+from persistence import SQLitePersistence
+from ai import model_lifecycle
+from update_processor import PerChatUpdateProcessor
 from handlers.common import is_user_admin
 
 # --- راه‌اندازی سیستم لاگینگ ---
@@ -47,6 +58,9 @@ def setup_logging():
 
 logger = logging.getLogger(__name__)
 
+# handlers.ai_handlers (langchain، ollama و thefuzz) فقط در اولین استفاده بارگذاری می‌شود
+AI_HANDLERS_MODULE = "handlers.ai_handlers"
+
 
 class ApplicationHandlerStop(Exception):
     """Exception to stop further handlers from processing an update."""
@@ -64,19 +78,18 @@ async def check_user_status(update: Update, context: ContextTypes.DEFAULT_TYPE)
         return
 
     user_id = str(user.id)
+    # وضعیت دسترسی از جدول درون‌حافظه‌ای خوانده می‌شود (بدون درخواست شبکه برای کاربران شناخته شده)
+    access = await access_cache.get_user_access(user_id)
+    tracing.set_attributes(user=user_id, admin=bool(access and access.is_admin), active=bool(access and access.is_active))
 
-    if await is_user_admin(user_id):
+    if access and access.is_admin:
         return
 
     if update.message and update.message.text and update.message.text.startswith('/start'):
         return
     
-    user_doc = await asyncio.to_thread(
-        database.get_single_document, config.APPWRITE_DATABASE_ID, config.BOT_USERS_COLLECTION_ID, 'telegram_id', user_id
-    )
-    
-    if not user_doc or not user_doc.get('is_active', False):
-        logger.warning(f"دسترسی برای کاربر {user_id} رد شد (is_active: {user_doc.get('is_active') if user_doc else 'N/A'}).")
+    if not access or not access.is_active:
+        logger.warning(f"دسترسی برای کاربر {user_id} رد شد (is_active: {access.is_active if access else 'N/A'}).")
         
         context.chat_data['block_message_sent'] = True
         
@@ -117,9 +130,38 @@ async def error_handler(update: object, context: ContextTypes.DEFAULT_TYPE) -> N
             logger.error(f"An unknown error occurred while sending the error message to the user: {e}", exc_info=True)
 
 
+async def start_webhook_mode(application: Application) -> None:
+    """
+    آپدیت‌ها را به جای polling از مسیر وب‌هوک روی وب‌سرور aiohttp دریافت می‌کند.
+    وب‌هوک هنگام خاموش شدن حذف نمی‌شود تا نمونه‌های دیگر پشت load balancer به کار خود ادامه دهند.
+    """
+    if not config.TELEGRAM_WEBHOOK_URL or not config.TELEGRAM_WEBHOOK_SECRET:
+        raise ValueError("برای حالت وب‌هوک تلگرام، TELEGRAM_WEBHOOK_URL و TELEGRAM_WEBHOOK_SECRET باید در config تنظیم شوند.")
+
+    register_telegram_application(application)
+    webhook_url = config.TELEGRAM_WEBHOOK_URL.rstrip('/') + config.TELEGRAM_WEBHOOK_PATH
+    await application.bot.set_webhook(
+        url=webhook_url,
+        secret_token=config.TELEGRAM_WEBHOOK_SECRET,
+        allowed_updates=Update.ALL_TYPES,
+    )
+    logger.info(f"وب‌هوک تلگرام روی {webhook_url} تنظیم شد.")
+
 async def run_bot() -> None:
     """ربات تلگرام را راه‌اندازی و اجرا می‌کند."""
-    application = Application.builder().token(config.BOT_TOKEN).build()
+    persistence = SQLitePersistence(
+        config.PERSISTENCE_PATH,
+        update_interval=config.PERSISTENCE_UPDATE_INTERVAL_SECONDS,
+        transient_chat_keys=config.PERSISTENCE_TRANSIENT_CHAT_KEYS,
+    )
+    update_processor = PerChatUpdateProcessor(config.MAX_CONCURRENT_UPDATES, config.MAX_PENDING_UPDATES)
+    application = (
+        Application.builder()
+        .token(config.BOT_TOKEN)
+        .persistence(persistence)
+        .concurrent_updates(update_processor)
+        .build()
+    )
     
     # --- ثبت Handler‌ها با اولویت‌بندی صحیح ---
     
@@ -149,41 +191,57 @@ async def run_bot() -> None:
     application.add_handler(support_handler.get_admin_reply_conv_handler(), group=1)
     application.add_handler(admin_user_handler.get_send_direct_message_conv_handler(), group=1)
     application.add_handler(admin_payment_handler.get_payment_review_conv_handler(), group=1)
+    application.add_handler(admin_broadcast_handler.get_broadcast_conv_handler(), group=1)
 
     # گروه 2: هندلرهای مربوط به کلیک روی دکمه‌های شیشه‌ای (عمومی)
     application.add_handler(CallbackQueryHandler(browse_handler.button_handler, pattern='^(browse|view|refresh|delete|confirm)_'), group=2)
-    application.add_handler(CallbackQueryHandler(ai_handlers.handle_ai_delete_confirmation, pattern=r'^(confirm_delete_ai_|cancel_delete_ai$)'), group=2)
+    application.add_handler(CallbackQueryHandler(lazy_import.lazy_callback(AI_HANDLERS_MODULE, 'handle_ai_delete_confirmation'), pattern=r'^(confirm_delete_ai_|cancel_delete_ai$)'), group=2)
     # --- BUG FIX: Add the new handler for AI corrections ---
-    application.add_handler(CallbackQueryHandler(ai_handlers.handle_ai_correction_callback, pattern=r'^ai_correct_'), group=2)
+    application.add_handler(CallbackQueryHandler(lazy_import.lazy_callback(AI_HANDLERS_MODULE, 'handle_ai_correction_callback'), pattern=r'^ai_correct_'), group=2)
     
     application.add_handler(CallbackQueryHandler(admin_package_handler.admin_package_button_handler, pattern=r'^admin_pkg_'), group=2)
     application.add_handler(CallbackQueryHandler(admin_payment_handler.admin_payment_button_handler, pattern=r'^admin_payment_'), group=2)
     application.add_handler(CallbackQueryHandler(admin_user_handler.admin_user_button_handler, pattern=r'^admin_user_(page|view|toggle|delete|confirm|back)_'), group=2)
     application.add_handler(CallbackQueryHandler(support_handler.admin_button_handler, pattern=r'^support_admin_'), group=2)
+    application.add_handler(CallbackQueryHandler(admin_broadcast_handler.broadcast_stop_callback, pattern=r'^broadcast_stop_'), group=2)
 
     # گروه 3: هوش مصنوعی (آخرین اولویت)
     menu_button_texts = [
         '^🔍 مرور پروژه‌ها$', '^📞 پشتیبانی$', '^👤 پروفایل من$', '^📊 مدیریت کاربران$',
         '^📦 مدیریت پکیج‌ها$', r'^✉️ پیام‌ها', '^📈 گزارشات$',
-        '^➕ ساخت تسک جدید$', '^💳 بررسی پرداخت‌ها$',
+        '^➕ ساخت تسک جدید$', '^💳 بررسی پرداخت‌ها$', '^📢 پیام همگانی$',
     ]
     menu_filters = filters.Regex('|'.join(menu_button_texts))
     ai_text_filter = filters.TEXT & ~filters.COMMAND & ~menu_filters
     
-    application.add_handler(MessageHandler(ai_text_filter, ai_handlers.ai_handler_entry), group=3)
+    application.add_handler(MessageHandler(ai_text_filter, lazy_import.lazy_callback(AI_HANDLERS_MODULE, 'ai_handler_entry')), group=3)
 
     application.add_error_handler(error_handler)
+    metrics.instrument_application(application, ignored_exceptions=(ApplicationHandlerStop,))
 
     try:
         logger.info("ربات تلگرام در حال راه‌اندازی است...")
         await application.initialize()
         await application.start()
-        await application.updater.start_polling(allowed_updates=Update.ALL_TYPES)
+        outbound_queue.start(application.bot)
+        chat_log.start()
+        await admin_broadcast_handler.resume_pending_broadcasts(application)
+        if config.TELEGRAM_WEBHOOK_ENABLED:
+            await start_webhook_mode(application)
+        else:
+            await application.updater.start_polling(allowed_updates=Update.ALL_TYPES)
         logger.info("ربات تلگرام با موفقیت اجرا شد.")
+        lazy_import.log_import_report(config.IMPORT_REPORT_TOP_PACKAGES)
+        if config.AI_PRELOAD_AFTER_STARTUP:
+            application.create_task(lazy_import.load_module(AI_HANDLERS_MODULE))
         await asyncio.Event().wait()
     finally:
         logger.info("در حال خاموش کردن ربات تلگرام...")
-        await application.updater.stop()
+        if application.updater.running:
+            await application.updater.stop()
+        await admin_broadcast_handler.cancel_running_broadcasts()
+        await outbound_queue.stop()
+        await chat_log.stop()
         await application.stop()
         await application.shutdown()
         logger.info("ربات تلگرام خاموش شد.")
@@ -194,10 +252,21 @@ async def run_concurrently():
     await database.setup_database_schemas()
     logger.info("بررسی ساختار دیتابیس کامل شد.")
 
+    try:
+        await asyncio.to_thread(access_cache.reload_all)
+    except Exception as e:
+        logger.error(f"بارگذاری اولیه جدول دسترسی کاربران ناموفق بود؛ کاربران در اولین درخواست از دیتابیس خوانده می‌شوند: {e}")
+
     bot_task = asyncio.create_task(run_bot())
     webhook_task = asyncio.create_task(run_webhook_server())
+    lag_monitor_task = asyncio.create_task(metrics.monitor_event_loop_lag(config.EVENT_LOOP_LAG_CHECK_INTERVAL_SECONDS))
+    
+    access_reload_task = asyncio.create_task(access_cache.run_periodic_reload(config.ACCESS_CACHE_RELOAD_INTERVAL_SECONDS))
+    tasks = [bot_task, webhook_task, lag_monitor_task, access_reload_task]
+    if config.OLLAMA_WARMUP_ENABLED:
+        tasks.append(asyncio.create_task(model_lifecycle.run_model_lifecycle(config.OLLAMA_MODEL_CHECK_INTERVAL_SECONDS)))
     
-    await asyncio.gather(bot_task, webhook_task)
+    await asyncio.gather(*tasks)
 
 if __name__ == "__main__":
     setup_logging()
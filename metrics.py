@@ -0,0 +1,398 @@
+# -*- coding: utf-8 -*-
+"""
+متریک‌های داخلی ربات و خروجی آن‌ها با فرمت متنی Prometheus (بدون وابستگی خارجی).
+
+شمارنده‌ها و هیستوگرام‌ها از چند thread (asyncio.to_thread) به‌روزرسانی می‌شوند، پس همه با قفل محافظت شده‌اند.
+مقادیر لحظه‌ای (مثل طول صف‌ها) به صورت gauge با تابع callback ثبت می‌شوند و هنگام خواندن /metrics محاسبه می‌شوند.
+"""
+import asyncio
+import contextlib
+import functools
+import logging
+import re
+import threading
+import time
+
+import tracing
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+STARTED_AT = time.time()
+
+
+def _escape_label_value(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(label_names: tuple, label_values: tuple, extra: dict | None = None) -> str:
+    pairs = list(zip(label_names, label_values))
+    if extra:
+        pairs.extend(extra.items())
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape_label_value(value)}"' for name, value in pairs) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+# --- انواع متریک ---
+
+class _Metric:
+    metric_type = "untyped"
+
+    def __init__(self, name: str, documentation: str, label_names: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels.get(name, "")) for name in self.label_names)
+
+    def header(self) -> list[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.metric_type}"]
+
+
+class Counter(_Metric):
+    metric_type = "counter"
+
+    def __init__(self, name: str, documentation: str, label_names: tuple = ()):
+        super().__init__(name, documentation, label_names)
+        self._values = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def collect(self) -> list[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return self.header() + [f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}" for key, value in items]
+
+
+class Gauge(_Metric):
+    """gauge با مقدار ثابت (set) یا محاسبه‌شونده با callback هنگام خواندن."""
+    metric_type = "gauge"
+
+    def __init__(self, name: str, documentation: str, label_names: tuple = (), callback=None):
+        super().__init__(name, documentation, label_names)
+        self._values = {}
+        self._callback = callback
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+    def set_callback(self, callback):
+        """callback یا یک عدد برمی‌گرداند یا یک دیکشنری {tuple(label_values): value}."""
+        self._callback = callback
+
+    def collect(self) -> list[str]:
+        with self._lock:
+            values = dict(self._values)
+        if self._callback is not None:
+            try:
+                result = self._callback()
+                if isinstance(result, dict):
+                    values.update({tuple(str(v) for v in key): value for key, value in result.items()})
+                elif result is not None:
+                    values[()] = result
+            except Exception as e:
+                logger.warning(f"خطا در محاسبه متریک {self.name}: {e}")
+        return self.header() + [f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}" for key, value in sorted(values.items())]
+
+
+class Histogram(_Metric):
+    metric_type = "histogram"
+
+    def __init__(self, name: str, documentation: str, label_names: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, label_names)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # key -> [bucket_counts, sum, count]
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def count(self, **labels) -> int:
+        with self._lock:
+            series = self._series.get(self._key(labels))
+            return series[2] if series else 0
+
+    def collect(self) -> list[str]:
+        with self._lock:
+            items = sorted((key, (list(s[0]), s[1], s[2])) for key, s in self._series.items())
+        lines = self.header()
+        for key, (bucket_counts, total, count) in items:
+            for bound, bucket_count in zip(self.buckets, bucket_counts):
+                lines.append(f"{self.name}_bucket{_format_labels(self.label_names, key, {'le': _format_value(bound)})} {bucket_count}")
+            lines.append(f"{self.name}_bucket{_format_labels(self.label_names, key, {'le': '+Inf'})} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(self.label_names, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.label_names, key)} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.collect())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def counter(name: str, documentation: str, label_names: tuple = ()) -> Counter:
+    return REGISTRY.register(Counter(name, documentation, label_names))
+
+
+def gauge(name: str, documentation: str, label_names: tuple = (), callback=None) -> Gauge:
+    return REGISTRY.register(Gauge(name, documentation, label_names, callback))
+
+
+def histogram(name: str, documentation: str, label_names: tuple = (), buckets: tuple = DEFAULT_BUCKETS) -> Histogram:
+    return REGISTRY.register(Histogram(name, documentation, label_names, buckets))
+
+
+def render() -> str:
+    return REGISTRY.render()
+
+
+# --- متریک‌های ربات ---
+
+HANDLER_SECONDS = histogram("bot_handler_duration_seconds", "Time spent in Telegram handler callbacks", ("handler",))
+HANDLER_ERRORS = counter("bot_handler_errors_total", "Exceptions raised by Telegram handler callbacks", ("handler",))
+UPDATES_TOTAL = counter("bot_updates_total", "Telegram updates received", ("type",))
+
+APPWRITE_SECONDS = histogram("appwrite_request_duration_seconds", "Appwrite database call latency", ("operation",))
+APPWRITE_ERRORS = counter("appwrite_errors_total", "Failed Appwrite database calls", ("operation",))
+
+CLICKUP_SECONDS = histogram("clickup_request_duration_seconds", "ClickUp API request latency", ("method", "route"))
+CLICKUP_REQUESTS = counter("clickup_requests_total", "ClickUp API requests by response status", ("method", "route", "status"))
+
+OLLAMA_SECONDS = histogram("ollama_request_duration_seconds", "Ollama (LLM) call latency", ("purpose",), buckets=(0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0))
+OLLAMA_ERRORS = counter("ollama_errors_total", "Failed Ollama (LLM) calls", ("purpose",))
+AI_ROUTE_DECISIONS = counter("ai_route_decisions_total", "AI messages by routing path (rules or llm_router) and chosen tool", ("path", "tool"))
+AI_SPECULATIVE_CHAT = counter("ai_speculative_chat_total", "Speculative chat generations by outcome (used, cancelled, skipped_load)", ("outcome",))
+OLLAMA_FIRST_TOKEN_SECONDS = histogram("ollama_first_token_seconds", "Time until the first streamed Ollama token", ("purpose",), buckets=(0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0))
+
+CACHE_LOOKUPS = counter("cache_lookups_total", "Cache lookups by cache name and result (hit/miss)", ("cache", "result"))
+
+EVENT_LOOP_LAG = gauge("event_loop_lag_seconds", "Most recent asyncio event loop scheduling delay")
+EVENT_LOOP_LAG_SECONDS = histogram("event_loop_lag_seconds_distribution", "Asyncio event loop scheduling delay", buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0))
+
+
+def uptime_seconds() -> float:
+    return time.time() - STARTED_AT
+
+
+UPTIME = gauge("process_uptime_seconds", "Seconds since the bot process started", callback=uptime_seconds)
+
+
+def _count_asyncio_tasks():
+    try:
+        return len(asyncio.all_tasks())
+    except RuntimeError:
+        return None
+
+
+ASYNCIO_TASKS = gauge("asyncio_tasks", "Number of pending asyncio tasks", callback=_count_asyncio_tasks)
+QUEUE_DEPTH = gauge("queue_depth", "Current size of internal queues", ("queue",))
+
+_queue_sources = {}
+
+
+def register_queue(name: str, size_callback):
+    """یک صف را برای گزارش طول آن در متریک queue_depth ثبت می‌کند (size_callback بدون آرگومان طول صف را برمی‌گرداند)."""
+    _queue_sources[name] = size_callback
+
+
+def _collect_queue_depths() -> dict:
+    depths = {}
+    for name, size_callback in list(_queue_sources.items()):
+        try:
+            depths[(name,)] = size_callback()
+        except Exception as e:
+            logger.warning(f"خطا در خواندن طول صف {name}: {e}")
+    return depths
+
+
+QUEUE_DEPTH.set_callback(_collect_queue_depths)
+
+
+# --- توابع کمکی ---
+
+def _span_name(duration_histogram: Histogram, labels: dict) -> str:
+    # appwrite_request_duration_seconds + operation=get_documents -> appwrite.get_documents
+    return ".".join([duration_histogram.name.split("_", 1)[0], *map(str, labels.values())])
+
+
+@contextlib.contextmanager
+def track(duration_histogram: Histogram, error_counter: Counter | None = None, **labels):
+    """
+    زمان اجرای یک بلوک را ثبت می‌کند و در صورت بروز خطا شمارنده خطا را افزایش می‌دهد.
+    اگر آپدیتی در حال ردیابی باشد، بلوک به عنوان یک span در trace آن هم ثبت می‌شود.
+    """
+    started = time.perf_counter()
+    with tracing.span(_span_name(duration_histogram, labels)):
+        try:
+            yield
+        except BaseException as e:
+            if error_counter is not None and not isinstance(e, (asyncio.CancelledError, GeneratorExit)):
+                error_counter.inc(**labels)
+            raise
+        finally:
+            duration_histogram.observe(time.perf_counter() - started, **labels)
+
+
+def timed(duration_histogram: Histogram, error_counter: Counter | None = None, **labels):
+    """دکوریتور برای توابع همگام: معادل قرار دادن بدنه تابع داخل track()."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with track(duration_histogram, error_counter, **labels):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def record_cache_lookup(cache: str, hit: bool):
+    CACHE_LOOKUPS.inc(cache=cache, result="hit" if hit else "miss")
+
+
+_ID_SEGMENT_RE = re.compile(r'^(?=.*\d)[\w-]+$')
+
+
+def normalize_route(path: str) -> str:
+    """شناسه‌ها را از مسیر URL حذف می‌کند تا تعداد سری‌های متریک محدود بماند (مثلاً /task/abc123 -> /task/{id})."""
+    path = path.split('?', 1)[0]
+    return "/".join("{id}" if _ID_SEGMENT_RE.match(segment) else segment for segment in path.split("/"))
+
+
+async def monitor_event_loop_lag(interval: float = 1.0):
+    """به صورت دوره‌ای تأخیر زمان‌بندی event loop را اندازه می‌گیرد (یک sleep کوتاه چقدر دیرتر از موعد بیدار می‌شود)."""
+    loop = asyncio.get_running_loop()
+    while True:
+        started = loop.time()
+        await asyncio.sleep(interval)
+        lag = max(0.0, loop.time() - started - interval)
+        EVENT_LOOP_LAG.set(lag)
+        EVENT_LOOP_LAG_SECONDS.observe(lag)
+
+
+def current_event_loop_lag() -> float:
+    return EVENT_LOOP_LAG.value()
+
+
+# --- ابزار دقیق هندلرهای تلگرام ---
+
+def _callback_name(callback) -> str:
+    module = getattr(callback, '__module__', '') or ''
+    return f"{module.rsplit('.', 1)[-1]}.{getattr(callback, '__qualname__', getattr(callback, '__name__', repr(callback)))}"
+
+
+def _wrap_callback(callback, ignored_exceptions: tuple, pattern: str | None = None):
+    if getattr(callback, '_metrics_wrapped', False):
+        return callback
+    name = _callback_name(callback)
+
+    async def wrapper(update, context):
+        started = time.perf_counter()
+        tracing.append_attribute("handlers", name)
+        try:
+            with tracing.span("handler", handler=name, pattern=pattern):
+                return await callback(update, context)
+        except ignored_exceptions:
+            raise
+        except Exception:
+            HANDLER_ERRORS.inc(handler=name)
+            raise
+        finally:
+            HANDLER_SECONDS.observe(time.perf_counter() - started, handler=name)
+
+    wrapper._metrics_wrapped = True
+    wrapper.__name__ = getattr(callback, '__name__', 'callback')
+    wrapper.__qualname__ = getattr(callback, '__qualname__', wrapper.__name__)
+    wrapper.__module__ = getattr(callback, '__module__', __name__)
+    return wrapper
+
+
+def _instrument_handler(handler, ignored_exceptions: tuple):
+    # ConversationHandler خودش callback ندارد؛ هندلرهای داخلی آن را بررسی می‌کنیم
+    nested = []
+    if hasattr(handler, 'entry_points'):
+        nested.extend(handler.entry_points)
+        nested.extend(handler.fallbacks)
+        for state_handlers in handler.states.values():
+            nested.extend(state_handlers)
+    for inner in nested:
+        _instrument_handler(inner, ignored_exceptions)
+    if getattr(handler, 'callback', None) is not None and asyncio.iscoroutinefunction(handler.callback):
+        pattern = getattr(handler, 'pattern', None)
+        pattern = getattr(pattern, 'pattern', pattern)
+        handler.callback = _wrap_callback(handler.callback, ignored_exceptions, pattern if isinstance(pattern, str) else None)
+
+
+def update_type(update) -> str:
+    for attribute in ("message", "edited_message", "callback_query", "inline_query", "my_chat_member", "pre_checkout_query"):
+        if getattr(update, attribute, None) is not None:
+            return attribute
+    return "other"
+
+
+def instrument_application(application, ignored_exceptions: tuple = ()):
+    """
+    تمام callbackهای ثبت شده در application (از جمله داخل ConversationHandlerها) را برای ثبت زمان و خطا wrap می‌کند
+    و طول صف آپدیت‌های تلگرام را در متریک‌ها ثبت می‌کند. باید بعد از ثبت همه هندلرها فراخوانی شود.
+    """
+    from telegram import Update
+    from telegram.ext import TypeHandler
+
+    for handlers in application.handlers.values():
+        for handler in handlers:
+            _instrument_handler(handler, ignored_exceptions)
+
+    async def count_update(update, context):
+        UPDATES_TOTAL.inc(type=update_type(update))
+
+    application.add_handler(TypeHandler(Update, count_update), group=-100)
+    register_queue("telegram_updates", application.update_queue.qsize)
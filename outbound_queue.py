@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+"""
+صف مرکزی ارسال پیام‌های خروجی تلگرام (اطلاع‌رسانی به ادمین‌ها، پیام‌های گروهی و ...).
+
+- سقف سراسری تعداد پیام در ثانیه و فاصله حداقل بین پیام‌ها در هر چت (محدودیت‌های flood تلگرام) رعایت می‌شود.
+- چند worker به صورت موازی ارسال می‌کنند؛ ترتیب پیام‌های یک چت حفظ می‌شود.
+- در صورت دریافت RetryAfter، ارسال‌ها به مدت اعلام شده متوقف و پیام دوباره ارسال می‌شود؛ خطاهای شبکه هم با backoff تکرار می‌شوند.
+
+فراخوانی send_message منتظر ارسال نمی‌ماند و یک Future برمی‌گرداند، پس هندلرها معطل اطلاع‌رسانی‌ها نمی‌شوند.
+"""
+import asyncio
+import logging
+import time
+
+from telegram.error import RetryAfter, TimedOut, NetworkError
+
+import config
+import metrics
+
+logger = logging.getLogger(__name__)
+
+OUTBOUND_MESSAGES = metrics.counter("telegram_outbound_messages_total", "Messages sent through the outbound queue by result", ("result",))
+OUTBOUND_RETRIES = metrics.counter("telegram_outbound_retries_total", "Outbound send retries by reason", ("reason",))
+
+
+class _RateLimiter:
+    """محدودیت سراسری: بین دو ارسال حداقل 1/rate ثانیه فاصله می‌گذارد."""
+
+    def __init__(self, per_second: float):
+        self._interval = 1.0 / per_second if per_second > 0 else 0.0
+        self._next_slot = 0.0
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def pause(self, seconds: float):
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    async def acquire(self):
+        async with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot, self._paused_until)
+            self._next_slot = slot + self._interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+
+class OutboundQueue:
+    def __init__(self, bot, workers: int, global_per_second: float, private_interval: float, group_interval: float, max_retries: int):
+        self.bot = bot
+        self.max_retries = max_retries
+        self._private_interval = private_interval
+        self._group_interval = group_interval
+        self._queue = asyncio.Queue()
+        self._global_limiter = _RateLimiter(global_per_second)
+        self._chat_locks = {}      # chat_id -> [asyncio.Lock, تعداد پیام‌های در جریان]
+        self._chat_next_send = {}  # chat_id -> زودترین زمان مجاز برای ارسال بعدی
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(workers)]
+
+    def qsize(self) -> int:
+        return self._queue.qsize()
+
+    def send_message(self, chat_id, text: str, **kwargs) -> asyncio.Future:
+        future = asyncio.get_running_loop().create_future()
+        # خطاها در worker لاگ می‌شوند؛ اگر کسی منتظر Future نباشد، asyncio نباید هشدار بدهد
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self._queue.put_nowait((chat_id, text, kwargs, future))
+        return future
+
+    def _chat_interval(self, chat_id) -> float:
+        # آیدی منفی مربوط به گروه‌ها و کانال‌هاست که محدودیت سخت‌گیرانه‌تری دارند
+        try:
+            return self._group_interval if int(chat_id) < 0 else self._private_interval
+        except (TypeError, ValueError):
+            return self._private_interval
+
+    async def _wait_for_chat_slot(self, chat_id):
+        wait = self._chat_next_send.get(chat_id, 0.0) - time.monotonic()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    async def _send_with_retries(self, chat_id, text: str, kwargs: dict):
+        attempt = 0
+        while True:
+            await self._wait_for_chat_slot(chat_id)
+            await self._global_limiter.acquire()
+            try:
+                return await self.bot.send_message(chat_id=chat_id, text=text, **kwargs)
+            except RetryAfter as e:
+                retry_after = e.retry_after.total_seconds() if hasattr(e.retry_after, 'total_seconds') else float(e.retry_after)
+                OUTBOUND_RETRIES.inc(reason="retry_after")
+                logger.warning(f"محدودیت flood تلگرام: ارسال‌ها به مدت {retry_after} ثانیه متوقف می‌شوند.")
+                self._global_limiter.pause(retry_after)
+            except (TimedOut, NetworkError) as e:
+                attempt += 1
+                if attempt > self.max_retries:
+                    raise
+                OUTBOUND_RETRIES.inc(reason="network")
+                logger.warning(f"خطای شبکه در ارسال پیام به {chat_id} (تلاش {attempt}): {e}")
+                await asyncio.sleep(min(2 ** attempt, 30))
+            finally:
+                self._chat_next_send[chat_id] = time.monotonic() + self._chat_interval(chat_id)
+
+    async def _worker(self):
+        while True:
+            chat_id, text, kwargs, future = await self._queue.get()
+            entry = self._chat_locks.get(chat_id)
+            if entry is None:
+                entry = self._chat_locks[chat_id] = [asyncio.Lock(), 0]
+            entry[1] += 1
+            try:
+                async with entry[0]:
+                    message = await self._send_with_retries(chat_id, text, kwargs)
+                OUTBOUND_MESSAGES.inc(result="sent")
+                if not future.done():
+                    future.set_result(message)
+            except asyncio.CancelledError:
+                if not future.done():
+                    future.cancel()
+                raise
+            except Exception as e:
+                OUTBOUND_MESSAGES.inc(result="failed")
+                logger.error(f"ارسال پیام به {chat_id} ناموفق بود: {e}")
+                if not future.done():
+                    future.set_exception(e)
+            finally:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    self._chat_locks.pop(chat_id, None)
+                if len(self._chat_next_send) > 10_000:
+                    now = time.monotonic()
+                    self._chat_next_send = {cid: t for cid, t in self._chat_next_send.items() if t > now}
+                self._queue.task_done()
+
+    async def stop(self, drain_timeout: float = 10.0):
+        """تا drain_timeout ثانیه برای ارسال پیام‌های باقی‌مانده صبر می‌کند و سپس workerها را متوقف می‌کند."""
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout=drain_timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"{self._queue.qsize()} پیام خروجی پیش از خاموش شدن ارسال نشد.")
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+
+
+_queue: OutboundQueue | None = None
+
+
+def start(bot) -> OutboundQueue:
+    """صف سراسری را با تنظیمات config راه‌اندازی می‌کند (باید داخل event loop فراخوانی شود)."""
+    global _queue
+    _queue = OutboundQueue(
+        bot,
+        workers=config.OUTBOUND_WORKERS,
+        global_per_second=config.OUTBOUND_GLOBAL_MESSAGES_PER_SECOND,
+        private_interval=config.OUTBOUND_PRIVATE_CHAT_INTERVAL_SECONDS,
+        group_interval=config.OUTBOUND_GROUP_CHAT_INTERVAL_SECONDS,
+        max_retries=config.OUTBOUND_MAX_RETRIES,
+    )
+    metrics.register_queue("telegram_outbound", _queue.qsize)
+    return _queue
+
+
+async def stop():
+    global _queue
+    if _queue is not None:
+        await _queue.stop()
+        _queue = None
+
+
+def send_message(chat_id, text: str, **kwargs) -> asyncio.Future:
+    """پیام را در صف ارسال قرار می‌دهد و بدون انتظار برای ارسال، یک Future برمی‌گرداند."""
+    if _queue is None:
+        raise RuntimeError("صف ارسال پیام راه‌اندازی نشده است (outbound_queue.start).")
+    return _queue.send_message(chat_id, text, **kwargs)
@@ -0,0 +1,222 @@
+# -*- coding: utf-8 -*-
+"""
+ذخیره‌سازی دائمی user_data، chat_data، bot_data و وضعیت مکالمه‌ها (ConversationHandler) در SQLite.
+
+برخلاف PicklePersistence که هر بار کل داده‌ها را در یک فایل می‌نویسد، هر کاربر/چت یک ردیف جداگانه دارد و
+فقط ردیف‌هایی که PTB به عنوان تغییر یافته گزارش می‌کند (و محتوایشان واقعاً تغییر کرده) نوشته می‌شوند.
+فایل SQLite در حالت WAL باز می‌شود تا چند پروسس (workerهایی که کاربران بین آن‌ها تقسیم شده‌اند) بتوانند
+هم‌زمان از یک فایل مشترک استفاده کنند؛ refresh_* قبل از پردازش هر آپدیت آخرین نسخه را از فایل می‌خواند.
+کلیدهای موقت chat_data (transient_chat_keys، مثل پرچم‌های جریان جاری) هیچ‌وقت ذخیره نمی‌شوند تا پس از
+راه‌اندازی مجدد، چت در وضعیت نیمه‌کاره گیر نکند.
+"""
+import asyncio
+import json
+import logging
+import pickle
+import sqlite3
+import threading
+import time
+from copy import deepcopy
+
+from telegram.ext import BasePersistence, PersistenceInput
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS user_data (id INTEGER PRIMARY KEY, data BLOB NOT NULL, updated_at REAL NOT NULL);
+CREATE TABLE IF NOT EXISTS chat_data (id INTEGER PRIMARY KEY, data BLOB NOT NULL, updated_at REAL NOT NULL);
+CREATE TABLE IF NOT EXISTS bot_data (id INTEGER PRIMARY KEY CHECK (id = 0), data BLOB NOT NULL, updated_at REAL NOT NULL);
+CREATE TABLE IF NOT EXISTS conversations (
+    name TEXT NOT NULL,
+    conversation_key TEXT NOT NULL,
+    state BLOB NOT NULL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (name, conversation_key)
+);
+"""
+
+
+class SQLitePersistence(BasePersistence):
+    """پیاده‌سازی BasePersistence روی یک فایل SQLite با نوشتن تدریجی (فقط کلیدهای تغییر یافته)."""
+
+    def __init__(self, filepath: str, update_interval: float = 60, transient_chat_keys: tuple = ()):
+        super().__init__(
+            store_data=PersistenceInput(bot_data=True, chat_data=True, user_data=True, callback_data=False),
+            update_interval=update_interval,
+        )
+        self.filepath = filepath
+        self.transient_chat_keys = frozenset(transient_chat_keys)
+        self._lock = threading.Lock()
+        self._connection = None
+        # آخرین نسخه سریالایز شده هر ردیف، برای جلوگیری از نوشتن تکراری و تشخیص تغییرات پروسس‌های دیگر
+        self._snapshots = {}
+
+    # --- SQLite helpers ---
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._connection is None:
+            self._connection = sqlite3.connect(self.filepath, check_same_thread=False, timeout=30)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("PRAGMA synchronous=NORMAL")
+            self._connection.executescript(_SCHEMA)
+        return self._connection
+
+    def _execute(self, sql: str, params: tuple = ()) -> list:
+        with self._lock:
+            connection = self._connect()
+            with connection:
+                return connection.execute(sql, params).fetchall()
+
+    async def _run(self, func, *args):
+        return await asyncio.to_thread(func, *args)
+
+    @staticmethod
+    def _dumps(data) -> bytes | None:
+        try:
+            return pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL)
+        except Exception as e:
+            logger.error(f"داده قابل ذخیره‌سازی نیست و نادیده گرفته شد: {e}")
+            return None
+
+    @staticmethod
+    def _loads(blob: bytes, default):
+        try:
+            return pickle.loads(blob)
+        except Exception as e:
+            logger.error(f"خطا در خواندن داده ذخیره شده: {e}")
+            return default
+
+    def _transient_keys(self, table: str) -> frozenset:
+        return self.transient_chat_keys if table == "chat_data" else frozenset()
+
+    def _load_table(self, table: str) -> dict:
+        rows = self._execute(f"SELECT id, data FROM {table}")
+        transient = self._transient_keys(table)
+        result = {}
+        for row_id, blob in rows:
+            self._snapshots[(table, row_id)] = blob
+            data = self._loads(blob, {})
+            # ردیف‌هایی که پیش از حذف کلیدهای موقت ذخیره شده‌اند
+            result[row_id] = {k: v for k, v in data.items() if k not in transient} if transient else data
+        return result
+
+    def _serialize_row(self, table: str, data) -> bytes | None:
+        transient = self._transient_keys(table)
+        if transient:
+            data = {k: v for k, v in data.items() if k not in transient}
+        return self._dumps(data)
+
+    def _store_row(self, table: str, row_id: int, blob: bytes) -> None:
+        self._execute(
+            f"INSERT INTO {table} (id, data, updated_at) VALUES (?, ?, ?) "
+            f"ON CONFLICT(id) DO UPDATE SET data = excluded.data, updated_at = excluded.updated_at",
+            (row_id, blob, time.time()),
+        )
+        self._snapshots[(table, row_id)] = blob
+
+    async def _write_row(self, table: str, row_id: int, data) -> None:
+        # dictهای PTB فقط روی event loop خوانده و تغییر داده می‌شوند؛ در thread فقط SQLite اجرا می‌شود
+        blob = self._serialize_row(table, data)
+        if blob is None or self._snapshots.get((table, row_id)) == blob:
+            return
+        await self._run(self._store_row, table, row_id, blob)
+
+    def _delete_row(self, table: str, row_id: int) -> None:
+        self._execute(f"DELETE FROM {table} WHERE id = ?", (row_id,))
+        self._snapshots.pop((table, row_id), None)
+
+    def _select_row(self, table: str, row_id: int) -> bytes | None:
+        rows = self._execute(f"SELECT data FROM {table} WHERE id = ?", (row_id,))
+        return rows[0][0] if rows else None
+
+    async def _refresh_row(self, table: str, row_id: int, data: dict) -> None:
+        """اگر پروسس دیگری ردیف را تغییر داده باشد، محتوای dict را با نسخه ذخیره شده جایگزین می‌کند."""
+        blob = await self._run(self._select_row, table, row_id)
+        if blob is None or self._snapshots.get((table, row_id)) == blob:
+            return
+        self._snapshots[(table, row_id)] = blob
+        kept = {k: data[k] for k in self._transient_keys(table) if k in data}
+        data.clear()
+        data.update(self._loads(blob, {}))
+        data.update(kept)
+
+    # --- user_data / chat_data / bot_data ---
+
+    async def get_user_data(self) -> dict:
+        return await self._run(self._load_table, "user_data")
+
+    async def get_chat_data(self) -> dict:
+        return await self._run(self._load_table, "chat_data")
+
+    async def get_bot_data(self) -> dict:
+        return (await self._run(self._load_table, "bot_data")).get(0, {})
+
+    async def update_user_data(self, user_id: int, data: dict) -> None:
+        await self._write_row("user_data", user_id, data)
+
+    async def update_chat_data(self, chat_id: int, data: dict) -> None:
+        await self._write_row("chat_data", chat_id, data)
+
+    async def update_bot_data(self, data: dict) -> None:
+        await self._write_row("bot_data", 0, data)
+
+    async def refresh_user_data(self, user_id: int, user_data: dict) -> None:
+        await self._refresh_row("user_data", user_id, user_data)
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: dict) -> None:
+        await self._refresh_row("chat_data", chat_id, chat_data)
+
+    async def refresh_bot_data(self, bot_data: dict) -> None:
+        await self._refresh_row("bot_data", 0, bot_data)
+
+    async def drop_user_data(self, user_id: int) -> None:
+        await self._run(self._delete_row, "user_data", user_id)
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        await self._run(self._delete_row, "chat_data", chat_id)
+
+    # --- callback_data (استفاده نمی‌شود) ---
+
+    async def get_callback_data(self):
+        return None
+
+    async def update_callback_data(self, data) -> None:
+        return None
+
+    # --- Conversations ---
+
+    def _load_conversations(self, name: str) -> dict:
+        rows = self._execute("SELECT conversation_key, state FROM conversations WHERE name = ?", (name,))
+        return {tuple(json.loads(key)): self._loads(state, None) for key, state in rows}
+
+    def _write_conversation(self, name: str, key: tuple, new_state) -> None:
+        encoded_key = json.dumps(list(key))
+        if new_state is None:
+            self._execute("DELETE FROM conversations WHERE name = ? AND conversation_key = ?", (name, encoded_key))
+            return
+        blob = self._dumps(deepcopy(new_state))
+        if blob is None:
+            return
+        self._execute(
+            "INSERT INTO conversations (name, conversation_key, state, updated_at) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(name, conversation_key) DO UPDATE SET state = excluded.state, updated_at = excluded.updated_at",
+            (name, encoded_key, blob, time.time()),
+        )
+
+    async def get_conversations(self, name: str) -> dict:
+        return await self._run(self._load_conversations, name)
+
+    async def update_conversation(self, name: str, key: tuple, new_state) -> None:
+        await self._run(self._write_conversation, name, key, new_state)
+
+    # --- Shutdown ---
+
+    def _close(self) -> None:
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+    async def flush(self) -> None:
+        """تمام نوشتن‌ها بلافاصله انجام می‌شوند؛ اینجا فقط اتصال بسته می‌شود."""
+        await self._run(self._close)
@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+"""
+ردیابی سبک هر آپدیت تلگرام (بدون وابستگی خارجی).
+
+برای هر آپدیت یک trace باز می‌شود و هر فراخوانی Appwrite، ClickUp و Ollama که از طریق metrics.track یا
+تابع span ثبت می‌شود، به صورت یک span فرزند با زمان شروع نسبی و مدت اجرا در آن ذخیره می‌شود.
+trace در یک ContextVar نگه داشته می‌شود، پس به taskهای فرزند و asyncio.to_thread هم منتقل می‌شود.
+اگر پردازش آپدیت بیشتر از TRACE_SLOW_UPDATE_SECONDS طول بکشد، یک waterfall فشرده لاگ می‌شود.
+"""
+import contextlib
+import contextvars
+import logging
+import threading
+import time
+
+import config
+
+logger = logging.getLogger(__name__)
+
+
+class Span:
+    __slots__ = ("name", "attributes", "start", "duration", "depth", "error")
+
+    def __init__(self, name: str, attributes: dict, start: float, depth: int):
+        self.name = name
+        self.attributes = attributes
+        self.start = start
+        self.duration = None
+        self.depth = depth
+        self.error = None
+
+    def set(self, key: str, value):
+        self.attributes[key] = value
+
+
+class _NullSpan:
+    """وقتی trace فعالی وجود ندارد برگردانده می‌شود تا فراخوانی‌کننده نیازی به بررسی None نداشته باشد."""
+
+    def set(self, key: str, value):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Trace:
+    def __init__(self, name: str, attributes: dict):
+        self.name = name
+        self.attributes = attributes
+        self.started = time.perf_counter()
+        self.duration = None
+        self.spans = []
+        self.dropped_spans = 0
+        self._lock = threading.Lock()
+
+    def add_span(self, name: str, attributes: dict, depth: int) -> Span | _NullSpan:
+        span = Span(name, attributes, time.perf_counter() - self.started, depth)
+        with self._lock:
+            if self.duration is not None:
+                return _NULL_SPAN
+            if len(self.spans) >= config.TRACE_MAX_SPANS:
+                self.dropped_spans += 1
+                return _NULL_SPAN
+            self.spans.append(span)
+        return span
+
+    def waterfall(self) -> str:
+        """خروجی فشرده: شروع نسبی، مدت، و نام span با تورفتگی بر اساس عمق."""
+        header = " ".join(
+            f"{key}={','.join(map(str, value)) if isinstance(value, list) else value}"
+            for key, value in self.attributes.items() if value not in (None, "", [])
+        )
+        lines = [f"{self.name} {self.duration * 1000:.0f}ms {header}".rstrip()]
+        with self._lock:
+            spans = sorted(self.spans, key=lambda s: s.start)
+        for span in spans:
+            duration = "   ?" if span.duration is None else f"{span.duration * 1000:6.0f}"
+            attributes = " ".join(f"{key}={value}" for key, value in span.attributes.items() if value is not None)
+            error = f" !{span.error}" if span.error else ""
+            lines.append(f"  +{span.start * 1000:6.0f}ms {duration}ms {'  ' * span.depth}{span.name} {attributes}{error}".rstrip())
+        if self.dropped_spans:
+            lines.append(f"  ... {self.dropped_spans} span دیگر ثبت نشد")
+        return "\n".join(lines)
+
+
+_current_trace = contextvars.ContextVar("current_trace", default=None)
+_current_depth = contextvars.ContextVar("current_span_depth", default=0)
+
+
+def start_trace(name: str, **attributes) -> contextvars.Token:
+    return _current_trace.set(Trace(name, attributes))
+
+
+def finish_trace(token: contextvars.Token):
+    """trace جاری را می‌بندد و در صورت کند بودن، waterfall آن را لاگ می‌کند."""
+    trace = _current_trace.get()
+    _current_trace.reset(token)
+    if trace is None:
+        return
+    with trace._lock:
+        trace.duration = time.perf_counter() - trace.started
+    if trace.duration >= config.TRACE_SLOW_UPDATE_SECONDS:
+        logger.warning(f"آپدیت کند:\n{trace.waterfall()}")
+
+
+def set_attributes(**attributes):
+    """ویژگی‌هایی مثل کاربر یا نام هندلر را به trace جاری اضافه می‌کند."""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.attributes.update(attributes)
+
+
+def append_attribute(key: str, value):
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.attributes.setdefault(key, []).append(value)
+
+
+@contextlib.contextmanager
+def span(name: str, **attributes):
+    """یک span فرزند برای trace جاری ثبت می‌کند؛ اگر trace فعالی نباشد هزینه‌ای ندارد."""
+    trace = _current_trace.get()
+    if trace is None:
+        yield _NULL_SPAN
+        return
+    depth = _current_depth.get()
+    current = trace.add_span(name, attributes, depth)
+    if current is _NULL_SPAN:
+        yield current
+        return
+    depth_token = _current_depth.set(depth + 1)
+    started = time.perf_counter()
+    try:
+        yield current
+    except BaseException as e:
+        current.error = type(e).__name__
+        raise
+    finally:
+        current.duration = time.perf_counter() - started
+        _current_depth.reset(depth_token)
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+"""
+پردازش هم‌زمان آپدیت‌های تلگرام با حفظ ترتیب در هر چت.
+
+آپدیت‌های چت‌های مختلف هم‌زمان پردازش می‌شوند (حداکثر max_concurrent_updates عدد)، اما آپدیت‌های یک چت
+به ترتیب دریافت و یکی‌یکی اجرا می‌شوند تا ماشین حالت ConversationHandlerها درست بماند.
+
+سمافور داخلی PTB (max_pending_updates) فقط تعداد کل آپدیت‌های در جریان را محدود می‌کند؛ سقف اجرای
+هم‌زمان بعد از گرفتن قفل چت اعمال می‌شود، تا آپدیت‌هایی که پشت قفل چت خودشان منتظرند جای اجرای
+چت‌های دیگر را نگیرند.
+"""
+import asyncio
+import logging
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+import metrics
+import tracing
+
+logger = logging.getLogger(__name__)
+
+
+def _ordering_key(update: object):
+    """کلید ترتیب: آیدی چت، یا در نبود چت (مثلاً inline query) آیدی کاربر."""
+    if not isinstance(update, Update):
+        return None
+    if update.effective_chat:
+        return update.effective_chat.id
+    if update.effective_user:
+        return ("user", update.effective_user.id)
+    return None
+
+
+def _start_update_trace(update: object):
+    """trace آپدیت را باز می‌کند؛ کاربر و وضعیت دسترسی را فایروال (گروه -1) به آن اضافه می‌کند."""
+    if not isinstance(update, Update):
+        return tracing.start_trace("update")
+    return tracing.start_trace(
+        "update",
+        update_id=update.update_id,
+        type=metrics.update_type(update),
+        chat=update.effective_chat.id if update.effective_chat else None,
+        callback_data=update.callback_query.data if update.callback_query else None,
+    )
+
+
+class PerChatUpdateProcessor(BaseUpdateProcessor):
+    def __init__(self, max_concurrent_updates: int, max_pending_updates: int):
+        super().__init__(max(max_pending_updates, max_concurrent_updates))
+        self._running_limit = asyncio.Semaphore(max_concurrent_updates)
+        self._chat_locks = {}  # key -> [asyncio.Lock, تعداد آپدیت‌های در انتظار/در حال اجرا]
+        self.running = 0
+        self.waiting = 0
+        metrics.register_queue("updates_running", lambda: self.running)
+        metrics.register_queue("updates_waiting", lambda: self.waiting)
+
+    async def do_process_update(self, update: object, coroutine) -> None:
+        key = _ordering_key(update)
+        self.waiting += 1
+        waiting = [True]
+        entry = None
+        if key is not None:
+            entry = self._chat_locks.get(key)
+            if entry is None:
+                entry = self._chat_locks[key] = [asyncio.Lock(), 0]
+            entry[1] += 1
+        try:
+            if entry is None:
+                await self._run(update, coroutine, waiting)
+            else:
+                async with entry[0]:
+                    await self._run(update, coroutine, waiting)
+        finally:
+            if waiting[0]:
+                self.waiting -= 1
+            if entry is not None:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    self._chat_locks.pop(key, None)
+
+    async def _run(self, update: object, coroutine, waiting: list) -> None:
+        await self._running_limit.acquire()
+        waiting[0] = False
+        self.waiting -= 1
+        self.running += 1
+        trace_token = _start_update_trace(update)
+        try:
+            await coroutine
+        finally:
+            tracing.finish_trace(trace_token)
+            self.running -= 1
+            self._running_limit.release()
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
@@ -1,9 +1,12 @@
 import logging
 import asyncio
+import hmac
 from aiohttp import web
+from telegram import Update
 import config
 import clickup_api
 import database
+import metrics
 
 logger = logging.getLogger(__name__)
 
@@ -49,12 +52,69 @@ async def clickup_webhook_handler(request: web.Request):
     
     return web.Response(status=200)
 
+# --- وب‌هوک تلگرام ---
+
+_telegram_application = None
+
+def register_telegram_application(application):
+    """application تلگرام را ثبت می‌کند تا آپدیت‌های دریافتی از وب‌هوک در صف آن قرار بگیرند."""
+    global _telegram_application
+    _telegram_application = application
+
+async def telegram_webhook_handler(request: web.Request):
+    """آپدیت‌های تلگرام را پس از بررسی توکن مخفی در update_queue قرار می‌دهد."""
+    secret = request.headers.get('X-Telegram-Bot-Api-Secret-Token', '')
+    if not hmac.compare_digest(secret.encode(), config.TELEGRAM_WEBHOOK_SECRET.encode()):
+        logger.warning(f"درخواست وب‌هوک تلگرام با توکن مخفی نامعتبر از {request.remote} رد شد.")
+        return web.Response(status=403)
+
+    # تا قبل از آماده شدن ربات، تلگرام با دریافت خطا درخواست را دوباره ارسال می‌کند
+    if _telegram_application is None or not _telegram_application.running:
+        return web.Response(status=503, text="Bot is not ready.")
+
+    try:
+        data = await request.json()
+    except ValueError:
+        return web.Response(status=400, text="Bad Request: Invalid JSON.")
+    if not isinstance(data, dict):
+        return web.Response(status=400, text="Bad Request: Update must be a JSON object.")
+
+    # خطای 5xx باعث ارسال دوباره و بی‌پایان همان آپدیت توسط تلگرام می‌شود؛ آپدیت نامعتبر با 400 رد می‌شود
+    try:
+        update = Update.de_json(data, _telegram_application.bot)
+    except Exception as e:
+        logger.warning(f"آپدیت نامعتبر وب‌هوک تلگرام رد شد: {e}")
+        return web.Response(status=400, text="Bad Request: Invalid update.")
+    await _telegram_application.update_queue.put(update)
+    return web.Response(status=200)
+
+async def metrics_handler(request: web.Request):
+    """متریک‌ها با فرمت متنی Prometheus."""
+    return web.Response(body=metrics.render().encode("utf-8"), headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"})
+
+async def healthz_handler(request: web.Request):
+    """بررسی سلامت سبک: فقط وضعیت event loop را بررسی می‌کند و به سرویس‌های خارجی درخواستی نمی‌فرستد."""
+    lag = metrics.current_event_loop_lag()
+    healthy = lag < config.HEALTH_MAX_EVENT_LOOP_LAG_SECONDS
+    body = {
+        "status": "ok" if healthy else "degraded",
+        "uptime_seconds": round(metrics.uptime_seconds(), 1),
+        "event_loop_lag_seconds": round(lag, 4),
+    }
+    return web.json_response(body, status=200 if healthy else 503)
+
 async def run_webhook_server():
     app = web.Application()
-    app.add_routes([web.post('/clickup-webhook', clickup_webhook_handler)])
+    app.add_routes([
+        web.post('/clickup-webhook', clickup_webhook_handler),
+        web.get('/metrics', metrics_handler),
+        web.get('/healthz', healthz_handler),
+    ])
+    if config.TELEGRAM_WEBHOOK_ENABLED:
+        app.add_routes([web.post(config.TELEGRAM_WEBHOOK_PATH, telegram_webhook_handler)])
     runner = web.AppRunner(app)
     await runner.setup()
-    site = web.TCPSite(runner, 'localhost', 8080)
+    site = web.TCPSite(runner, config.WEBHOOK_SERVER_HOST, config.WEBHOOK_SERVER_PORT)
     await site.start()
-    logger.info("وب‌سرور برای وب‌هوک‌ها در http://localhost:8080 اجرا شد.")
+    logger.info(f"وب‌سرور برای وب‌هوک‌ها در http://{config.WEBHOOK_SERVER_HOST}:{config.WEBHOOK_SERVER_PORT} اجرا شد.")
     await asyncio.Event().wait()